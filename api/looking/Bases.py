@@ -9,6 +9,14 @@ class DeviceEventBase(BaseModel):
     action: str = Field(..., description="动作")
     description: str = Field(..., description="描述")
 
+class DeviceEventBatchItem(DeviceEventBase):
+    """批量上报中的单个设备事件"""
+    signature: Optional[str] = Field(None, description="该事件的签名: MD5(device_id + event_type + timestamp)")
+
+class DeviceEventBatch(BaseModel):
+    """批量设备事件模型"""
+    events: List[DeviceEventBatchItem] = Field(..., description="离线期间缓存的事件")
+
 class KeepAliveData(BaseModel):
     """保活数据模型"""
     live: int = Field(default=0, description="保活标识")
@@ -1,40 +1,64 @@
 import asyncio
+import heapq
 import time
 from datetime import datetime
 from loguru import logger as log
-from typing import Dict, List, Optional, Set
-from threading import Thread, Lock
+from typing import Dict, List, Optional, Set, Tuple
+from threading import Lock
 
+from methods.globalvar import AsyncGlobalVars
 from api.looking.utils import (
-    get_beijing_now, get_all_device_ids, get_device_table_name,
-    get_device_status_key, update_device_status_and_record,
-    get_device_summary, BEIJING_TZ
+    get_beijing_now, get_device_status, get_all_device_statuses,
+    update_device_status_and_record, get_device_summary, BEIJING_TZ, AUTO_LOCK_ACTION
 )
-from methods.globalvar import GlobalVars
+from api.looking.stream import device_stream_hub
+from config import looking_alive_check_workers, looking_alive_check_shard_size, looking_alive_check_max_coalesce
 
 class AliveManager:
-    """保活连接管理器"""
+    """保活连接管理器
+
+    每个设备的保活截止时间（最后保活时间 + 超时阈值）保存在内存中的最小堆里，
+    检查任务运行在事件循环上，睡眠到最早的截止时间，只检查真正超时的设备。
+    设备保活时刷新截止时间，旧的堆条目不立即删除，弹出时与最新的保活时间比对后丢弃。
+
+    同一轮到期的设备按 shard_size 分片，最多 workers 个分片同时在读线程池中读取状态，
+    只有确认超时且仍为解锁状态的设备才进入写线程自动锁定。检查轮次在同一个任务中依次执行，不会重叠；
+    上一轮耗时越长，醒来前等待的合并窗口越长（不超过 max_coalesce 秒），让同时到期的设备合并到一轮处理。
+    """
     
     def __init__(self):
         self.is_running = False
-        self.check_interval = 60  # 检查间隔：60秒（1分钟）
+        self.check_interval = 60  # 最长睡眠间隔：60秒（1分钟），没有更早的截止时间时也会按此间隔醒来
         self.alive_timeout = 301   # 保活超时：61秒
-        self.worker_thread: Optional[Thread] = None
         self.alive_devices: Set[str] = set()  # 活跃设备集合
-        self.lock = Lock()  # 线程锁
+        self.lock = Lock()  # 线程锁，保活时间可能在写线程中刷新
+        self._heap: List[Tuple[float, str, float]] = []  # (截止时间, 设备ID, 最后保活时间)
+        self._last_alive: Dict[str, float] = {}  # 设备ID -> 最后保活时间
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.workers = max(1, looking_alive_check_workers)
+        self.shard_size = max(1, looking_alive_check_shard_size)
+        self.max_coalesce = looking_alive_check_max_coalesce
+        self._metrics = {
+            "cycles": 0, "checked_devices": 0, "last_cycle_devices": 0, "last_cycle_shards": 0,
+            "last_cycle_duration_ms": 0.0, "max_cycle_duration_ms": 0.0, "last_devices_per_second": 0.0,
+            "last_lag_seconds": 0.0, "max_lag_seconds": 0.0, "coalesce_seconds": 0.0,
+        }
         
         log.info("保活管理器初始化完成")
     
     def start(self) -> None:
-        """启动保活检查服务"""
-        if self.is_running:
+        """启动保活检查服务，需要在事件循环中调用；没有运行中的事件循环时推迟到首次保活请求"""
+        if self._task_running():
             log.warning("保活管理器已经在运行中")
             return
         
         self.is_running = True
-        self.worker_thread = Thread(target=self._run_check_loop, daemon=True)
-        self.worker_thread.start()
-        log.info(f"保活管理器启动成功 - 检查间隔: {self.check_interval}秒, 超时阈值: {self.alive_timeout}秒")
+        if not self._ensure_task():
+            log.info("当前没有运行中的事件循环，保活检查将在首次收到保活请求时启动")
+            return
+        log.info(f"保活管理器启动成功 - 最长检查间隔: {self.check_interval}秒, 超时阈值: {self.alive_timeout}秒")
     
     def stop(self) -> None:
         """停止保活检查服务"""
@@ -43,78 +67,219 @@ class AliveManager:
             return
         
         self.is_running = False
-        if self.worker_thread and self.worker_thread.is_alive():
-            self.worker_thread.join(timeout=5)
+        if self._task_running():
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        self._task = None
         log.info("保活管理器已停止")
     
-    def register_alive_device(self, device_id: str) -> None:
-        """注册活跃设备"""
+    def _task_running(self) -> bool:
+        return (self._task is not None and not self._task.done()
+                and self._loop is not None and not self._loop.is_closed())
+    
+    def _ensure_task(self) -> bool:
+        """在当前线程运行中的事件循环上启动检查任务，原任务所在的事件循环已结束时重新启动"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        if self._task_running() and self._loop is loop:
+            return True
+        if self._task_running():
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run_check_loop())
+        return True
+    
+    def register_alive_device(self, device_id: str, last_keep_alive: Optional[float] = None) -> None:
+        """注册活跃设备并刷新其保活截止时间"""
         if not device_id or device_id == 'Unknown':
             return
         
         with self.lock:
             self.alive_devices.add(device_id)
+        self.watch_device(device_id, last_keep_alive or get_beijing_now().timestamp())
+        if self.is_running:
+            self._ensure_task()
         log.debug(f"注册活跃设备: {device_id}")
     
-    def _run_check_loop(self) -> None:
-        """运行检查循环"""
+    def watch_device(self, device_id: str, last_keep_alive: float) -> None:
+        """按最后保活时间设置设备的截止时间，可在任意线程调用"""
+        deadline = last_keep_alive + self.alive_timeout
+        with self.lock:
+            if self._last_alive.get(device_id) == last_keep_alive:
+                return
+            self._last_alive[device_id] = last_keep_alive
+            is_earliest = not self._heap or deadline < self._heap[0][0]
+            heapq.heappush(self._heap, (deadline, device_id, last_keep_alive))
+            # 过期的堆条目过多时重建，避免频繁保活的设备让堆无限增长
+            if len(self._heap) > 2 * len(self._last_alive) + 64:
+                self._rebuild_heap()
+        if is_earliest:
+            self._notify()
+    
+    def unwatch_device(self, device_id: str) -> None:
+        """停止跟踪设备的保活截止时间"""
+        with self.lock:
+            self._last_alive.pop(device_id, None)
+    
+    def _rebuild_heap(self) -> None:
+        """按当前的保活时间和超时阈值重建堆，调用方需持有锁"""
+        self._heap = [(last + self.alive_timeout, device_id, last) for device_id, last in self._last_alive.items()]
+        heapq.heapify(self._heap)
+    
+    def _notify(self) -> None:
+        """唤醒检查任务重新计算睡眠时间"""
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wakeup.set)
+    
+    def _pop_expired(self, current_timestamp: float) -> Tuple[List[str], Optional[float], Optional[float]]:
+        """弹出截止时间已过的设备，返回设备列表、下一个截止时间和本轮最早的截止时间"""
+        expired = []
+        earliest = None
+        with self.lock:
+            while self._heap and self._heap[0][0] <= current_timestamp:
+                deadline, device_id, last_keep_alive = heapq.heappop(self._heap)
+                if self._last_alive.get(device_id) == last_keep_alive:
+                    del self._last_alive[device_id]
+                    expired.append(device_id)
+                    if earliest is None:
+                        earliest = deadline
+            next_deadline = self._peek_deadline()
+        return expired, next_deadline, earliest
+    
+    def _peek_deadline(self) -> Optional[float]:
+        """丢弃堆顶已失效的条目并返回最早的截止时间，调用方需持有锁"""
+        while self._heap and self._last_alive.get(self._heap[0][1]) != self._heap[0][2]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+    
+    def _load_deadlines(self) -> int:
+        """从数据库重建截止时间，只跟踪有保活记录且处于解锁状态的设备"""
+        count = 0
+        for device_id, device_status in get_all_device_statuses().items():
+            last_keep_alive = device_status.get('last_keep_alive')
+            if last_keep_alive and not device_status.get('is_locked', True):
+                self.watch_device(device_id, last_keep_alive)
+                count += 1
+        return count
+    
+    async def _run_check_loop(self) -> None:
+        """运行检查循环，睡眠到最早的截止时间或被新的更早截止时间唤醒"""
         log.info("保活检查循环开始运行")
+        try:
+            count = await AsyncGlobalVars.aread(self._load_deadlines)
+            log.info(f"已从数据库恢复 {count} 个设备的保活截止时间")
+        except Exception as e:
+            log.exception(f"恢复保活截止时间失败: {e}")
         
         while self.is_running:
             try:
-                self._perform_alive_check()
+                self._wakeup.clear()
+                now = get_beijing_now().timestamp()
+                expired, next_deadline, earliest = self._pop_expired(now)
+                if expired:
+                    await self._perform_alive_check(expired, now - earliest)
+                    continue
                 
-                # 等待下一次检查，支持提前退出
-                for _ in range(self.check_interval):
-                    if not self.is_running:
-                        break
-                    time.sleep(1)
+                delay = self.check_interval
+                if next_deadline is not None:
+                    coalesce = self._metrics["coalesce_seconds"]
+                    delay = min(delay, max(0.0, next_deadline + coalesce - get_beijing_now().timestamp()))
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
                     
+            except asyncio.CancelledError:
+                break
             except Exception as e:
                 log.exception(f"保活检查循环异常: {e}")
-                time.sleep(5)  # 异常时短暂等待后继续
+                await asyncio.sleep(5)  # 异常时短暂等待后继续
         
         log.info("保活检查循环结束")
     
-    def _perform_alive_check(self) -> None:
-        """执行保活检查"""
-        current_time = get_beijing_now()
-        current_timestamp = current_time.timestamp()
-        
-        log.debug(f"开始执行保活检查 - 当前时间: {current_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    async def _perform_alive_check(self, device_ids: List[str], lag: float = 0.0) -> None:
+        """分片并发检查截止时间已过的设备，超时且解锁的设备在写线程中自动锁定"""
+        started = time.perf_counter()
+        current_timestamp = get_beijing_now().timestamp()
+        shards = [device_ids[i:i + self.shard_size] for i in range(0, len(device_ids), self.shard_size)]
+        semaphore = asyncio.Semaphore(self.workers)
         
-        # 获取所有设备ID
-        all_device_ids = get_all_device_ids()
-        if not all_device_ids:
-            log.debug("未找到任何设备记录")
-            return
+        async def check_shard(shard: List[str]) -> Tuple[int, int]:
+            async with semaphore:
+                try:
+                    statuses = await AsyncGlobalVars.aread(self._read_statuses, shard)
+                    candidates = []
+                    timeouts = 0
+                    for device_id in shard:
+                        device_status = statuses.get(device_id)
+                        if self._is_timeout(device_status, current_timestamp):
+                            timeouts += 1
+                            if not device_status.get('is_locked', True):
+                                candidates.append(device_id)
+                        elif device_status and device_status.get('last_keep_alive'):
+                            # 数据库中的保活时间更新（未经过 watch_device 刷新）时重新跟踪
+                            self.watch_device(device_id, device_status['last_keep_alive'])
+                    if not candidates:
+                        return timeouts, 0
+                    results = await AsyncGlobalVars.arun(self._check_expired_devices, candidates, current_timestamp)
+                    return timeouts, sum(1 for result in results if result['auto_locked'])
+                except Exception as e:
+                    log.error(f"检查设备分片时发生异常（{len(shard)} 个设备）: {e}")
+                    return 0, 0
         
-        checked_devices = 0
-        timeout_devices = 0
-        auto_locked_devices = 0
+        counts = await asyncio.gather(*(check_shard(shard) for shard in shards))
+        timeout_devices = sum(count[0] for count in counts)
+        auto_locked_devices = sum(count[1] for count in counts)
+        self._record_cycle(len(device_ids), len(shards), time.perf_counter() - started, lag)
         
-        for device_id in all_device_ids:
-            try:
-                result = self._check_single_device(device_id, current_timestamp)
-                checked_devices += 1
-                
-                if result['is_timeout']:
-                    timeout_devices += 1
-                if result['auto_locked']:
-                    auto_locked_devices += 1
-                    
-            except Exception as e:
-                log.error(f"检查设备 {device_id} 时发生异常: {e}")
-        
-        # 记录检查结果摘要
-        if timeout_devices > 0 or auto_locked_devices > 0:
-            log.info(f"保活检查完成 - 总检查: {checked_devices}, "
-                    f"超时设备: {timeout_devices}, 自动锁定: {auto_locked_devices}")
-        else:
-            log.debug(f"保活检查完成 - 总检查: {checked_devices}, 所有设备状态正常")
+        log.info(f"保活检查完成 - 到期设备: {len(device_ids)}, 分片: {len(shards)}, "
+                f"超时设备: {timeout_devices}, 自动锁定: {auto_locked_devices}, "
+                f"耗时: {self._metrics['last_cycle_duration_ms']:.1f}ms, 延迟: {lag:.2f}秒")
+    
+    @staticmethod
+    def _read_statuses(device_ids: List[str]) -> Dict[str, Optional[Dict]]:
+        """在读线程中读取一个分片的设备状态"""
+        return {device_id: get_device_status(device_id) for device_id in device_ids}
     
-    def _check_single_device(self, device_id: str, current_timestamp: float) -> Dict[str, bool]:
-        """检查单个设备的保活状态"""
+    def _is_timeout(self, device_status: Optional[Dict], current_timestamp: float) -> bool:
+        last_keep_alive = (device_status or {}).get('last_keep_alive')
+        return bool(last_keep_alive) and current_timestamp - last_keep_alive > self.alive_timeout
+    
+    def _check_expired_devices(self, device_ids: List[str], current_timestamp: float) -> List[Dict[str, bool]]:
+        """在写线程中重新读取状态确认超时后自动锁定，读取与锁定之间收到的保活不会被误判"""
+        return [self._check_expired_device(device_id, current_timestamp) for device_id in device_ids]
+    
+    def _record_cycle(self, devices: int, shards: int, duration: float, lag: float) -> None:
+        """记录一轮检查的耗时、吞吐和延迟，并按耗时调整下一轮的合并窗口"""
+        metrics = self._metrics
+        metrics["cycles"] += 1
+        metrics["checked_devices"] += devices
+        metrics["last_cycle_devices"] = devices
+        metrics["last_cycle_shards"] = shards
+        metrics["last_cycle_duration_ms"] = round(duration * 1000, 2)
+        metrics["max_cycle_duration_ms"] = max(metrics["max_cycle_duration_ms"], metrics["last_cycle_duration_ms"])
+        metrics["last_devices_per_second"] = round(devices / duration, 1) if duration > 0 else 0.0
+        metrics["last_lag_seconds"] = round(max(0.0, lag), 3)
+        metrics["max_lag_seconds"] = max(metrics["max_lag_seconds"], metrics["last_lag_seconds"])
+        # 平滑后的单轮耗时作为合并窗口：检查越慢，越值得把相近的截止时间合并到同一轮
+        coalesce = 0.8 * metrics["coalesce_seconds"] + 0.2 * duration
+        metrics["coalesce_seconds"] = round(min(self.max_coalesce, coalesce), 4)
+    
+    def _check_expired_device(self, device_id: str, current_timestamp: float) -> Dict[str, bool]:
+        """检查到期设备，数据库中的保活时间更新（未经过 watch_device 刷新）时重新跟踪"""
+        device_status = get_device_status(device_id)
+        result = self._check_single_device(device_id, current_timestamp, device_status)
+        if not result['is_timeout'] and device_status and device_status.get('last_keep_alive'):
+            self.watch_device(device_id, device_status['last_keep_alive'])
+        return result
+    
+    def _check_single_device(self, device_id: str, current_timestamp: float,
+                             device_status: Optional[Dict] = None) -> Dict[str, bool]:
+        """检查单个设备的保活状态，未传入状态时从数据库读取"""
         result = {
             'is_timeout': False,
             'auto_locked': False
@@ -122,12 +287,8 @@ class AliveManager:
         
         try:
             # 获取设备状态
-            table_name = get_device_table_name(device_id)
-            if not GlobalVars.table_exists(table_name):
-                return result
-            
-            status_key = get_device_status_key(device_id)
-            device_status = GlobalVars.get_from_table(table_name, status_key)
+            if device_status is None:
+                device_status = get_device_status(device_id)
             
             if not device_status:
                 return result
@@ -170,13 +331,19 @@ class AliveManager:
             # 更新设备状态为锁定
             update_device_status_and_record(
                 device_id=device_id,
-                action="auto_locked_by_alive_timeout",
+                action=AUTO_LOCK_ACTION,
                 timestamp=lock_timestamp
             )
             
             # 从活跃设备列表中移除
             with self.lock:
                 self.alive_devices.discard(device_id)
+                self._last_alive.pop(device_id, None)
+            
+            device_stream_hub.publish(device_id, "alive_timeout", {
+                "timeout_seconds": round(timeout_duration, 1),
+                "alive_timeout_seconds": self.alive_timeout
+            })
             
             # 获取设备摘要用于日志
             summary = get_device_summary(device_id)
@@ -193,6 +360,8 @@ class AliveManager:
         with self.lock:
             alive_count = len(self.alive_devices)
             alive_list = list(self.alive_devices.copy())
+            tracked_count = len(self._last_alive)
+            next_deadline = self._peek_deadline()
         
         return {
             "is_running": self.is_running,
@@ -200,6 +369,12 @@ class AliveManager:
             "alive_timeout_seconds": self.alive_timeout,
             "alive_devices_count": alive_count,
             "alive_devices": alive_list,
+            "tracked_devices_count": tracked_count,
+            "next_deadline_in_seconds": round(max(0.0, next_deadline - get_beijing_now().timestamp()), 2)
+                                        if next_deadline is not None else None,
+            "check_workers": self.workers,
+            "check_shard_size": self.shard_size,
+            "check_metrics": dict(self._metrics),
             "current_beijing_time": get_beijing_now().strftime("%Y-%m-%d %H:%M:%S"),
             "timezone": "Asia/Shanghai"
         }
@@ -221,6 +396,9 @@ class AliveManager:
             return False
         
         self.alive_timeout = timeout_seconds
+        with self.lock:
+            self._rebuild_heap()
+        self._notify()
         log.info(f"保活超时时间已更新为: {timeout_seconds}秒")
         return True
     
@@ -250,13 +428,10 @@ class AliveManager:
     def get_device_alive_info(self, device_id: str) -> Dict[str, any]:
         """获取设备保活信息"""
         try:
-            table_name = get_device_table_name(device_id)
-            if not GlobalVars.table_exists(table_name):
+            device_status = get_device_status(device_id)
+            if device_status is None:
                 return {"error": f"设备 {device_id} 未找到记录"}
             
-            status_key = get_device_status_key(device_id)
-            device_status = GlobalVars.get_from_table(table_name, status_key)
-            
             if not device_status:
                 return {"error": f"设备 {device_id} 状态记录不存在"}
             
@@ -307,9 +482,14 @@ def stop_alive_manager() -> None:
     """停止保活管理器"""
     alive_manager.stop()
 
-def register_device_alive(device_id: str) -> None:
+def register_device_alive(device_id: str, last_keep_alive: Optional[float] = None) -> None:
     """注册设备保活"""
-    alive_manager.register_alive_device(device_id)
+    alive_manager.register_alive_device(device_id, last_keep_alive)
+
+def watch_device_alive(device_id: str, last_keep_alive: Optional[float]) -> None:
+    """跟踪设备的保活截止时间，用于解锁事件后重新开始跟踪"""
+    if last_keep_alive:
+        alive_manager.watch_device(device_id, last_keep_alive)
 
 def get_alive_manager_status() -> Dict[str, any]:
     """获取保活管理器状态"""
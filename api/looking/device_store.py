@@ -0,0 +1,509 @@
+import re, time
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger as log
+from methods.globalvar import GlobalVars
+from api.looking.telemetry import TELEMETRY_TABLE, TELEMETRY_INSERT_SQL, telemetry_schema, telemetry_row
+from api.looking.usage import (
+    USAGE_HOURLY_TABLE, USAGE_UPSERT_SQL, UsageDeltas, usage_schema, usage_rows, add_event, add_session
+)
+
+DEVICES_TABLE = "devices"
+DAILY_STATS_TABLE = "device_daily_stats"
+EVENTS_TABLE = "device_events"
+SESSIONS_TABLE = "device_sessions"
+STATUS_HISTORY_TABLE = "device_status_history"
+STATUS_ROLLUPS_TABLE = "device_status_rollups"
+STORE_TABLES = (DEVICES_TABLE, DAILY_STATS_TABLE, EVENTS_TABLE, SESSIONS_TABLE, STATUS_HISTORY_TABLE,
+                STATUS_ROLLUPS_TABLE, TELEMETRY_TABLE, USAGE_HOURLY_TABLE)
+
+# 旧版本每个设备一张键值表 device_{device_id}
+LEGACY_TABLE_PREFIX = "device_"
+LEGACY_STATUS_KEY = "device_status"
+LEGACY_LATEST_STATUS_KEY = "latest_device_status"
+LEGACY_DAILY_PREFIX = "daily_"
+LEGACY_STATUS_RECORD_PREFIX = "device_status_"
+LEGACY_STATUS_RECORD_PATTERN = re.compile(r"^device_status_(\d{8}_\d{6})$")
+
+
+class DeviceStore:
+    """设备数据存储，所有设备共用按 device_id 索引的几张表
+
+    - devices: 每个设备一行，保存当前状态、最后保活时间和最新上报的状态快照
+    - device_events: 锁屏/解锁事件，只追加
+    - device_sessions: 解锁到锁屏的使用会话，只追加
+    - device_daily_stats: 每个设备每天一行的聚合统计，随事件增量更新
+    - device_status_history: 设备上报的状态快照历史
+    - device_status_rollups: 状态快照按小时/天降采样后的聚合（电量、网络类型、温度、存储）
+    - device_telemetry: 从状态快照中提取的数值遥测列，用于按时间范围查询指标序列
+    - device_usage_hourly: 每个设备每小时的亮屏时长、锁屏/解锁次数和会话时长分布，随事件增量更新
+
+    每个事件只追加一行事件（和会话）并对当天的聚合行做一次加法，
+    耗时与设备当天已有的事件数量无关。
+    """
+
+    def __init__(self):
+        legacy_tables = self._find_legacy_tables()
+        backfill_telemetry = not GlobalVars.table_exists(TELEMETRY_TABLE)
+        rebuild_usage = not GlobalVars.table_exists(USAGE_HOURLY_TABLE)
+        self._ensure_schema()
+        for table_name in legacy_tables:
+            self._migrate_legacy_table(table_name)
+        if backfill_telemetry:
+            self._backfill_telemetry()
+        if rebuild_usage or legacy_tables:
+            self._rebuild_usage_hourly()
+        if legacy_tables:
+            GlobalVars.refresh_tables()
+
+    def _ensure_schema(self) -> None:
+        """创建设备相关的表和索引"""
+        GlobalVars.ensure_schema([
+            f'''
+            CREATE TABLE IF NOT EXISTS {DEVICES_TABLE} (
+                device_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                latest_status TEXT,
+                last_keep_alive REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            ''',
+            f'''
+            CREATE TABLE IF NOT EXISTS {DAILY_STATS_TABLE} (
+                device_id TEXT NOT NULL,
+                day TEXT NOT NULL,
+                screen_on_time REAL NOT NULL DEFAULT 0,
+                lock_count INTEGER NOT NULL DEFAULT 0,
+                unlock_count INTEGER NOT NULL DEFAULT 0,
+                session_count INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (device_id, day)
+            )
+            ''',
+            f'''
+            CREATE TABLE IF NOT EXISTS {EVENTS_TABLE} (
+                id INTEGER PRIMARY KEY,
+                device_id TEXT NOT NULL,
+                ts_ms INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                kind TEXT NOT NULL
+            )
+            ''',
+            f"CREATE INDEX IF NOT EXISTS idx_{EVENTS_TABLE}_device_ts ON {EVENTS_TABLE} (device_id, ts_ms)",
+            f'''
+            CREATE TABLE IF NOT EXISTS {SESSIONS_TABLE} (
+                id INTEGER PRIMARY KEY,
+                device_id TEXT NOT NULL,
+                day TEXT NOT NULL,
+                unlock_ts_ms INTEGER NOT NULL,
+                lock_ts_ms INTEGER NOT NULL,
+                duration REAL NOT NULL
+            )
+            ''',
+            f"CREATE INDEX IF NOT EXISTS idx_{SESSIONS_TABLE}_device_day ON {SESSIONS_TABLE} (device_id, day)",
+            f'''
+            CREATE TABLE IF NOT EXISTS {STATUS_HISTORY_TABLE} (
+                id INTEGER PRIMARY KEY,
+                device_id TEXT NOT NULL,
+                ts REAL NOT NULL,
+                data TEXT NOT NULL
+            )
+            ''',
+            f"CREATE INDEX IF NOT EXISTS idx_{STATUS_HISTORY_TABLE}_device_ts ON {STATUS_HISTORY_TABLE} (device_id, ts)",
+            f"CREATE INDEX IF NOT EXISTS idx_{STATUS_HISTORY_TABLE}_ts ON {STATUS_HISTORY_TABLE} (ts)",
+            f'''
+            CREATE TABLE IF NOT EXISTS {STATUS_ROLLUPS_TABLE} (
+                device_id TEXT NOT NULL,
+                granularity TEXT NOT NULL,
+                bucket_start REAL NOT NULL,
+                samples INTEGER NOT NULL,
+                first_ts REAL NOT NULL,
+                last_ts REAL NOT NULL,
+                battery_sum REAL NOT NULL DEFAULT 0,
+                battery_count INTEGER NOT NULL DEFAULT 0,
+                battery_min REAL,
+                battery_max REAL,
+                charging_count INTEGER NOT NULL DEFAULT 0,
+                temperature_sum REAL NOT NULL DEFAULT 0,
+                temperature_count INTEGER NOT NULL DEFAULT 0,
+                temperature_max REAL,
+                storage_sum REAL NOT NULL DEFAULT 0,
+                storage_count INTEGER NOT NULL DEFAULT 0,
+                network_types TEXT NOT NULL DEFAULT '{{}}',
+                PRIMARY KEY (device_id, granularity, bucket_start)
+            )
+            ''',
+            f"CREATE INDEX IF NOT EXISTS idx_{STATUS_ROLLUPS_TABLE}_bucket ON {STATUS_ROLLUPS_TABLE} (granularity, bucket_start)",
+            *telemetry_schema(),
+            *usage_schema(),
+        ])
+        # 早期版本的 devices 表没有单独的保活时间列
+        columns = {row["name"] for row in GlobalVars.query(f"PRAGMA table_info({DEVICES_TABLE})")}
+        if "last_keep_alive" not in columns:
+            GlobalVars.ensure_schema([f"ALTER TABLE {DEVICES_TABLE} ADD COLUMN last_keep_alive REAL"])
+
+    # 旧数据迁移
+    def _find_legacy_tables(self) -> List[str]:
+        """查找旧版本的设备键值表，与新表重名的旧表先改名以免冲突"""
+        legacy_tables = []
+        for table_name in GlobalVars.get_all_tables():
+            if not table_name.startswith(LEGACY_TABLE_PREFIX) or not GlobalVars.is_kv_table(table_name):
+                continue
+            if table_name in STORE_TABLES:
+                renamed = f"legacy_{table_name}"
+                with GlobalVars.transaction() as cursor:
+                    cursor.execute(f"ALTER TABLE {table_name} RENAME TO {renamed}")
+                GlobalVars.refresh_tables()
+                GlobalVars.invalidate_cache(table_name)
+                log.warning(f"旧设备表 {table_name} 与新表重名，已改名为 {renamed}")
+                legacy_tables.append(renamed)
+            else:
+                legacy_tables.append(table_name)
+        return legacy_tables
+
+    def _migrate_legacy_table(self, table_name: str) -> None:
+        """将一个旧设备表的数据导入新表并删除旧表，在一个事务中完成"""
+        device_id = table_name[len("legacy_"):] if table_name.startswith("legacy_") else table_name
+        device_id = device_id[len(LEGACY_TABLE_PREFIX):]
+        legacy = GlobalVars.get_all_from_table(table_name)
+        now = time.time()
+
+        status = legacy.get(LEGACY_STATUS_KEY) or {}
+        latest_status = legacy.get(LEGACY_LATEST_STATUS_KEY)
+        stats_rows = []
+        session_rows = []
+        event_rows = []
+        history_rows = []
+        for key, value in legacy.items():
+            if key.startswith(LEGACY_DAILY_PREFIX) and isinstance(value, dict):
+                day = self._legacy_day(key[len(LEGACY_DAILY_PREFIX):])
+                stats_row, sessions = self._split_daily_record(device_id, day, value, now)
+                stats_rows.append(stats_row)
+                session_rows.extend(sessions)
+                for kind, events_key in (("lock", "lock_events"), ("unlock", "unlock_events")):
+                    for event in value.get(events_key, []):
+                        event_rows.append((device_id, int(event.get("timestamp", 0)), event.get("action", kind), kind))
+            elif LEGACY_STATUS_RECORD_PATTERN.match(key) and isinstance(value, dict):
+                ts = value.get("server_processed_at")
+                if ts is None:
+                    ts = time.mktime(time.strptime(key[len(LEGACY_STATUS_RECORD_PREFIX):], "%Y%m%d_%H%M%S"))
+                history_rows.append((device_id, ts, GlobalVars.encode_value(value)))
+
+        event_rows.sort(key=lambda row: row[1])
+        session_rows.sort(key=lambda row: row[3])
+        history_rows.sort(key=lambda row: row[1])
+        with GlobalVars.transaction() as cursor:
+            cursor.execute(
+                f'''
+                INSERT OR REPLACE INTO {DEVICES_TABLE} (device_id, status, latest_status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ''',
+                (device_id, GlobalVars.encode_value(status),
+                 GlobalVars.encode_value(latest_status) if latest_status is not None else None,
+                 now, status.get("last_update", now))
+            )
+            self._insert_daily_rows(cursor, stats_rows, session_rows)
+            cursor.executemany(
+                f"INSERT INTO {EVENTS_TABLE} (device_id, ts_ms, action, kind) VALUES (?, ?, ?, ?)",
+                event_rows
+            )
+            cursor.executemany(
+                f"INSERT INTO {STATUS_HISTORY_TABLE} (device_id, ts, data) VALUES (?, ?, ?)",
+                history_rows
+            )
+            cursor.execute(f"DROP TABLE {table_name}")
+        GlobalVars.invalidate_cache(table_name)
+
+        log.info(f"已迁移旧设备表 {table_name}: {len(stats_rows)} 天统计, {len(session_rows)} 个会话, "
+                 f"{len(event_rows)} 条事件, {len(history_rows)} 条状态快照")
+
+    def _backfill_telemetry(self, batch_size: int = 500) -> None:
+        """遥测表新建时从已有的状态快照中提取遥测列，分批提交"""
+        last_id = 0
+        total = 0
+        while True:
+            rows = GlobalVars.query(
+                f"SELECT id, device_id, ts, data FROM {STATUS_HISTORY_TABLE} WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size)
+            )
+            if not rows:
+                break
+            telemetry_rows = []
+            for row in rows:
+                snapshot = GlobalVars.decode_value(row["data"])
+                if isinstance(snapshot, dict):
+                    telemetry_rows.append(telemetry_row(row["device_id"], row["ts"], snapshot))
+            with GlobalVars.transaction() as cursor:
+                cursor.executemany(TELEMETRY_INSERT_SQL, telemetry_rows)
+            total += len(telemetry_rows)
+            last_id = rows[-1]["id"]
+        if total:
+            log.info(f"已从状态快照回填 {total} 条遥测数据")
+
+    def _rebuild_usage_hourly(self, batch_size: int = 5000) -> None:
+        """根据已有的事件和会话重新生成每小时使用统计，用于新建表和导入旧数据之后"""
+        deltas_by_device: Dict[str, UsageDeltas] = {}
+        for table, columns in ((EVENTS_TABLE, "ts_ms, kind"), (SESSIONS_TABLE, "unlock_ts_ms, lock_ts_ms, duration")):
+            last_id = 0
+            while True:
+                rows = GlobalVars.query(
+                    f"SELECT id, device_id, {columns} FROM {table} WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size)
+                )
+                if not rows:
+                    break
+                for row in rows:
+                    deltas = deltas_by_device.setdefault(row["device_id"], {})
+                    if table == EVENTS_TABLE:
+                        add_event(deltas, row["ts_ms"], row["kind"])
+                    else:
+                        add_session(deltas, row["unlock_ts_ms"], row["lock_ts_ms"], row["duration"])
+                last_id = rows[-1]["id"]
+
+        now = time.time()
+        with GlobalVars.transaction() as cursor:
+            cursor.execute(f"DELETE FROM {USAGE_HOURLY_TABLE}")
+            for device_id, deltas in deltas_by_device.items():
+                cursor.executemany(USAGE_UPSERT_SQL, usage_rows(device_id, deltas, now))
+        if deltas_by_device:
+            log.info(f"已根据事件和会话生成 {len(deltas_by_device)} 个设备的每小时使用统计")
+
+    @staticmethod
+    def _split_daily_record(device_id: str, day: str, record: Dict[str, Any], now: float):
+        """将一条旧的每日使用记录拆分为聚合统计行和会话行"""
+        sessions = [
+            (device_id, day, int(session.get("unlock_time") or 0), int(session.get("lock_time") or 0),
+             float(session.get("duration") or 0))
+            for session in record.get("usage_sessions", []) if isinstance(session, dict)
+        ]
+        stats_row = (
+            device_id, day, float(record.get("screen_on_time") or 0),
+            len(record.get("lock_events", [])), len(record.get("unlock_events", [])), len(sessions),
+            record.get("last_update", now),
+        )
+        return stats_row, sessions
+
+    @staticmethod
+    def _insert_daily_rows(cursor, stats_rows: List[tuple], session_rows: List[tuple]) -> None:
+        cursor.executemany(
+            f'''
+            INSERT OR REPLACE INTO {DAILY_STATS_TABLE}
+                (device_id, day, screen_on_time, lock_count, unlock_count, session_count, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''',
+            stats_rows
+        )
+        cursor.executemany(
+            f"INSERT INTO {SESSIONS_TABLE} (device_id, day, unlock_ts_ms, lock_ts_ms, duration) VALUES (?, ?, ?, ?, ?)",
+            session_rows
+        )
+
+    @staticmethod
+    def _legacy_day(day: str) -> str:
+        """将旧键中的 YYYYMMDD 转换为 YYYY-MM-DD"""
+        if len(day) == 8 and day.isdigit():
+            return f"{day[:4]}-{day[4:6]}-{day[6:]}"
+        return day
+
+    # 设备
+    def device_exists(self, device_id: str) -> bool:
+        """判断设备是否有记录"""
+        rows = GlobalVars.query(f"SELECT 1 FROM {DEVICES_TABLE} WHERE device_id = ?", (device_id,))
+        return bool(rows)
+
+    def ensure_device(self, device_id: str, default_status: Dict[str, Any]) -> bool:
+        """设备不存在时以默认状态创建，返回是否新建"""
+        now = time.time()
+        with GlobalVars.transaction() as cursor:
+            cursor.execute(
+                f'''
+                INSERT OR IGNORE INTO {DEVICES_TABLE} (device_id, status, latest_status, created_at, updated_at)
+                VALUES (?, ?, NULL, ?, ?)
+                ''',
+                (device_id, GlobalVars.encode_value(default_status), now, now)
+            )
+            return cursor.rowcount > 0
+
+    def get_all_device_ids(self) -> List[str]:
+        """按主键索引列出所有设备ID"""
+        rows = GlobalVars.query(f"SELECT device_id FROM {DEVICES_TABLE} ORDER BY device_id")
+        return [row["device_id"] for row in rows]
+
+    def get_status(self, device_id: str) -> Optional[Dict[str, Any]]:
+        """获取设备当前状态，设备不存在时返回None"""
+        rows = GlobalVars.query(
+            f"SELECT status, last_keep_alive FROM {DEVICES_TABLE} WHERE device_id = ?", (device_id,)
+        )
+        return self._decode_status(rows[0]) if rows else None
+
+    def get_all_statuses(self) -> Dict[str, Dict[str, Any]]:
+        """一次查询获取所有设备的当前状态"""
+        rows = GlobalVars.query(f"SELECT device_id, status, last_keep_alive FROM {DEVICES_TABLE}")
+        return {row["device_id"]: self._decode_status(row) for row in rows}
+
+    @staticmethod
+    def _decode_status(row) -> Dict[str, Any]:
+        """解码状态，并用单独保存的最后保活时间覆盖状态中的旧值"""
+        status = GlobalVars.decode_value(row["status"])
+        if row["last_keep_alive"] is not None and isinstance(status, dict):
+            status["last_keep_alive"] = row["last_keep_alive"]
+        return status
+
+    def set_keep_alive_many(self, keep_alive: Dict[str, float]) -> int:
+        """在一个事务中批量更新设备的最后保活时间，返回更新的设备数"""
+        if not keep_alive:
+            return 0
+        with GlobalVars.transaction() as cursor:
+            cursor.executemany(
+                f"UPDATE {DEVICES_TABLE} SET last_keep_alive = ? WHERE device_id = ?",
+                [(ts, device_id) for device_id, ts in keep_alive.items()]
+            )
+            return cursor.rowcount
+
+    def set_status(self, device_id: str, status: Dict[str, Any]) -> None:
+        """更新设备当前状态"""
+        with GlobalVars.transaction() as cursor:
+            self._write_status(cursor, device_id, status)
+
+    def _write_status(self, cursor, device_id: str, status: Dict[str, Any]) -> None:
+        now = time.time()
+        cursor.execute(
+            f'''
+            INSERT INTO {DEVICES_TABLE} (device_id, status, latest_status, created_at, updated_at)
+            VALUES (?, ?, NULL, ?, ?)
+            ON CONFLICT (device_id) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at
+            ''',
+            (device_id, GlobalVars.encode_value(status), now, now)
+        )
+
+    # 事件、会话与每日统计
+    def get_daily_stats(self, device_id: str, day: str) -> Optional[Dict[str, Any]]:
+        """获取设备某天的聚合统计，当天没有事件时返回None"""
+        rows = GlobalVars.query(
+            f'''
+            SELECT screen_on_time, lock_count, unlock_count, session_count, updated_at
+            FROM {DAILY_STATS_TABLE} WHERE device_id = ? AND day = ?
+            ''',
+            (device_id, day)
+        )
+        return dict(rows[0]) if rows else None
+
+    def get_status_and_daily_stats(self, device_id: str, day: str):
+        """一次查询获取设备当前状态和某天的聚合统计"""
+        rows = GlobalVars.query(
+            f'''
+            SELECT d.status, d.last_keep_alive,
+                   s.screen_on_time, s.lock_count, s.unlock_count, s.session_count, s.updated_at
+            FROM {DEVICES_TABLE} d
+            LEFT JOIN {DAILY_STATS_TABLE} s ON s.device_id = d.device_id AND s.day = ?
+            WHERE d.device_id = ?
+            ''',
+            (day, device_id)
+        )
+        if not rows:
+            return None, None
+        row = rows[0]
+        stats = None
+        if row["updated_at"] is not None:
+            stats = {key: row[key] for key in ("screen_on_time", "lock_count", "unlock_count", "session_count", "updated_at")}
+        return self._decode_status(row), stats
+
+    def get_sessions(self, device_id: str, day: str) -> List[Dict[str, Any]]:
+        """按时间顺序获取设备某天的使用会话"""
+        rows = GlobalVars.query(
+            f'''
+            SELECT unlock_ts_ms, lock_ts_ms, duration FROM {SESSIONS_TABLE}
+            WHERE device_id = ? AND day = ? ORDER BY id
+            ''',
+            (device_id, day)
+        )
+        return [dict(row) for row in rows]
+
+    def get_usage_hourly(self, device_id: str, start_ts: float, end_ts: float) -> List[Dict[str, Any]]:
+        """按主键范围读取设备在 [start_ts, end_ts) 内的每小时使用统计"""
+        rows = GlobalVars.query(
+            f'''
+            SELECT * FROM {USAGE_HOURLY_TABLE}
+            WHERE device_id = ? AND hour_start >= ? AND hour_start < ? ORDER BY hour_start
+            ''',
+            (device_id, start_ts, end_ts)
+        )
+        return [dict(row) for row in rows]
+
+    def record_event(self, device_id: str, status: Dict[str, Any], day: str, ts_ms: int, action: str, kind: str,
+                     session: Optional[Dict[str, Any]] = None) -> None:
+        """在一个事务中追加事件（和结束的会话）、累加当天和每小时的统计并保存设备状态"""
+        self.record_events(device_id, status, [(day, ts_ms, action, kind, session)])
+
+    def record_events(self, device_id: str, status: Dict[str, Any],
+                      events: List[Tuple[str, int, str, str, Optional[Dict[str, Any]]]]) -> None:
+        """在一个事务中追加多条按时间排序的事件 (day, ts_ms, action, kind, session)，
+        每天的统计只累加一次，最后保存设备状态"""
+        now = time.time()
+        event_rows = []
+        session_rows = []
+        daily: Dict[str, List[float]] = {}
+        deltas: UsageDeltas = {}
+        for day, ts_ms, action, kind, session in events:
+            event_rows.append((device_id, int(ts_ms), action, kind))
+            add_event(deltas, ts_ms, kind)
+            totals = daily.setdefault(day, [0.0, 0, 0, 0])
+            totals[1] += int(kind == "lock")
+            totals[2] += int(kind == "unlock")
+            if session:
+                duration = float(session["duration"])
+                session_rows.append((device_id, day, int(session["unlock_time"]), int(session["lock_time"]), duration))
+                add_session(deltas, int(session["unlock_time"]), int(session["lock_time"]), duration)
+                totals[0] += duration
+                totals[3] += 1
+
+        with GlobalVars.transaction() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {EVENTS_TABLE} (device_id, ts_ms, action, kind) VALUES (?, ?, ?, ?)",
+                event_rows
+            )
+            cursor.executemany(
+                f"INSERT INTO {SESSIONS_TABLE} (device_id, day, unlock_ts_ms, lock_ts_ms, duration) VALUES (?, ?, ?, ?, ?)",
+                session_rows
+            )
+            cursor.executemany(
+                f'''
+                INSERT INTO {DAILY_STATS_TABLE}
+                    (device_id, day, screen_on_time, lock_count, unlock_count, session_count, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (device_id, day) DO UPDATE SET
+                    screen_on_time = screen_on_time + excluded.screen_on_time,
+                    lock_count = lock_count + excluded.lock_count,
+                    unlock_count = unlock_count + excluded.unlock_count,
+                    session_count = session_count + excluded.session_count,
+                    updated_at = excluded.updated_at
+                ''',
+                [(device_id, day, *totals, now) for day, totals in daily.items()]
+            )
+            cursor.executemany(USAGE_UPSERT_SQL, usage_rows(device_id, deltas, now))
+            self._write_status(cursor, device_id, status)
+
+    # 状态快照
+    def add_status_snapshot(self, device_id: str, status_data: Dict[str, Any], ts: float) -> None:
+        """在一个事务中追加状态快照和遥测行并更新设备的最新状态"""
+        encoded = GlobalVars.encode_value(status_data)
+        with GlobalVars.transaction() as cursor:
+            cursor.execute(
+                f"INSERT INTO {STATUS_HISTORY_TABLE} (device_id, ts, data) VALUES (?, ?, ?)",
+                (device_id, ts, encoded)
+            )
+            cursor.execute(TELEMETRY_INSERT_SQL, telemetry_row(device_id, ts, status_data))
+            cursor.execute(
+                f"UPDATE {DEVICES_TABLE} SET latest_status = ?, updated_at = ? WHERE device_id = ?",
+                (encoded, ts, device_id)
+            )
+
+    def get_latest_status(self, device_id: str) -> Optional[Dict[str, Any]]:
+        """获取设备最新上报的状态快照"""
+        rows = GlobalVars.query(f"SELECT latest_status FROM {DEVICES_TABLE} WHERE device_id = ?", (device_id,))
+        if not rows or rows[0]["latest_status"] is None:
+            return None
+        return GlobalVars.decode_value(rows[0]["latest_status"])
+
+
+device_store = DeviceStore()
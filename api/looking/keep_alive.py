@@ -0,0 +1,71 @@
+import threading
+from typing import Dict, Optional, Set
+from loguru import logger as log
+from methods.flush_manner import PeriodicFlusher
+from api.looking.device_store import device_store
+from config import looking_keep_alive_flush_interval
+
+
+class KeepAliveBuffer:
+    """设备保活时间的内存缓冲
+
+    保活请求只更新内存中的最后保活时间，由后台线程按固定间隔在一个事务中批量写回，
+    同一设备在一个间隔内的多次保活只写一次。读取设备状态时优先使用内存中的值。
+    """
+
+    def __init__(self, flush_interval: float = looking_keep_alive_flush_interval):
+        self._lock = threading.Lock()
+        self._latest: Dict[str, float] = {}  # 设备ID -> 最后保活时间（含已写回的）
+        self._dirty: Set[str] = set()  # 尚未写回的设备
+        self.flusher = PeriodicFlusher("设备保活", self.flush, flush_interval)
+
+    def start(self) -> None:
+        """启动定期写回"""
+        self.flusher.start()
+
+    def stop(self) -> None:
+        """停止定期写回并写回剩余的保活时间"""
+        self.flusher.stop(flush=True)
+
+    def is_known(self, device_id: str) -> bool:
+        """设备是否已经在缓冲中（即确认存在于数据库）"""
+        with self._lock:
+            return device_id in self._latest
+
+    def touch(self, device_id: str, timestamp: float) -> None:
+        """记录一次保活，只修改内存"""
+        with self._lock:
+            if timestamp >= self._latest.get(device_id, 0):
+                self._latest[device_id] = timestamp
+                self._dirty.add(device_id)
+
+    def get(self, device_id: str) -> Optional[float]:
+        """获取内存中的最后保活时间"""
+        with self._lock:
+            return self._latest.get(device_id)
+
+    def flush(self) -> int:
+        """将尚未写回的保活时间在一个事务内写入数据库，返回写入的设备数"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            pending = {device_id: self._latest[device_id] for device_id in dirty}
+        if not pending:
+            return 0
+
+        try:
+            device_store.set_keep_alive_many(pending)
+        except Exception:
+            with self._lock:
+                self._dirty.update(pending)
+            raise
+
+        log.debug(f"设备保活时间写回完成: {len(pending)} 个设备")
+        return len(pending)
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取缓冲中的设备数和待写回的设备数"""
+        with self._lock:
+            return {"devices": len(self._latest), "pending": len(self._dirty)}
+
+
+keep_alive_buffer = KeepAliveBuffer()
@@ -0,0 +1,367 @@
+import json, time
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger as log
+from methods.globalvar import GlobalVars
+from methods.flush_manner import PeriodicFlusher
+from api.looking.device_store import STATUS_HISTORY_TABLE, STATUS_ROLLUPS_TABLE
+from api.looking.telemetry import TELEMETRY_TABLE
+from config import (
+    looking_status_raw_hours, looking_status_hourly_days, looking_status_daily_days,
+    looking_status_retention_interval, looking_status_retention_batch
+)
+
+HOUR = 3600
+DAY = 86400
+BEIJING_OFFSET = 8 * HOUR  # 按北京时间划分天
+
+# 聚合行中可累加的列
+SUM_FIELDS = ("samples", "battery_sum", "battery_count", "charging_count",
+              "temperature_sum", "temperature_count", "storage_sum", "storage_count")
+ROLLUP_COLUMNS = ("device_id", "granularity", "bucket_start", "first_ts", "last_ts", *SUM_FIELDS,
+                  "battery_min", "battery_max", "temperature_max", "network_types")
+
+
+def hour_start(ts: float) -> float:
+    return float(int(ts // HOUR) * HOUR)
+
+
+def day_start(ts: float) -> float:
+    """北京时间当天0点对应的时间戳"""
+    return float(int((ts + BEIJING_OFFSET) // DAY) * DAY - BEIJING_OFFSET)
+
+
+def _number(value: Any) -> Optional[float]:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def extract_metrics(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """从一条状态快照中提取需要保留的指标"""
+    battery = snapshot.get("battery") or {}
+    thermal = snapshot.get("thermal") or {}
+    storage = (snapshot.get("storage") or {}).get("internal") or {}
+    network = snapshot.get("network") or {}
+    temperature = _number(thermal.get("battery_celsius"))
+    if temperature is None:
+        temperature = _number(battery.get("temperature_celsius"))
+    return {
+        "battery": _number(battery.get("level_percentage")),
+        "charging": battery.get("is_charging") is True,
+        "temperature": temperature,
+        "storage": _number(storage.get("usage_percentage")),
+        "network": network.get("type"),
+    }
+
+
+def _new_rollup(device_id: str, granularity: str, bucket_start: float, ts: float) -> Dict[str, Any]:
+    rollup = {field: 0 for field in SUM_FIELDS}
+    rollup.update({
+        "device_id": device_id, "granularity": granularity, "bucket_start": bucket_start,
+        "first_ts": ts, "last_ts": ts, "battery_min": None, "battery_max": None,
+        "temperature_max": None, "network_types": {},
+    })
+    return rollup
+
+
+def _merge_extreme(current: Optional[float], value: Optional[float], func) -> Optional[float]:
+    if value is None:
+        return current
+    return value if current is None else func(current, value)
+
+
+def _add_snapshot(rollup: Dict[str, Any], ts: float, metrics: Dict[str, Any]) -> None:
+    """将一条快照的指标累加到聚合"""
+    rollup["samples"] += 1
+    rollup["first_ts"] = min(rollup["first_ts"], ts)
+    rollup["last_ts"] = max(rollup["last_ts"], ts)
+    if metrics["battery"] is not None:
+        rollup["battery_sum"] += metrics["battery"]
+        rollup["battery_count"] += 1
+        rollup["battery_min"] = _merge_extreme(rollup["battery_min"], metrics["battery"], min)
+        rollup["battery_max"] = _merge_extreme(rollup["battery_max"], metrics["battery"], max)
+    rollup["charging_count"] += int(metrics["charging"])
+    if metrics["temperature"] is not None:
+        rollup["temperature_sum"] += metrics["temperature"]
+        rollup["temperature_count"] += 1
+        rollup["temperature_max"] = _merge_extreme(rollup["temperature_max"], metrics["temperature"], max)
+    if metrics["storage"] is not None:
+        rollup["storage_sum"] += metrics["storage"]
+        rollup["storage_count"] += 1
+    if metrics["network"]:
+        network_types = rollup["network_types"]
+        network_types[metrics["network"]] = network_types.get(metrics["network"], 0) + 1
+
+
+def _merge_rollup(target: Dict[str, Any], source: Dict[str, Any]) -> None:
+    """将一个聚合合并到另一个聚合"""
+    for field in SUM_FIELDS:
+        target[field] += source[field]
+    target["first_ts"] = min(target["first_ts"], source["first_ts"])
+    target["last_ts"] = max(target["last_ts"], source["last_ts"])
+    target["battery_min"] = _merge_extreme(target["battery_min"], source["battery_min"], min)
+    target["battery_max"] = _merge_extreme(target["battery_max"], source["battery_max"], max)
+    target["temperature_max"] = _merge_extreme(target["temperature_max"], source["temperature_max"], max)
+    for network_type, count in source["network_types"].items():
+        target["network_types"][network_type] = target["network_types"].get(network_type, 0) + count
+
+
+def _row_to_rollup(row) -> Dict[str, Any]:
+    rollup = {column: row[column] for column in ROLLUP_COLUMNS}
+    rollup["network_types"] = json.loads(row["network_types"] or "{}")
+    return rollup
+
+
+def format_rollup(rollup: Dict[str, Any]) -> Dict[str, Any]:
+    """将聚合转换为对外展示的平均值等指标"""
+    def average(total: str, count: str) -> Optional[float]:
+        return round(rollup[total] / rollup[count], 2) if rollup[count] else None
+
+    return {
+        "granularity": rollup["granularity"],
+        "bucket_start": rollup["bucket_start"],
+        "samples": rollup["samples"],
+        "battery_avg": average("battery_sum", "battery_count"),
+        "battery_min": rollup["battery_min"],
+        "battery_max": rollup["battery_max"],
+        "charging_ratio": round(rollup["charging_count"] / rollup["samples"], 4) if rollup["samples"] else None,
+        "temperature_avg": average("temperature_sum", "temperature_count"),
+        "temperature_max": rollup["temperature_max"],
+        "storage_usage_avg": average("storage_sum", "storage_count"),
+        "network_types": rollup["network_types"],
+    }
+
+
+class StatusRetention:
+    """设备状态历史的保留策略
+
+    - 最近 raw_hours 小时内的快照保留原始精度
+    - 更早的快照降采样为按小时的聚合后删除
+    - 超过 hourly_days 天的小时聚合合并为按天（北京时间）的聚合
+    - 超过 daily_days 天的天聚合删除，0 表示永久保留
+    - 遥测列与小时聚合保留相同的天数
+
+    后台任务每隔 interval 秒执行一次，每批最多处理 batch 行并单独提交，避免长时间占用写锁。
+    """
+
+    def __init__(self, raw_hours: float = looking_status_raw_hours, hourly_days: float = looking_status_hourly_days,
+                 daily_days: float = looking_status_daily_days, interval: float = looking_status_retention_interval,
+                 batch: int = looking_status_retention_batch):
+        self.raw_hours = raw_hours
+        self.hourly_days = hourly_days
+        self.daily_days = daily_days
+        self.batch = max(1, int(batch))
+        self.flusher = PeriodicFlusher("设备状态历史清理", self.run, interval, flush_on_stop=False) if interval > 0 else None
+        self._stats = {
+            "runs": 0, "last_run": None, "last_duration_ms": 0.0,
+            "raw_downsampled": 0, "hourly_downsampled": 0, "daily_deleted": 0, "telemetry_deleted": 0,
+            "last_reclaimed_bytes": 0, "total_reclaimed_bytes": 0,
+        }
+
+    def start(self) -> None:
+        """启动后台保留策略任务"""
+        if self.flusher is not None:
+            self.flusher.start()
+
+    def stop(self) -> None:
+        """停止后台保留策略任务"""
+        if self.flusher is not None:
+            self.flusher.stop(flush=False)
+
+    def run(self, now: Optional[float] = None) -> int:
+        """执行一轮保留策略，返回处理的行数"""
+        now = now or time.time()
+        start = time.perf_counter()
+        raw_rows = hourly_rows = daily_rows = telemetry_rows = reclaimed = 0
+
+        raw_cutoff = now - self.raw_hours * HOUR
+        while True:
+            processed, reclaimed_bytes = self._downsample_raw(raw_cutoff)
+            raw_rows += processed
+            reclaimed += reclaimed_bytes
+            if processed < self.batch:
+                break
+
+        hourly_cutoff = now - self.hourly_days * DAY
+        while True:
+            processed = self._downsample_hourly(hourly_cutoff)
+            hourly_rows += processed
+            if processed < self.batch:
+                break
+
+        while True:
+            processed = self._delete_telemetry(hourly_cutoff)
+            telemetry_rows += processed
+            if processed < self.batch:
+                break
+
+        if self.daily_days > 0:
+            daily_cutoff = now - self.daily_days * DAY
+            while True:
+                processed = self._delete_daily(daily_cutoff)
+                daily_rows += processed
+                if processed < self.batch:
+                    break
+
+        duration_ms = (time.perf_counter() - start) * 1000
+        stats = self._stats
+        stats["runs"] += 1
+        stats["last_run"] = now
+        stats["last_duration_ms"] = round(duration_ms, 2)
+        stats["raw_downsampled"] += raw_rows
+        stats["hourly_downsampled"] += hourly_rows
+        stats["daily_deleted"] += daily_rows
+        stats["telemetry_deleted"] += telemetry_rows
+        stats["last_reclaimed_bytes"] = reclaimed
+        stats["total_reclaimed_bytes"] += reclaimed
+
+        total = raw_rows + hourly_rows + daily_rows + telemetry_rows
+        if total:
+            log.info(f"设备状态历史清理完成: 降采样 {raw_rows} 条快照, 合并 {hourly_rows} 条小时聚合, "
+                     f"删除 {daily_rows} 条天聚合和 {telemetry_rows} 条遥测, 回收 {reclaimed} 字节, "
+                     f"耗时 {duration_ms:.1f}ms")
+        return total
+
+    def _downsample_raw(self, cutoff: float) -> Tuple[int, int]:
+        """将一批早于 cutoff 的快照合并到小时聚合并删除，返回 (处理行数, 删除的快照字节数)"""
+        with GlobalVars.transaction() as cursor:
+            cursor.execute(
+                f"SELECT id, device_id, ts, data FROM {STATUS_HISTORY_TABLE} WHERE ts < ? ORDER BY ts LIMIT ?",
+                (cutoff, self.batch)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                return 0, 0
+
+            rollups: Dict[Tuple[str, str, float], Dict[str, Any]] = {}
+            reclaimed = 0
+            for row in rows:
+                data = row["data"]
+                reclaimed += len(data.encode("utf-8")) if isinstance(data, str) else len(data)
+                snapshot = GlobalVars.decode_value(data)
+                key = (row["device_id"], "hour", hour_start(row["ts"]))
+                rollup = rollups.get(key)
+                if rollup is None:
+                    rollup = rollups[key] = _new_rollup(*key, row["ts"])
+                _add_snapshot(rollup, row["ts"], extract_metrics(snapshot if isinstance(snapshot, dict) else {}))
+
+            self._upsert_rollups(cursor, rollups)
+            cursor.executemany(f"DELETE FROM {STATUS_HISTORY_TABLE} WHERE id = ?", [(row["id"],) for row in rows])
+        return len(rows), reclaimed
+
+    def _downsample_hourly(self, cutoff: float) -> int:
+        """将一批结束时间早于 cutoff 的小时聚合合并到天聚合并删除"""
+        with GlobalVars.transaction() as cursor:
+            cursor.execute(
+                f'''
+                SELECT * FROM {STATUS_ROLLUPS_TABLE}
+                WHERE granularity = 'hour' AND bucket_start <= ? ORDER BY bucket_start LIMIT ?
+                ''',
+                (cutoff - HOUR, self.batch)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                return 0
+
+            rollups: Dict[Tuple[str, str, float], Dict[str, Any]] = {}
+            for row in rows:
+                hourly = _row_to_rollup(row)
+                key = (hourly["device_id"], "day", day_start(hourly["bucket_start"]))
+                rollup = rollups.get(key)
+                if rollup is None:
+                    rollup = rollups[key] = _new_rollup(*key, hourly["first_ts"])
+                _merge_rollup(rollup, hourly)
+
+            self._upsert_rollups(cursor, rollups)
+            cursor.executemany(
+                f"DELETE FROM {STATUS_ROLLUPS_TABLE} WHERE device_id = ? AND granularity = 'hour' AND bucket_start = ?",
+                [(row["device_id"], row["bucket_start"]) for row in rows]
+            )
+        return len(rows)
+
+    def _delete_daily(self, cutoff: float) -> int:
+        """删除一批结束时间早于 cutoff 的天聚合"""
+        with GlobalVars.transaction() as cursor:
+            cursor.execute(
+                f'''
+                DELETE FROM {STATUS_ROLLUPS_TABLE} WHERE rowid IN (
+                    SELECT rowid FROM {STATUS_ROLLUPS_TABLE}
+                    WHERE granularity = 'day' AND bucket_start <= ? LIMIT ?
+                )
+                ''',
+                (cutoff - DAY, self.batch)
+            )
+            return cursor.rowcount
+
+    def _delete_telemetry(self, cutoff: float) -> int:
+        """删除一批早于 cutoff 的遥测行"""
+        with GlobalVars.transaction() as cursor:
+            cursor.execute(
+                f"DELETE FROM {TELEMETRY_TABLE} WHERE id IN (SELECT id FROM {TELEMETRY_TABLE} WHERE ts < ? LIMIT ?)",
+                (cutoff, self.batch)
+            )
+            return cursor.rowcount
+
+    @staticmethod
+    def _upsert_rollups(cursor, rollups: Dict[Tuple[str, str, float], Dict[str, Any]]) -> None:
+        """与已有的聚合行合并后写回"""
+        for (device_id, granularity, bucket_start), rollup in rollups.items():
+            cursor.execute(
+                f"SELECT * FROM {STATUS_ROLLUPS_TABLE} WHERE device_id = ? AND granularity = ? AND bucket_start = ?",
+                (device_id, granularity, bucket_start)
+            )
+            existing = cursor.fetchone()
+            if existing is not None:
+                _merge_rollup(rollup, _row_to_rollup(existing))
+
+        cursor.executemany(
+            f'''
+            INSERT OR REPLACE INTO {STATUS_ROLLUPS_TABLE} ({", ".join(ROLLUP_COLUMNS)})
+            VALUES ({", ".join("?" for _ in ROLLUP_COLUMNS)})
+            ''',
+            [
+                tuple(json.dumps(rollup[column], ensure_ascii=False) if column == "network_types" else rollup[column]
+                      for column in ROLLUP_COLUMNS)
+                for rollup in rollups.values()
+            ]
+        )
+
+    def get_rollups(self, device_id: str, granularity: str, start_ts: float,
+                    end_ts: Optional[float] = None) -> List[Dict[str, Any]]:
+        """按时间顺序获取设备在时间范围内的小时或天聚合"""
+        rows = GlobalVars.query(
+            f'''
+            SELECT * FROM {STATUS_ROLLUPS_TABLE}
+            WHERE device_id = ? AND granularity = ? AND bucket_start BETWEEN ? AND ?
+            ORDER BY bucket_start
+            ''',
+            (device_id, granularity, start_ts, end_ts if end_ts is not None else time.time())
+        )
+        return [format_rollup(_row_to_rollup(row)) for row in rows]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取保留策略的配置和执行统计，包括数据库中可复用的空闲页大小"""
+        page_size = GlobalVars.query("PRAGMA page_size")[0][0]
+        freelist = GlobalVars.query("PRAGMA freelist_count")[0][0]
+        counts = GlobalVars.query(
+            f'''
+            SELECT (SELECT COUNT(*) FROM {STATUS_HISTORY_TABLE}) AS raw,
+                   (SELECT COUNT(*) FROM {STATUS_ROLLUPS_TABLE} WHERE granularity = 'hour') AS hourly,
+                   (SELECT COUNT(*) FROM {STATUS_ROLLUPS_TABLE} WHERE granularity = 'day') AS daily,
+                   (SELECT COUNT(*) FROM {TELEMETRY_TABLE}) AS telemetry
+            '''
+        )[0]
+        return {
+            "raw_hours": self.raw_hours,
+            "hourly_days": self.hourly_days,
+            "daily_days": self.daily_days,
+            "batch": self.batch,
+            "interval_seconds": self.flusher.interval if self.flusher else 0,
+            "raw_snapshots": counts["raw"],
+            "hourly_rollups": counts["hourly"],
+            "daily_rollups": counts["daily"],
+            "telemetry_rows": counts["telemetry"],
+            "freelist_bytes": page_size * freelist,
+            **self._stats,
+        }
+
+
+status_retention = StatusRetention()
@@ -0,0 +1,139 @@
+import threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from api.looking.utils import compute_signature
+from config import looking_signature_cache_devices
+
+
+class _SignatureWindow:
+    """单个 (device_id, event_type) 的滑动窗口：秒级时间桶 -> 签名"""
+
+    __slots__ = ("buckets", "lookup", "latest")
+
+    def __init__(self):
+        self.buckets: Dict[int, str] = {}
+        self.lookup: Dict[str, int] = {}
+        self.latest: Optional[int] = None
+
+
+class SignatureWindowCache:
+    """基于时间窗口的签名验证缓存
+
+    服务器当前时间前后 tolerance 秒内每一秒（毫秒时间戳按整秒对齐）的候选签名按
+    (device_id, event_type) 缓存，窗口随时间滑动，每个设备每秒只需新计算一个签名，
+    验证只是一次字典查找。请求带有 X-Timestamp 时直接按该时间戳计算一次签名验证。
+    """
+
+    def __init__(self, tolerance: int = 3, max_keys: int = looking_signature_cache_devices):
+        self.tolerance = tolerance
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[Tuple[str, str], _SignatureWindow]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.computed = 0
+        self.explicit = 0
+        self.evictions = 0
+        self._latency_count = 0
+        self._latency_total_us = 0.0
+        self._latency_max_us = 0.0
+
+    def verify(self, device_id: str, event_type: str, signature: str,
+               client_timestamp: Optional[str] = None) -> Tuple[bool, Optional[int], Optional[int]]:
+        """验证签名，返回 (是否通过, 匹配的毫秒时间戳, 相对服务器时间的偏移秒数)"""
+        start = time.perf_counter()
+        try:
+            now_ms = int(time.time() * 1000)
+            signature = signature.lower()
+            if client_timestamp:
+                result = self._verify_explicit(device_id, event_type, signature, client_timestamp, now_ms)
+                if result[0]:
+                    return result
+            return self._verify_window(device_id, event_type, signature, now_ms)
+        finally:
+            self._record_latency((time.perf_counter() - start) * 1e6)
+
+    def _verify_explicit(self, device_id: str, event_type: str, signature: str, client_timestamp: str,
+                         now_ms: int) -> Tuple[bool, Optional[int], Optional[int]]:
+        """按客户端提供的时间戳验证，时间戳需在容差范围内"""
+        try:
+            timestamp_ms = int(client_timestamp)
+        except ValueError:
+            return False, None, None
+        offset_ms = timestamp_ms - now_ms
+        if abs(offset_ms) > self.tolerance * 1000:
+            return False, None, None
+
+        with self._lock:
+            self.explicit += 1
+            self.computed += 1
+        if compute_signature(device_id, event_type, client_timestamp) == signature:
+            return True, timestamp_ms, round(offset_ms / 1000)
+        return False, None, None
+
+    def _verify_window(self, device_id: str, event_type: str, signature: str,
+                       now_ms: int) -> Tuple[bool, Optional[int], Optional[int]]:
+        """在缓存的时间窗口内查找签名"""
+        now_s = now_ms // 1000
+        with self._lock:
+            window = self._get_window(device_id, event_type)
+            self._advance(window, device_id, event_type, now_s)
+            bucket = window.lookup.get(signature)
+            if bucket is None:
+                self.misses += 1
+                return False, None, None
+            self.hits += 1
+        return True, bucket * 1000, bucket - now_s
+
+    def _get_window(self, device_id: str, event_type: str) -> _SignatureWindow:
+        """获取或创建窗口，超过上限时淘汰最久未使用的设备"""
+        key = (device_id, event_type)
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = _SignatureWindow()
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._windows.move_to_end(key)
+        return window
+
+    def _advance(self, window: _SignatureWindow, device_id: str, event_type: str, now_s: int) -> None:
+        """将窗口滑动到 [now_s - tolerance, now_s + tolerance]，只计算新进入窗口的时间桶"""
+        low, high = now_s - self.tolerance, now_s + self.tolerance
+        if window.latest is not None and window.latest >= high:
+            return
+        first = low if window.latest is None or window.latest < low else window.latest + 1
+        for bucket in range(first, high + 1):
+            signature = compute_signature(device_id, event_type, str(bucket * 1000))
+            window.buckets[bucket] = signature
+            window.lookup[signature] = bucket
+            self.computed += 1
+        window.latest = high
+        for bucket in [bucket for bucket in window.buckets if bucket < low]:
+            del window.lookup[window.buckets.pop(bucket)]
+
+    def _record_latency(self, latency_us: float) -> None:
+        with self._lock:
+            self._latency_count += 1
+            self._latency_total_us += latency_us
+            self._latency_max_us = max(self._latency_max_us, latency_us)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中率和验证耗时统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "tolerance_seconds": self.tolerance,
+                "cached_keys": len(self._windows),
+                "max_keys": self.max_keys,
+                "window_hits": self.hits,
+                "window_misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "explicit_timestamp_checks": self.explicit,
+                "signatures_computed": self.computed,
+                "evictions": self.evictions,
+                "verifications": self._latency_count,
+                "avg_latency_us": round(self._latency_total_us / self._latency_count, 2) if self._latency_count else 0.0,
+                "max_latency_us": round(self._latency_max_us, 2),
+            }
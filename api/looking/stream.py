@@ -0,0 +1,142 @@
+import asyncio, json, threading, time
+from typing import Any, AsyncIterator, Dict, Optional, Set
+from loguru import logger as log
+from config import looking_stream_queue_size, looking_stream_max_subscribers, looking_stream_heartbeat
+
+
+class StreamLimitError(Exception):
+    """订阅者数量达到上限"""
+
+
+class _Subscriber:
+    """一个SSE连接：有界队列和所属的事件循环"""
+
+    __slots__ = ("device_id", "queue", "loop", "dropped", "delivered", "connected_at")
+
+    def __init__(self, device_id: Optional[str], queue_size: int, loop: asyncio.AbstractEventLoop):
+        self.device_id = device_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.loop = loop
+        self.dropped = 0
+        self.delivered = 0
+        self.connected_at = time.time()
+
+
+def format_sse(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    """编码为一条SSE消息"""
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class DeviceStreamHub:
+    """进程内的设备状态发布/订阅中心
+
+    设备事件、状态上报和保活超时自动锁定在写线程中调用 publish，每条消息只编码一次，
+    再通过 call_soon_threadsafe 投递到各订阅者所在事件循环的有界队列。
+    订阅者消费过慢、队列满时丢弃最旧的消息，并在下一条消息前发送 lagged 事件告知丢弃数量，
+    客户端可据此重新拉取完整状态；发布方永远不会被慢订阅者阻塞。
+    """
+
+    def __init__(self, queue_size: int = looking_stream_queue_size,
+                 max_subscribers: int = looking_stream_max_subscribers):
+        self.queue_size = max(1, int(queue_size))
+        self.max_subscribers = max_subscribers
+        self._subscribers: Dict[Optional[str], Set[_Subscriber]] = {}  # None 表示订阅所有设备
+        self._count = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def subscribe(self, device_id: Optional[str] = None) -> _Subscriber:
+        """在事件循环中创建订阅，device_id 为 None 时订阅所有设备"""
+        subscriber = _Subscriber(device_id, self.queue_size, asyncio.get_running_loop())
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                self.rejected += 1
+                raise StreamLimitError(f"订阅数已达上限 {self.max_subscribers}")
+            self._subscribers.setdefault(device_id, set()).add(subscriber)
+            self._count += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.device_id)
+            if subscribers is None or subscriber not in subscribers:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.device_id]
+            self._count -= 1
+
+    def has_subscribers(self, device_id: str) -> bool:
+        """是否有人订阅该设备，没有订阅者时发布方可以跳过构造消息"""
+        return device_id in self._subscribers or None in self._subscribers
+
+    def publish(self, device_id: str, event: str, data: Dict[str, Any]) -> int:
+        """向订阅该设备和订阅所有设备的连接发布消息，可在任意线程调用，返回投递的订阅者数"""
+        with self._lock:
+            subscribers = [*self._subscribers.get(device_id, ()), *self._subscribers.get(None, ())]
+            if not subscribers:
+                return 0
+            self._sequence += 1
+            self.published += 1
+            sequence = self._sequence
+
+        payload = format_sse(event, {"device_id": device_id, "ts": time.time(), **data}, sequence)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(self._deliver, subscriber, payload)
+            except RuntimeError:
+                # 事件循环已关闭
+                self.unsubscribe(subscriber)
+        return len(subscribers)
+
+    def _deliver(self, subscriber: _Subscriber, payload: str) -> None:
+        """在订阅者的事件循环中入队，队列满时丢弃最旧的消息"""
+        queue = subscriber.queue
+        if queue.full():
+            queue.get_nowait()
+            subscriber.dropped += 1
+            with self._lock:
+                self.dropped += 1
+        queue.put_nowait(payload)
+
+    async def stream(self, subscriber: _Subscriber, initial: Optional[str] = None,
+                     heartbeat: float = looking_stream_heartbeat) -> AsyncIterator[str]:
+        """SSE消息生成器，空闲时定期发送注释行保持连接，连接断开后自动取消订阅"""
+        try:
+            if initial:
+                yield initial
+            while True:
+                try:
+                    payload = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if subscriber.dropped:
+                    yield format_sse("lagged", {"dropped": subscriber.dropped})
+                    subscriber.dropped = 0
+                subscriber.delivered += 1
+                yield payload
+        finally:
+            self.unsubscribe(subscriber)
+            log.debug(f"设备状态订阅已断开: {subscriber.device_id or '全部设备'}, 已推送 {subscriber.delivered} 条")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取订阅数和发布/丢弃统计"""
+        with self._lock:
+            return {
+                "subscribers": self._count,
+                "max_subscribers": self.max_subscribers,
+                "queue_size": self.queue_size,
+                "subscribed_devices": {device_id or "*": len(subscribers)
+                                       for device_id, subscribers in self._subscribers.items()},
+                "published": self.published,
+                "dropped": self.dropped,
+                "rejected": self.rejected,
+            }
+
+
+device_stream_hub = DeviceStreamHub()
@@ -0,0 +1,189 @@
+import math
+from typing import Any, Dict, List, Optional, Tuple
+from methods.globalvar import GlobalVars
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TELEMETRY_TABLE = "device_telemetry"
+
+# 数值型遥测列: 列名 -> (SQL类型, 说明)
+TELEMETRY_COLUMNS = {
+    "battery_level": ("REAL", "电量百分比"),
+    "is_charging": ("INTEGER", "是否充电"),
+    "battery_temperature": ("REAL", "电池温度（摄氏度）"),
+    "battery_voltage_mv": ("REAL", "电池电压（毫伏）"),
+    "has_internet": ("INTEGER", "是否可访问互联网"),
+    "wifi_signal_dbm": ("REAL", "WiFi信号强度（dBm）"),
+    "wifi_link_mbps": ("REAL", "WiFi连接速率（Mbps）"),
+    "cpu_max_mhz": ("REAL", "CPU最高频率（MHz）"),
+    "thermal_max": ("REAL", "所有温度区域的最高温度"),
+    "thermal_avg": ("REAL", "所有温度区域的平均温度"),
+    "storage_usage": ("REAL", "内部存储使用率"),
+    "storage_available_bytes": ("REAL", "内部存储可用字节数"),
+    "uptime_ms": ("REAL", "系统运行时间（毫秒）"),
+}
+
+
+def telemetry_schema() -> List[str]:
+    """遥测表的建表语句，每次上报一行，数值字段为独立的列"""
+    columns = ",\n".join(f"    {name} {sql_type}" for name, (sql_type, _) in TELEMETRY_COLUMNS.items())
+    return [
+        f'''
+        CREATE TABLE IF NOT EXISTS {TELEMETRY_TABLE} (
+            id INTEGER PRIMARY KEY,
+            device_id TEXT NOT NULL,
+            ts REAL NOT NULL,
+            network_type TEXT,
+        {columns}
+        )
+        ''',
+        f"CREATE INDEX IF NOT EXISTS idx_{TELEMETRY_TABLE}_device_ts ON {TELEMETRY_TABLE} (device_id, ts)",
+        f"CREATE INDEX IF NOT EXISTS idx_{TELEMETRY_TABLE}_ts ON {TELEMETRY_TABLE} (ts)",
+    ]
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return float(value)
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def extract_telemetry(status: Dict[str, Any]) -> Dict[str, Any]:
+    """从设备上报的状态中提取遥测列，缺失的字段为None"""
+    battery = status.get("battery") or {}
+    network = status.get("network") or {}
+    wifi = network.get("wifi_details") or {}
+    cpu = status.get("cpu") or {}
+    thermal = status.get("thermal") or {}
+    storage = (status.get("storage") or {}).get("internal") or {}
+    uptime = status.get("uptime") or {}
+
+    zones = [zone.get("celsius") for zone in thermal.get("thermal_zones") or [] if isinstance(zone, dict)]
+    zones = [value for value in zones if _number(value) is not None]
+    battery_temperature = _number(battery.get("temperature_celsius"))
+    if battery_temperature is None:
+        battery_temperature = _number(thermal.get("battery_celsius"))
+
+    return {
+        "network_type": network.get("type"),
+        "battery_level": _number(battery.get("level_percentage")),
+        "is_charging": _number(battery.get("is_charging")),
+        "battery_temperature": battery_temperature,
+        "battery_voltage_mv": _number(battery.get("voltage_mv")),
+        "has_internet": _number(network.get("has_internet")),
+        "wifi_signal_dbm": _number(wifi.get("signal_strength_dbm")),
+        "wifi_link_mbps": _number(wifi.get("link_speed_mbps")),
+        "cpu_max_mhz": _number(cpu.get("max_frequency_mhz")),
+        "thermal_max": max(zones) if zones else None,
+        "thermal_avg": sum(zones) / len(zones) if zones else None,
+        "storage_usage": _number(storage.get("usage_percentage")),
+        "storage_available_bytes": _number(storage.get("available_bytes")),
+        "uptime_ms": _number(uptime.get("total_milliseconds")),
+    }
+
+
+TELEMETRY_INSERT_COLUMNS = ("device_id", "ts", "network_type", *TELEMETRY_COLUMNS)
+TELEMETRY_INSERT_SQL = (
+    f"INSERT INTO {TELEMETRY_TABLE} ({', '.join(TELEMETRY_INSERT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in TELEMETRY_INSERT_COLUMNS)})"
+)
+
+
+def telemetry_row(device_id: str, ts: float, status: Dict[str, Any]) -> Tuple:
+    """生成遥测表的一行"""
+    telemetry = extract_telemetry(status)
+    return (device_id, ts, *(telemetry[column] for column in TELEMETRY_INSERT_COLUMNS[2:]))
+
+
+def query_series(device_id: str, fields: List[str], start_ts: float, end_ts: float,
+                 points: int) -> Dict[str, Any]:
+    """按时间范围读取遥测列并降采样为最多 points 个时间桶，每个桶给出平均/最小/最大值和样本数
+
+    安装了 numpy 时使用向量化聚合，否则逐行聚合，结果相同。
+    """
+    unknown = [field for field in fields if field not in TELEMETRY_COLUMNS]
+    if unknown:
+        raise ValueError(f"不支持的指标: {', '.join(unknown)}，可选: {', '.join(TELEMETRY_COLUMNS)}")
+    points = max(1, int(points))
+    bucket_seconds = max(1.0, math.ceil((end_ts - start_ts) / points))
+
+    rows = GlobalVars.query(
+        f'''
+        SELECT ts, {", ".join(fields)} FROM {TELEMETRY_TABLE}
+        WHERE device_id = ? AND ts >= ? AND ts < ? ORDER BY ts
+        ''',
+        (device_id, start_ts, end_ts)
+    )
+    aggregate = _aggregate_numpy if numpy is not None else _aggregate_python
+    buckets, series = aggregate(rows, fields, start_ts, bucket_seconds)
+    return {
+        "start": start_ts,
+        "end": end_ts,
+        "bucket_seconds": bucket_seconds,
+        "engine": "numpy" if numpy is not None else "python",
+        "samples": len(rows),
+        "timestamps": buckets,
+        "series": series,
+    }
+
+
+def _aggregate_numpy(rows, fields: List[str], start_ts: float, bucket_seconds: float):
+    if not rows:
+        return [], {field: {"avg": [], "min": [], "max": [], "count": []} for field in fields}
+
+    data = numpy.array([tuple(row) for row in rows], dtype=float)  # None 转换为 NaN
+    bucket_index = ((data[:, 0] - start_ts) // bucket_seconds).astype(numpy.int64)
+    occupied, inverse = numpy.unique(bucket_index, return_inverse=True)
+    size = len(occupied)
+
+    series = {}
+    for column, field in enumerate(fields, start=1):
+        values = data[:, column]
+        valid = ~numpy.isnan(values)
+        groups = inverse[valid]
+        valid_values = values[valid]
+        counts = numpy.bincount(groups, minlength=size)
+        sums = numpy.bincount(groups, weights=valid_values, minlength=size)
+        minimums = numpy.full(size, numpy.inf)
+        maximums = numpy.full(size, -numpy.inf)
+        numpy.minimum.at(minimums, groups, valid_values)
+        numpy.maximum.at(maximums, groups, valid_values)
+        empty = counts == 0
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            averages = sums / counts
+        series[field] = {
+            "avg": [None if flag else round(float(value), 4) for flag, value in zip(empty, averages)],
+            "min": [None if flag else float(value) for flag, value in zip(empty, minimums)],
+            "max": [None if flag else float(value) for flag, value in zip(empty, maximums)],
+            "count": [int(value) for value in counts],
+        }
+    buckets = [start_ts + int(index) * bucket_seconds for index in occupied]
+    return buckets, series
+
+
+def _aggregate_python(rows, fields: List[str], start_ts: float, bucket_seconds: float):
+    grouped: Dict[int, List] = {}
+    for row in rows:
+        grouped.setdefault(int((row[0] - start_ts) // bucket_seconds), []).append(row)
+
+    occupied = sorted(grouped)
+    series = {field: {"avg": [], "min": [], "max": [], "count": []} for field in fields}
+    for index in occupied:
+        bucket_rows = grouped[index]
+        for column, field in enumerate(fields, start=1):
+            values = [row[column] for row in bucket_rows if row[column] is not None]
+            target = series[field]
+            target["count"].append(len(values))
+            if values:
+                target["avg"].append(round(sum(values) / len(values), 4))
+                target["min"].append(float(min(values)))
+                target["max"].append(float(max(values)))
+            else:
+                target["avg"].append(None)
+                target["min"].append(None)
+                target["max"].append(None)
+    buckets = [start_ts + index * bucket_seconds for index in occupied]
+    return buckets, series
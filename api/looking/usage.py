@@ -0,0 +1,110 @@
+import calendar, time
+from typing import Dict, List, Tuple
+from config import looking_session_max_hours
+
+USAGE_HOURLY_TABLE = "device_usage_hourly"
+
+HOUR = 3600
+BEIJING_OFFSET = 8 * HOUR  # 按北京时间划分天和小时
+MAX_SESSION_SECONDS = looking_session_max_hours * HOUR
+
+# 会话时长分布: (列名后缀, 上限秒数)，最后一档没有上限
+SESSION_HISTOGRAM = (("lt_1m", 60), ("1m_5m", 300), ("5m_15m", 900), ("15m_1h", 3600), ("ge_1h", None))
+HISTOGRAM_COLUMNS = tuple(f"sessions_{name}" for name, _ in SESSION_HISTOGRAM)
+USAGE_COLUMNS = ("screen_on_time", "unlock_count", "lock_count", "session_count", *HISTOGRAM_COLUMNS)
+
+
+def usage_schema() -> List[str]:
+    """每小时使用统计表的建表语句，主键 (device_id, hour_start) 同时用于按时间范围查询"""
+    columns = ",\n".join(f"    {name} {'REAL' if name == 'screen_on_time' else 'INTEGER'} NOT NULL DEFAULT 0"
+                         for name in USAGE_COLUMNS)
+    return [
+        f'''
+        CREATE TABLE IF NOT EXISTS {USAGE_HOURLY_TABLE} (
+            device_id TEXT NOT NULL,
+            hour_start REAL NOT NULL,
+        {columns},
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (device_id, hour_start)
+        )
+        ''',
+    ]
+
+
+USAGE_UPSERT_SQL = (
+    f"INSERT INTO {USAGE_HOURLY_TABLE} (device_id, hour_start, {', '.join(USAGE_COLUMNS)}, updated_at) "
+    f"VALUES ({', '.join('?' for _ in range(len(USAGE_COLUMNS) + 3))}) "
+    f"ON CONFLICT (device_id, hour_start) DO UPDATE SET "
+    + ", ".join(f"{name} = {name} + excluded.{name}" for name in USAGE_COLUMNS)
+    + ", updated_at = excluded.updated_at"
+)
+
+# 小时起点 -> 与 USAGE_COLUMNS 对应的增量
+UsageDeltas = Dict[float, List[float]]
+
+
+def hour_start(ts: float) -> float:
+    return float(int(ts // HOUR) * HOUR)
+
+
+def day_to_ts(day: str) -> float:
+    """北京时间 YYYY-MM-DD 当天0点对应的时间戳"""
+    return float(calendar.timegm(time.strptime(day, "%Y-%m-%d")) - BEIJING_OFFSET)
+
+
+def ts_to_day_hour(ts: float) -> Tuple[str, int]:
+    """时间戳对应的北京时间日期和小时"""
+    beijing = time.gmtime(ts + BEIJING_OFFSET)
+    return time.strftime("%Y-%m-%d", beijing), beijing.tm_hour
+
+
+def histogram_column(duration: float) -> str:
+    """会话时长所属的分布列"""
+    for (_, limit), column in zip(SESSION_HISTOGRAM, HISTOGRAM_COLUMNS):
+        if limit is not None and duration < limit:
+            return column
+    return HISTOGRAM_COLUMNS[-1]
+
+
+def _delta(deltas: UsageDeltas, ts: float) -> List[float]:
+    start = hour_start(ts)
+    delta = deltas.get(start)
+    if delta is None:
+        delta = deltas[start] = [0] * len(USAGE_COLUMNS)
+    return delta
+
+
+def add_event(deltas: UsageDeltas, ts_ms: int, kind: str) -> None:
+    """将一次锁屏/解锁计入事件所在的小时"""
+    if kind in ("unlock", "lock"):
+        _delta(deltas, ts_ms / 1000)[USAGE_COLUMNS.index(f"{kind}_count")] += 1
+
+
+def add_session(deltas: UsageDeltas, unlock_ts_ms: int, lock_ts_ms: int, duration: float) -> None:
+    """将一个结束的会话计入统计
+
+    会话数和时长分布计入解锁所在的小时，亮屏时长按会话跨越的每个小时分摊；
+    时间戳不完整的旧会话整体计入锁屏所在的小时。
+    超过 MAX_SESSION_SECONDS 的会话不计入，与 create_usage_session 的判断一致。
+    """
+    duration = max(0.0, float(duration))
+    if duration > MAX_SESSION_SECONDS:
+        return
+    start = unlock_ts_ms / 1000
+    if unlock_ts_ms <= 0 or lock_ts_ms < unlock_ts_ms:
+        start = (lock_ts_ms or unlock_ts_ms) / 1000 - duration
+    first = _delta(deltas, start)
+    first[USAGE_COLUMNS.index("session_count")] += 1
+    first[USAGE_COLUMNS.index(histogram_column(duration))] += 1
+
+    end = start + duration
+    cursor = start
+    while cursor < end:
+        boundary = min(end, hour_start(cursor) + HOUR)
+        _delta(deltas, cursor)[0] += boundary - cursor
+        cursor = boundary
+
+
+def usage_rows(device_id: str, deltas: UsageDeltas, now: float) -> List[tuple]:
+    """生成 USAGE_UPSERT_SQL 的参数"""
+    return [(device_id, start, *delta, now) for start, delta in sorted(deltas.items())]
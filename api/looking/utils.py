@@ -4,14 +4,18 @@ from typing import Dict, List, Optional, Tuple, Any
 import hashlib
 import time
 import re
-from methods.globalvar import GlobalVars
+from api.looking.device_store import device_store
+from api.looking.keep_alive import keep_alive_buffer
+from api.looking.stream import device_stream_hub
+from api.looking.usage import (
+    USAGE_COLUMNS, HISTOGRAM_COLUMNS, SESSION_HISTOGRAM, MAX_SESSION_SECONDS, day_to_ts, ts_to_day_hour
+)
+from config import looking_report_max_days
 
 # 常量定义
 BEIJING_TZ = timezone(timedelta(hours=8))
-DEVICE_TABLE_PREFIX = "device_"
-DAILY_RECORD_PREFIX = "daily_"
-DEVICE_STATUS_KEY = "device_status"
-LATEST_STATUS_KEY = "latest_device_status"
+# 存活超时后由服务端生成的锁屏动作，不是设备上报的事件
+AUTO_LOCK_ACTION = "auto_locked_by_alive_timeout"
 
 # 时间相关工具函数
 def get_beijing_now() -> datetime:
@@ -40,55 +44,42 @@ def get_beijing_datetime_str(timestamp: Optional[float] = None) -> str:
     return dt.strftime("%Y-%m-%d %H:%M:%S")
 
 # 签名验证
+def compute_signature(device_id: str, event_type: str, timestamp: str) -> str:
+    """计算MD5签名（小写十六进制）"""
+    return hashlib.md5(f"{device_id}{event_type}{timestamp}".encode()).hexdigest()
+
 def verify_signature(device_id: str, event_type: str, timestamp: str, signature: str) -> bool:
     """验证MD5签名"""
     try:
         if not all([device_id, event_type, timestamp, signature]):
             return False
         
-        expected_signature = hashlib.md5(f"{device_id}{event_type}{timestamp}".encode()).hexdigest()
-        return expected_signature.lower() == signature.lower()
+        return compute_signature(device_id, event_type, timestamp) == signature.lower()
     except Exception as e:
         log.error(f"签名验证异常: {e}")
         return False
 
-# 数据库键名生成
-def get_device_table_name(device_id: str) -> str:
-    """根据设备ID生成表名"""
-    return f"{DEVICE_TABLE_PREFIX}{device_id}"
-
-def get_daily_record_key(device_id: str, target_date: Optional[str] = None) -> str:
-    """生成每日记录的键名"""
-    if target_date is None:
-        target_date = get_beijing_date().strftime("%Y%m%d")
-    return f"{DAILY_RECORD_PREFIX}{target_date}"
+def get_today_key() -> str:
+    """生成今日记录的日期键（北京时间 YYYY-MM-DD）"""
+    return get_beijing_date().strftime("%Y-%m-%d")
 
-def get_device_status_key(device_id: str) -> str:
-    """生成设备状态的键名"""
-    return DEVICE_STATUS_KEY
+# 设备初始化
+def device_exists(device_id: str) -> bool:
+    """判断设备是否有记录"""
+    return device_store.device_exists(device_id)
 
-# 设备表初始化
 def init_device_table(device_id: str) -> None:
-    """初始化设备表和基础数据"""
+    """初始化设备记录和基础数据"""
     if not device_id or device_id == 'Unknown':
         return
     
-    table_name = get_device_table_name(device_id)
-    
-    # 创建设备专用表
-    if not GlobalVars.table_exists(table_name):
-        GlobalVars.create_table(table_name)
-        log.info(f"创建设备表: {table_name}")
-    
-    # 初始化设备状态
-    status_key = get_device_status_key(device_id)
-    if not GlobalVars.get_from_table(table_name, status_key):
-        _create_default_device_status(table_name, status_key, device_id)
+    if device_store.ensure_device(device_id, _create_default_device_status()):
+        log.info(f"初始化设备状态: {device_id}")
 
-def _create_default_device_status(table_name: str, status_key: str, device_id: str) -> None:
+def _create_default_device_status() -> Dict[str, Any]:
     """创建默认设备状态"""
     beijing_now = get_beijing_now()
-    default_status = {
+    return {
         "is_locked": True,
         "last_unlock_time": None,
         "last_lock_time": beijing_now.timestamp() * 1000,
@@ -97,41 +88,6 @@ def _create_default_device_status(table_name: str, status_key: str, device_id: s
         "created_time": get_beijing_datetime_str(),
         "timezone": "Asia/Shanghai"
     }
-    GlobalVars.set_to_table(table_name, status_key, default_status)
-    log.info(f"初始化设备状态: {device_id}")
-
-# 每日记录管理
-def get_today_record(device_id: str) -> Dict[str, Any]:
-    """获取今日记录"""
-    table_name = get_device_table_name(device_id)
-    record_key = get_daily_record_key(device_id)
-    
-    today_record = GlobalVars.get_from_table(table_name, record_key)
-    if not today_record:
-        today_record = _create_today_record(table_name, record_key, device_id)
-    
-    return today_record
-
-def _create_today_record(table_name: str, record_key: str, device_id: str) -> Dict[str, Any]:
-    """创建今日记录"""
-    beijing_now = get_beijing_now()
-    beijing_date = get_beijing_date()
-    
-    today_record = {
-        "date": beijing_date.strftime("%Y-%m-%d"),
-        "screen_on_time": 0.0,
-        "lock_events": [],
-        "unlock_events": [],
-        "usage_sessions": [],
-        "created_time": beijing_now.timestamp(),
-        "created_time_str": get_beijing_datetime_str(),
-        "last_update": beijing_now.timestamp(),
-        "timezone": "Asia/Shanghai"
-    }
-    
-    GlobalVars.set_to_table(table_name, record_key, today_record)
-    log.info(f"创建今日记录: {device_id} - {today_record['date']} (北京时间)")
-    return today_record
 
 # 事件处理相关
 def create_event_info(timestamp: int, action: str) -> Dict[str, Any]:
@@ -143,9 +99,11 @@ def create_event_info(timestamp: int, action: str) -> Dict[str, Any]:
         "beijing_time": datetime.fromtimestamp(timestamp / 1000, BEIJING_TZ).strftime("%Y-%m-%d %H:%M:%S")
     }
 
-def create_usage_session(unlock_time: int, lock_time: int) -> Dict[str, Any]:
-    """创建使用会话信息"""
+def create_usage_session(unlock_time: int, lock_time: int) -> Optional[Dict[str, Any]]:
+    """创建使用会话信息，锁屏早于解锁或时长超过 MAX_SESSION_SECONDS 的会话不合理，返回None"""
     duration = (lock_time - unlock_time) / 1000
+    if duration < 0 or duration > MAX_SESSION_SECONDS:
+        return None
     return {
         "unlock_time": unlock_time,
         "lock_time": lock_time,
@@ -168,86 +126,154 @@ def is_unlock_action(action: str) -> bool:
 # 设备状态更新的核心逻辑
 def update_device_status_and_record(device_id: str, action: str, timestamp: int) -> None:
     """更新设备状态并记录使用时间"""
-    table_name = get_device_table_name(device_id)
-    status_key = get_device_status_key(device_id)
+    today_key = get_today_key()
     
-    current_status = GlobalVars.get_from_table(table_name, status_key, {})
-    today_record = get_today_record(device_id)
+    # 事件、会话只追加，当天统计只做增量累加，不再读取和重写整天的记录
+    current_status = get_device_status(device_id) or {}
     beijing_now = get_beijing_now()
     
+    applied = _apply_action(current_status, device_id, timestamp, action)
+    if applied is None:
+        return
+    kind, session_info = applied
+    
+    # 更新时间戳和保存数据
+    _update_timestamps(current_status, action, beijing_now)
+    if action != AUTO_LOCK_ACTION:
+        _mark_client_event(current_status, timestamp, action)
+    device_store.record_event(device_id, current_status, today_key, timestamp, action, kind, session_info)
+    if device_stream_hub.has_subscribers(device_id):
+        device_stream_hub.publish(device_id, "device_event", {
+            "action": action,
+            "is_locked": current_status.get("is_locked"),
+            "last_update_str": current_status["last_update_str"],
+            "session": session_info
+        })
+    
+    log.info(f"更新设备状态: {device_id} - 锁定状态: {current_status.get('is_locked')} - "
+            f"动作: {current_status['last_event']} (北京时间: {current_status['last_update_str']})")
+
+def _apply_action(current_status: Dict, device_id: str, timestamp: int,
+                  action: str) -> Optional[Tuple[str, Optional[Dict[str, Any]]]]:
+    """将一个动作应用到设备状态，返回 (事件类型, 结束的会话)，无法识别的动作返回None"""
     event_info = create_event_info(timestamp, action)
     
     # 处理不同类型的事件
     if is_lock_action(action):
-        _handle_lock_event(current_status, today_record, event_info, device_id)
-    elif is_unlock_action(action):
-        _handle_unlock_event(current_status, today_record, event_info, device_id)
-    else:
-        log.warning(f"未识别的动作类型: {device_id} - 动作: {action}")
-        return
-    
-    # 更新时间戳和保存数据
-    _update_timestamps(current_status, today_record, action, beijing_now)
-    _save_device_data(table_name, status_key, current_status, device_id, today_record)
+        return "lock", _handle_lock_event(current_status, event_info, device_id)
+    if is_unlock_action(action):
+        return "unlock", _handle_unlock_event(current_status, event_info, device_id)
+    log.warning(f"未识别的动作类型: {device_id} - 动作: {action}")
+    return None
 
-def _handle_lock_event(current_status: Dict, today_record: Dict, event_info: Dict, device_id: str) -> None:
-    """处理锁屏事件"""
+def apply_device_events(device_id: str, events: List[Tuple[int, str]]) -> List[Dict[str, Any]]:
+    """按时间顺序应用一批 (时间戳毫秒, 动作) 事件并在一个事务中保存，返回与输入顺序对应的处理结果
+
+    会话按排序后的解锁/锁屏依次拼接；与批内已有事件或设备最后一次上报的事件完全相同的事件视为重复，
+    不晚于设备最后一次上报的事件的其他事件视为过期，两者都不会被应用，因此重放同一批事件不会重复计入统计。
+    服务端因存活超时生成的自动锁屏不参与判断，断线期间缓存、稍后重放的事件仍会被应用。
+    每个事件按自身时间戳所在的北京时间日期计入每日统计。
+    """
+    current_status = get_device_status(device_id) or {}
+    last_client_time, last_client_action = _last_client_event(current_status)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(events)
+    rows = []
+    seen = {(last_client_time, last_client_action)}
+    for index in sorted(range(len(events)), key=lambda i: events[i][0]):
+        timestamp, action = events[index]
+        result = {"index": index, "timestamp": timestamp, "action": action}
+        results[index] = result
+        if (timestamp, action) in seen:
+            result["result"] = "duplicate"
+            continue
+        seen.add((timestamp, action))
+        if timestamp <= last_client_time:
+            result["result"] = "stale"
+            continue
+        applied = _apply_action(current_status, device_id, timestamp, action)
+        if applied is None:
+            result["result"] = "rejected"
+            result["reason"] = f"未识别的动作类型: {action}"
+            continue
+        kind, session_info = applied
+        day = datetime.fromtimestamp(timestamp / 1000, BEIJING_TZ).strftime("%Y-%m-%d")
+        rows.append((day, timestamp, action, kind, session_info))
+        result["result"] = "applied"
+        if session_info:
+            result["session_duration"] = session_info["duration"]
+
+    if rows:
+        _update_timestamps(current_status, rows[-1][2], get_beijing_now())
+        _mark_client_event(current_status, rows[-1][1], rows[-1][2])
+        device_store.record_events(device_id, current_status, rows)
+        if device_stream_hub.has_subscribers(device_id):
+            device_stream_hub.publish(device_id, "device_event", {
+                "action": rows[-1][2],
+                "is_locked": current_status.get("is_locked"),
+                "last_update_str": current_status["last_update_str"],
+                "replayed": len(rows)
+            })
+        log.info(f"批量更新设备状态: {device_id} - 应用 {len(rows)}/{len(events)} 个事件 - "
+                 f"锁定状态: {current_status.get('is_locked')}")
+    return results
+
+def _last_client_event(current_status: Dict) -> Tuple[int, Optional[str]]:
+    """返回设备最后一次上报的事件 (时间戳毫秒, 动作)，没有上报过时返回 (0, None)"""
+    if "last_client_event_time" in current_status:
+        return current_status["last_client_event_time"], current_status.get("last_client_event")
+    # 旧的状态记录没有单独保存，从锁屏/解锁时间推断：
+    # 新建设备的默认锁屏时间是初始化时间，自动锁屏的锁屏时间是服务端时间，都不是上报的事件
+    last_event = current_status.get("last_event")
+    if last_event == "initialized":
+        return 0, None
+    if last_event == AUTO_LOCK_ACTION:
+        return current_status.get("last_unlock_time") or 0, None
+    return max(current_status.get("last_lock_time") or 0, current_status.get("last_unlock_time") or 0), None
+
+def _mark_client_event(current_status: Dict, timestamp: int, action: str) -> None:
+    """记录设备最后一次上报的事件，作为批量重放时判断重复和过期的依据"""
+    if timestamp >= current_status.get("last_client_event_time", 0):
+        current_status["last_client_event_time"] = timestamp
+        current_status["last_client_event"] = action
+
+def _handle_lock_event(current_status: Dict, event_info: Dict, device_id: str) -> Optional[Dict[str, Any]]:
+    """处理锁屏事件，返回本次结束的使用会话"""
+    session_info = None
     # 如果之前是解锁状态，计算使用时长
     if not current_status.get("is_locked", True):
         last_unlock_time = current_status.get("last_unlock_time")
         if last_unlock_time:
             session_info = create_usage_session(last_unlock_time, event_info["timestamp"])
-            today_record["screen_on_time"] += session_info["duration"]
-            today_record["usage_sessions"].append(session_info)
-            
-            log.info(f"记录使用会话: {device_id} - 使用时长: {session_info['duration']:.1f}秒 "
-                    f"({session_info['unlock_time_str']} - {session_info['lock_time_str']})")
+            if session_info is None:
+                log.warning(f"忽略不合理的使用会话: {device_id} - "
+                            f"{format_beijing_time(last_unlock_time)} - {event_info['time']}")
+            else:
+                log.info(f"记录使用会话: {device_id} - 使用时长: {session_info['duration']:.1f}秒 "
+                        f"({session_info['unlock_time_str']} - {session_info['lock_time_str']})")
     
     # 更新为锁定状态
     current_status["is_locked"] = True
     current_status["last_lock_time"] = event_info["timestamp"]
-    today_record["lock_events"].append(event_info)
     
     log.info(f"设备锁定: {device_id} - 动作: {event_info['action']}")
+    return session_info
 
-def _handle_unlock_event(current_status: Dict, today_record: Dict, event_info: Dict, device_id: str) -> None:
+def _handle_unlock_event(current_status: Dict, event_info: Dict, device_id: str) -> None:
     """处理解锁事件"""
     current_status["is_locked"] = False
     current_status["last_unlock_time"] = event_info["timestamp"]
-    today_record["unlock_events"].append(event_info)
     
     log.info(f"设备解锁: {device_id} - 动作: {event_info['action']}")
 
-def _update_timestamps(current_status: Dict, today_record: Dict, action: str, beijing_now: datetime) -> None:
+def _update_timestamps(current_status: Dict, action: str, beijing_now: datetime) -> None:
     """更新时间戳"""
-    timestamp_str = get_beijing_datetime_str()
-    timestamp_float = beijing_now.timestamp()
-    
     # 更新设备状态时间戳
     current_status.update({
-        "last_update": timestamp_float,
-        "last_update_str": timestamp_str,
+        "last_update": beijing_now.timestamp(),
+        "last_update_str": get_beijing_datetime_str(),
         "last_event": action,
         "timezone": "Asia/Shanghai"
     })
-    
-    # 更新记录时间戳
-    today_record.update({
-        "last_update": timestamp_float,
-        "last_update_str": timestamp_str
-    })
-
-def _save_device_data(table_name: str, status_key: str, current_status: Dict, device_id: str, today_record: Dict) -> None:
-    """保存设备数据"""
-    # 保存设备状态
-    GlobalVars.set_to_table(table_name, status_key, current_status)
-    
-    # 保存今日记录
-    record_key = get_daily_record_key(device_id)
-    GlobalVars.set_to_table(table_name, record_key, today_record)
-    
-    log.info(f"更新设备状态: {device_id} - 锁定状态: {current_status.get('is_locked')} - "
-            f"动作: {current_status['last_event']} (北京时间: {current_status['last_update_str']})")
 
 # 设备摘要和统计
 def calculate_current_session_time(status: Dict) -> float:
@@ -268,64 +294,139 @@ def format_screen_time(total_seconds: float) -> str:
 
 def get_device_summary(device_id: str) -> Dict[str, Any]:
     """获取设备使用摘要"""
-    table_name = get_device_table_name(device_id)
-    
-    status = GlobalVars.get_from_table(table_name, get_device_status_key(device_id), {})
-    today_record = get_today_record(device_id)
+    today_key = get_today_key()
+    status, today_stats = device_store.get_status_and_daily_stats(device_id, today_key)
+    status = _apply_keep_alive(device_id, status) or {}
+    today_stats = today_stats or {}
     
+    completed_screen_time = today_stats.get("screen_on_time", 0.0)
     current_session_time = calculate_current_session_time(status)
-    total_screen_time = today_record.get('screen_on_time', 0) + current_session_time
+    total_screen_time = completed_screen_time + current_session_time
     
     return {
         "device_id": device_id,
         "current_status": status,
         "current_session_time": f"{current_session_time:.1f}秒" if current_session_time > 0 else "0秒",
         "today_summary": {
-            "date": today_record.get("date", ""),
+            "date": today_key,
             "beijing_date": get_beijing_date().strftime("%Y-%m-%d"),
             "total_screen_time": f"{total_screen_time:.1f}秒",
             "formatted_screen_time": format_screen_time(total_screen_time),
-            "completed_screen_time": f"{today_record.get('screen_on_time', 0):.1f}秒",
-            "lock_count": len(today_record.get("lock_events", [])),
-            "unlock_count": len(today_record.get("unlock_events", [])),
-            "usage_sessions": len(today_record.get("usage_sessions", [])),
+            "completed_screen_time": f"{completed_screen_time:.1f}秒",
+            "lock_count": today_stats.get("lock_count", 0),
+            "unlock_count": today_stats.get("unlock_count", 0),
+            "usage_sessions": today_stats.get("session_count", 0),
             "timezone": "Asia/Shanghai (北京时间)"
         }
     }
 
+def _usage_totals(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """累加若干行每小时使用统计"""
+    totals = {name: 0 for name in USAGE_COLUMNS}
+    for row in rows:
+        for name in USAGE_COLUMNS:
+            totals[name] += row[name]
+    screen_on_time = round(totals["screen_on_time"], 1)
+    return {
+        "screen_on_time": screen_on_time,
+        "formatted_screen_time": format_screen_time(screen_on_time),
+        "unlock_count": totals["unlock_count"],
+        "lock_count": totals["lock_count"],
+        "session_count": totals["session_count"],
+        "session_histogram": {name: totals[column] for (name, _), column in zip(SESSION_HISTOGRAM, HISTOGRAM_COLUMNS)},
+    }
+
+def get_device_report(device_id: str, from_day: Optional[str] = None, to_day: Optional[str] = None) -> Dict[str, Any]:
+    """获取设备在日期范围内（北京时间，含首尾）的使用报告，只统计已结束的会话
+
+    一次按主键范围读取每小时统计，再合并为每天和按小时（0-23点）的分布，耗时只与范围内的小时数有关。
+    """
+    to_day = to_day or get_today_key()
+    try:
+        end_ts = day_to_ts(to_day) + 86400
+        start_ts = day_to_ts(from_day) if from_day else end_ts - 7 * 86400
+    except ValueError:
+        raise ValueError(f"日期格式错误: {from_day} - {to_day}，应为 YYYY-MM-DD")
+    from_day = from_day or ts_to_day_hour(start_ts)[0]
+    days_count = round((end_ts - start_ts) / 86400)
+    if days_count < 1:
+        raise ValueError("开始日期不能晚于结束日期")
+    if days_count > looking_report_max_days:
+        raise ValueError(f"日期范围不能超过 {looking_report_max_days} 天")
+
+    rows = device_store.get_usage_hourly(device_id, start_ts, end_ts)
+    by_day: Dict[str, List[Dict[str, Any]]] = {}
+    by_hour: List[List[Dict[str, Any]]] = [[] for _ in range(24)]
+    for row in rows:
+        day, hour = ts_to_day_hour(row["hour_start"])
+        by_day.setdefault(day, []).append(row)
+        by_hour[hour].append(row)
+
+    totals = _usage_totals(rows)
+    daily = []
+    for index in range(days_count):
+        day = ts_to_day_hour(start_ts + index * 86400)[0]
+        daily.append({"date": day, **_usage_totals(by_day.get(day, []))})
+    hourly = [
+        {"hour": hour, **{key: value for key, value in _usage_totals(hour_rows).items() if key != "session_histogram"}}
+        for hour, hour_rows in enumerate(by_hour)
+    ]
+    average = totals["screen_on_time"] / days_count
+    return {
+        "device_id": device_id,
+        "from": from_day,
+        "to": to_day,
+        "days": days_count,
+        "totals": totals,
+        "daily_average_screen_time": round(average, 1),
+        "formatted_daily_average": format_screen_time(average),
+        "daily": daily,
+        "hourly": hourly,
+        "timezone": "Asia/Shanghai (北京时间)"
+    }
+
 # 保活状态管理
-def update_keep_alive_status(device_id: str) -> None:
-    """更新设备保活状态"""
+def update_keep_alive_status(device_id: str) -> Optional[float]:
+    """更新设备保活时间，只写入内存，由 keep_alive_buffer 定期批量写回；设备不存在时返回None"""
     if not device_id or device_id == 'Unknown':
-        return
-        
-    table_name = get_device_table_name(device_id)
-    if not GlobalVars.table_exists(table_name):
-        return
-        
-    status_key = get_device_status_key(device_id)
-    current_status = GlobalVars.get_from_table(table_name, status_key, {})
-    beijing_now = get_beijing_now()
+        return None
     
-    current_status.update({
-        "last_keep_alive": beijing_now.timestamp(),
-        "last_keep_alive_str": get_beijing_datetime_str()
-    })
+    if not keep_alive_buffer.is_known(device_id) and not device_store.device_exists(device_id):
+        return None
     
-    GlobalVars.set_to_table(table_name, status_key, current_status)
+    timestamp = get_beijing_now().timestamp()
+    keep_alive_buffer.touch(device_id, timestamp)
     log.info(f"更新设备保活时间: {device_id}")
+    return timestamp
+
+def _apply_keep_alive(device_id: str, status: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """用内存中尚未写回的保活时间覆盖设备状态"""
+    if not status:
+        return status
+    last_keep_alive = keep_alive_buffer.get(device_id)
+    if last_keep_alive and last_keep_alive >= (status.get("last_keep_alive") or 0):
+        status["last_keep_alive"] = last_keep_alive
+    if status.get("last_keep_alive"):
+        status["last_keep_alive_str"] = get_beijing_datetime_str(status["last_keep_alive"])
+    return status
 
 def get_all_device_ids() -> List[str]:
     """获取所有设备ID列表"""
-    all_tables = GlobalVars.get_all_tables()
-    device_tables = [table for table in all_tables if table.startswith(DEVICE_TABLE_PREFIX)]
-    return [table.replace(DEVICE_TABLE_PREFIX, "") for table in device_tables]
+    return device_store.get_all_device_ids()
+
+def get_device_status(device_id: str) -> Optional[Dict[str, Any]]:
+    """获取设备当前状态，设备不存在时返回None"""
+    return _apply_keep_alive(device_id, device_store.get_status(device_id))
+
+def get_all_device_statuses() -> Dict[str, Dict[str, Any]]:
+    """获取所有设备的当前状态"""
+    return {device_id: _apply_keep_alive(device_id, status)
+            for device_id, status in device_store.get_all_statuses().items()}
 
 # 设备状态相关
 def store_device_status(device_id: str, status_data: Dict[str, Any]) -> None:
     """存储设备状态数据"""
     try:
-        table_name = get_device_table_name(device_id)
         beijing_now = get_beijing_now()
         
         # 添加服务器处理时间
@@ -335,16 +436,12 @@ def store_device_status(device_id: str, status_data: Dict[str, Any]) -> None:
             "timezone": "Asia/Shanghai"
         })
         
-        # 创建带时间戳的状态记录键
-        status_record_key = f"device_status_{beijing_now.strftime('%Y%m%d_%H%M%S')}"
-        
-        # 存储详细状态数据
-        GlobalVars.set_to_table(table_name, status_record_key, status_data)
-        
-        # 更新最新状态
-        GlobalVars.set_to_table(table_name, LATEST_STATUS_KEY, status_data)
+        # 在一个事务中追加状态快照并更新最新状态
+        device_store.add_status_snapshot(device_id, status_data, beijing_now.timestamp())
+        if device_stream_hub.has_subscribers(device_id):
+            device_stream_hub.publish(device_id, "device_status", format_device_status_summary(status_data))
         
-        log.info(f"存储设备状态数据: {device_id} - 记录键: {status_record_key}")
+        log.info(f"存储设备状态数据: {device_id} - 时间: {status_data['server_processed_at_str']}")
         
     except Exception as e:
         log.exception(f"存储设备状态失败: {e}")
@@ -352,8 +449,7 @@ def store_device_status(device_id: str, status_data: Dict[str, Any]) -> None:
 def get_latest_device_status(device_id: str) -> Dict[str, Any]:
     """获取设备最新状态"""
     try:
-        table_name = get_device_table_name(device_id)
-        return GlobalVars.get_from_table(table_name, LATEST_STATUS_KEY) or {}
+        return device_store.get_latest_status(device_id) or {}
     except Exception as e:
         log.exception(f"获取设备最新状态失败: {e}")
         return {}
@@ -0,0 +1,89 @@
+"""
+AsyncGlobalVars 事件循环延迟基准测试
+
+在同一个事件循环中模拟并发请求：一部分请求写数据库，一部分只是简单的 ping，
+对比在协程中直接调用同步 GlobalVars 与 await AsyncGlobalVars 时各自的 p50/p99 延迟。
+同步写入会阻塞事件循环，ping 请求的尾延迟会被拖高；异步写入交给单写线程后 ping 不受影响。
+
+用法（在项目根目录执行，数据库写入临时目录，不影响 data/global_vars.db）：
+    python benchmarks/bench_async_globalvar.py --requests 2000 --concurrency 100 --write-ratio 0.3
+"""
+import argparse, asyncio, os, random, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+TMP_DIR = tempfile.mkdtemp(prefix="yuanshen_bench_")
+os.chdir(TMP_DIR)
+sys.path.insert(0, str(ROOT))
+
+from methods.globalvar import GlobalVars, AsyncGlobalVars  # noqa: E402
+
+TABLE = "bench_kv"
+KEY_COUNT = 500
+
+
+def configure(mode: str, synchronous: str) -> None:
+    GlobalVars.close()
+    GlobalVars._storage_path = Path(TMP_DIR) / f"bench_{mode}.db"
+    GlobalVars._synchronous = synchronous
+    GlobalVars().ensure_loaded()
+    GlobalVars.create_table(TABLE)
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index] * 1000
+
+
+async def run(mode: str, total: int, concurrency: int, write_ratio: float) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = {"write": [], "ping": []}
+    rng = random.Random(42)
+    kinds = ["write" if rng.random() < write_ratio else "ping" for _ in range(total)]
+
+    async def handle(i: int, kind: str):
+        async with semaphore:
+            start = time.perf_counter()
+            if kind == "write":
+                value = {"index": i, "payload": "x" * 200}
+                if mode == "sync":
+                    GlobalVars.set_to_table(TABLE, f"key_{i % KEY_COUNT}", value)
+                else:
+                    await AsyncGlobalVars.aset(f"key_{i % KEY_COUNT}", value, table_name=TABLE)
+            else:
+                await asyncio.sleep(0)
+            latencies[kind].append(time.perf_counter() - start)
+
+    begin = time.perf_counter()
+    await asyncio.gather(*(handle(i, kind) for i, kind in enumerate(kinds)))
+    elapsed = time.perf_counter() - begin
+    return {"mode": mode, "elapsed": elapsed, **latencies}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AsyncGlobalVars 事件循环延迟基准测试")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--synchronous", default="FULL", help="写入时的 PRAGMA synchronous，FULL 更接近每次提交都落盘的场景")
+    args = parser.parse_args()
+
+    print(f"请求数: {args.requests}, 并发: {args.concurrency}, 写请求比例: {args.write_ratio}, "
+          f"synchronous={args.synchronous}, 临时目录: {TMP_DIR}")
+    for mode in ("sync", "async"):
+        configure(mode, args.synchronous)
+        result = asyncio.run(run(mode, args.requests, args.concurrency, args.write_ratio))
+        for kind in ("write", "ping"):
+            values = result[kind]
+            if not values:
+                continue
+            print(f"{mode:>5} {kind:>5}: p50 {percentile(values, 50):8.2f}ms, p99 {percentile(values, 99):8.2f}ms "
+                  f"({len(values)} 次)")
+        print(f"{mode:>5} 总耗时: {result['elapsed']:.2f}秒")
+    AsyncGlobalVars.shutdown()
+    GlobalVars.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+GlobalVars 值编码格式基准测试
+
+用接近真实的设备数据比较各编码格式与压缩方式的编码/解码耗时和存储大小：
+- device_status: /looking/device-status 上报的完整设备状态快照
+- daily_record: 一天内有大量锁屏/解锁事件的 daily_YYYYMMDD 记录
+
+未安装的可选库（orjson、msgpack、zstandard）会被跳过。
+
+用法（在项目根目录执行）：
+    python benchmarks/bench_codecs.py --events 500 --rounds 2000
+"""
+import argparse, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from methods import serializer  # noqa: E402
+from methods.serializer import ValueCodec  # noqa: E402
+
+
+def make_device_status(index: int = 0) -> dict:
+    timestamp = 1750000000000 + index * 60000
+    return {
+        "timestamp": timestamp,
+        "device_id": "8f3c2a1b9d7e4f60",
+        "uptime": {
+            "total_milliseconds": 987654321, "days": 11, "hours": 10, "minutes": 20, "seconds": 54,
+            "formatted_string": "11天10小时20分钟54秒",
+        },
+        "network": {
+            "full_status": "WIFI 已连接, 可访问互联网, 已验证",
+            "type": "WIFI", "has_internet": True, "is_validated": True,
+            "wifi_details": {"ssid": "Home-5G", "signal_strength_dbm": -52, "link_speed_mbps": 866},
+        },
+        "cpu": {
+            "full_info": "8 核, arm64-v8a, 最高 3187 MHz",
+            "cores": 8, "architecture": "arm64-v8a", "max_frequency_mhz": 3187, "max_frequency_khz": 3187200,
+        },
+        "thermal": {
+            "full_info": "电池 31.5°C, 8 个温度区域",
+            "battery_celsius": 31.5,
+            "thermal_zones": [{"zone_index": i, "celsius": 30.0 + i * 1.25} for i in range(8)],
+        },
+        "storage": {
+            "full_info": "内部存储 total: 238.3GB, available: 120.1GB, used: 118.2GB, usage: 49.6%",
+            "internal": {"total_bytes": 255869321216, "available_bytes": 128956841984,
+                         "used_bytes": 126912479232, "usage_percentage": 49.6},
+        },
+        "foreground_app": {
+            "full_info": "前台应用: 哔哩哔哩 (tv.danmaku.bili)",
+            "package_name": "tv.danmaku.bili", "app_display_name": "哔哩哔哩",
+            "process_id": 12345, "last_used_timestamp": timestamp - 1500,
+        },
+        "battery": {
+            "full_info": "电量 76%, 未充电, 电池供电, 良好",
+            "level_percentage": 76, "is_charging": False, "status_string": "放电中",
+            "power_source_string": "电池", "health_string": "良好", "temperature_celsius": 31.5,
+            "voltage_mv": 4012, "voltage_v": 4.012, "technology": "Li-poly",
+        },
+        "server_processed_at": timestamp / 1000,
+        "server_processed_at_str": "2025-06-15 23:06:40",
+        "timezone": "Asia/Shanghai",
+    }
+
+
+def make_daily_record(events: int) -> dict:
+    base = 1750000000000
+    record = {
+        "date": "2025-06-15", "screen_on_time": 0.0,
+        "lock_events": [], "unlock_events": [], "usage_sessions": [],
+        "created_time": base / 1000, "created_time_str": "2025-06-15 00:00:00",
+        "last_update": base / 1000, "timezone": "Asia/Shanghai",
+    }
+    for i in range(events):
+        unlock_ts = base + i * 120000
+        lock_ts = unlock_ts + 45000
+        record["unlock_events"].append({"timestamp": unlock_ts, "time": "08:00:00", "action": "unlocked",
+                                        "beijing_time": "2025-06-15 08:00:00"})
+        record["lock_events"].append({"timestamp": lock_ts, "time": "08:00:45", "action": "locked",
+                                      "beijing_time": "2025-06-15 08:00:45"})
+        record["usage_sessions"].append({"unlock_time": unlock_ts, "lock_time": lock_ts, "duration": 45.0,
+                                         "unlock_time_str": "08:00:00", "lock_time_str": "08:00:45",
+                                         "duration_str": "45.0秒"})
+        record["screen_on_time"] += 45.0
+    return record
+
+
+def available_combinations():
+    codecs = ["json"]
+    if serializer.orjson is not None:
+        codecs.append("orjson")
+    if serializer.msgpack is not None:
+        codecs.append("msgpack")
+    compressions = [None, "zlib"]
+    if serializer.zstandard is not None:
+        compressions.append("zstd")
+    return [(codec, compression) for codec in codecs for compression in compressions]
+
+
+def measure(codec: ValueCodec, payload, rounds: int) -> dict:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        encoded = codec.encode(payload)
+    encode_us = (time.perf_counter() - start) / rounds * 1e6
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        decoded = codec.decode(encoded)
+    decode_us = (time.perf_counter() - start) / rounds * 1e6
+
+    assert decoded == payload, "解码结果与原始数据不一致"
+    size = len(encoded.encode("utf-8")) if isinstance(encoded, str) else len(encoded)
+    return {"encode_us": encode_us, "decode_us": decode_us, "size": size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GlobalVars 值编码格式基准测试")
+    parser.add_argument("--events", type=int, default=500, help="daily_record 中的解锁/锁屏次数")
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--threshold", type=int, default=1024, help="压缩阈值（字节）")
+    args = parser.parse_args()
+
+    payloads = {
+        "device_status": make_device_status(),
+        "daily_record": make_daily_record(args.events),
+    }
+    missing = [name for name, module in (("orjson", serializer.orjson), ("msgpack", serializer.msgpack),
+                                         ("zstandard", serializer.zstandard)) if module is None]
+    if missing:
+        print(f"未安装，已跳过: {', '.join(missing)}")
+
+    for name, payload in payloads.items():
+        rounds = max(1, args.rounds // (10 if name == "daily_record" else 1))
+        print(f"\n{name} ({rounds} 轮)")
+        print(f"{'编码':>8} {'压缩':>6} {'编码(us)':>10} {'解码(us)':>10} {'大小(B)':>10}")
+        for codec_name, compression in available_combinations():
+            codec = ValueCodec(codec_name, compression, args.threshold)
+            result = measure(codec, payload, rounds)
+            print(f"{codec_name:>8} {compression or '-':>6} {result['encode_us']:>10.1f} "
+                  f"{result['decode_us']:>10.1f} {result['size']:>10}")
+
+
+if __name__ == "__main__":
+    main()
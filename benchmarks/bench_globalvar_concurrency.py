@@ -0,0 +1,99 @@
+"""
+GlobalVars 并发读写基准测试
+
+在持续写入的同时测量多线程读取吞吐量，对比：
+- 旧模式：回滚日志 + 所有读写共用一个连接并串行化
+- 新模式：WAL + synchronous=NORMAL + 每线程只读连接
+
+用法（在项目根目录执行，数据库写入临时目录，不影响 data/global_vars.db）：
+    python benchmarks/bench_globalvar_concurrency.py --readers 4 --writers 1 --seconds 5
+"""
+import argparse, os, sys, tempfile, threading, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+TMP_DIR = tempfile.mkdtemp(prefix="yuanshen_bench_")
+os.chdir(TMP_DIR)
+sys.path.insert(0, str(ROOT))
+
+from methods.globalvar import GlobalVars  # noqa: E402
+
+TABLE = "bench_kv"
+KEY_COUNT = 1000
+
+
+def configure(mode: str) -> None:
+    GlobalVars.close()
+    GlobalVars._storage_path = Path(TMP_DIR) / f"bench_{mode}.db"
+    if mode == "legacy":
+        GlobalVars._journal_mode = "DELETE"
+        GlobalVars._synchronous = "FULL"
+        GlobalVars._reader_pool_enabled = False
+    else:
+        GlobalVars._journal_mode = "WAL"
+        GlobalVars._synchronous = "NORMAL"
+        GlobalVars._reader_pool_enabled = True
+    GlobalVars().ensure_loaded()
+    GlobalVars.create_table(TABLE)
+    for i in range(KEY_COUNT):
+        GlobalVars.set_to_table(TABLE, f"key_{i}", {"index": i, "payload": "x" * 200})
+
+
+def run(mode: str, readers: int, writers: int, seconds: float) -> dict:
+    configure(mode)
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0}
+    counts_lock = threading.Lock()
+
+    def reader(offset: int):
+        done = 0
+        i = offset
+        while not stop.is_set():
+            GlobalVars.get_from_table(TABLE, f"key_{i % KEY_COUNT}")
+            i += 7
+            done += 1
+        with counts_lock:
+            counts["reads"] += done
+
+    def writer(offset: int):
+        done = 0
+        i = offset
+        while not stop.is_set():
+            GlobalVars.set_to_table(TABLE, f"key_{i % KEY_COUNT}", {"index": i, "payload": "y" * 200})
+            i += 13
+            done += 1
+        with counts_lock:
+            counts["writes"] += done
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    return {
+        "mode": mode,
+        "reads_per_sec": counts["reads"] / seconds,
+        "writes_per_sec": counts["writes"] / seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GlobalVars 并发读写基准测试")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"读线程: {args.readers}, 写线程: {args.writers}, 时长: {args.seconds}秒, 临时目录: {TMP_DIR}")
+    for mode in ("legacy", "wal"):
+        result = run(mode, args.readers, args.writers, args.seconds)
+        print(f"{result['mode']:>7}: 读 {result['reads_per_sec']:>10.0f} 次/秒, 写 {result['writes_per_sec']:>8.0f} 次/秒")
+    GlobalVars.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+设备保活写入基准测试
+
+模拟 N 个设备持续发送保活请求，对比两种写入方式每秒能处理的保活次数和数据库写事务数：
+- direct: 旧方式，每次保活读取设备状态、修改 last_keep_alive 后整体写回并提交
+- buffered: 保活只写入内存（keep_alive_buffer），后台按固定间隔批量写回
+
+用法（在项目根目录执行，数据库写入临时目录，不影响 data/global_vars.db）：
+    python benchmarks/bench_keep_alive.py --devices 1000 --threads 4 --seconds 5 --flush-interval 1
+"""
+import argparse, os, sys, tempfile, threading, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+TMP_DIR = tempfile.mkdtemp(prefix="yuanshen_bench_")
+os.chdir(TMP_DIR)
+sys.path.insert(0, str(ROOT))
+
+from loguru import logger as log  # noqa: E402
+from api.looking.device_store import device_store  # noqa: E402
+from api.looking.keep_alive import KeepAliveBuffer  # noqa: E402
+from api.looking import utils  # noqa: E402
+
+
+def direct_keep_alive(device_id: str) -> None:
+    status = device_store.get_status(device_id)
+    status["last_keep_alive"] = time.time()
+    status["last_keep_alive_str"] = utils.get_beijing_datetime_str()
+    device_store.set_status(device_id, status)
+
+
+class CountingBuffer(KeepAliveBuffer):
+    """统计写回事务数和写回行数的保活缓冲"""
+
+    def __init__(self, flush_interval: float):
+        super().__init__(flush_interval)
+        self.transactions = 0
+        self.rows = 0
+
+    def flush(self) -> int:
+        rows = super().flush()
+        if rows:
+            self.transactions += 1
+            self.rows += rows
+        return rows
+
+
+def run(mode: str, devices: int, threads: int, seconds: float, flush_interval: float) -> dict:
+    device_ids = [f"{mode}_{i:05d}" for i in range(devices)]
+    for device_id in device_ids:
+        utils.init_device_table(device_id)
+
+    buffer = CountingBuffer(flush_interval)
+    utils.keep_alive_buffer = buffer
+    if mode == "buffered":
+        buffer.start()
+
+    stop = threading.Event()
+    counts = [0] * threads
+
+    def worker(index: int):
+        i = index
+        while not stop.is_set():
+            device_id = device_ids[i % devices]
+            if mode == "direct":
+                direct_keep_alive(device_id)
+            else:
+                utils.update_keep_alive_status(device_id)
+            counts[index] += 1
+            i += threads
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    begin = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    if mode == "buffered":
+        buffer.stop()
+    elapsed = time.perf_counter() - begin
+
+    pings = sum(counts)
+    transactions = pings if mode == "direct" else buffer.transactions
+    rows = pings if mode == "direct" else buffer.rows
+    return {"mode": mode, "pings_per_sec": pings / elapsed, "transactions_per_sec": transactions / elapsed,
+            "rows_per_sec": rows / elapsed, "pings": pings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="设备保活写入基准测试")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--flush-interval", type=float, default=1, help="buffered 模式的写回间隔（秒）")
+    args = parser.parse_args()
+
+    log.remove()
+    print(f"设备数: {args.devices}, 线程数: {args.threads}, 时长: {args.seconds}秒, "
+          f"写回间隔: {args.flush_interval}秒, 临时目录: {TMP_DIR}")
+    print(f"{'模式':>10} {'保活/秒':>12} {'写事务/秒':>12} {'写入行/秒':>12} {'总保活数':>10}")
+    for mode in ("direct", "buffered"):
+        result = run(mode, args.devices, args.threads, args.seconds, args.flush_interval)
+        print(f"{result['mode']:>10} {result['pings_per_sec']:>12.0f} {result['transactions_per_sec']:>12.1f} "
+              f"{result['rows_per_sec']:>12.0f} {result['pings']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+请求限流检查与基准测试
+
+1. 通过路由保护中间件检查限流不能被绕过：
+   - 未启用token验证的API：每个请求换一个随意编造的token，超出速率后仍返回429
+   - 启用token验证的API：无效token返回401，有效token超出速率后返回429
+2. 测试 RequestLimiter.acquire 在大量调用方下每秒能完成的检查次数
+
+用法（在项目根目录执行，数据库写入临时目录，不影响 data/global_vars.db）：
+    python benchmarks/bench_request_limiter.py --callers 10000 --checks 200000
+"""
+import argparse, os, sys, tempfile, time, uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+TMP_DIR = tempfile.mkdtemp(prefix="yuanshen_bench_")
+os.chdir(TMP_DIR)
+sys.path.insert(0, str(ROOT))
+
+from loguru import logger as log  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from methods.limit_manner import RequestLimiter  # noqa: E402
+from methods.routes_manner import RouteProtectionMiddleware  # noqa: E402
+from methods.token_manner import token_manager  # noqa: E402
+
+OPEN_API = "/bench/open"
+TOKEN_API = "/bench/token"
+VALID_TOKEN = "bench-valid-token"
+
+
+def check_bypass() -> None:
+    app = FastAPI()
+
+    @app.get(OPEN_API)
+    async def open_api():
+        return {"returnCode": 1}
+
+    @app.get(TOKEN_API)
+    async def token_api():
+        return {"returnCode": 1}
+
+    app.add_middleware(RouteProtectionMiddleware)
+    token_manager.set_api_limit(OPEN_API, rate=1, burst=1)
+    token_manager.set_api_limit(TOKEN_API, rate=1, burst=1)
+    token_manager.enable_token_for_api(TOKEN_API)
+    token_manager.set_api_token(TOKEN_API, VALID_TOKEN)
+
+    client = TestClient(app)
+    random_tokens = [client.get(OPEN_API, headers={"x-api-token": uuid.uuid4().hex}).status_code for _ in range(3)]
+    invalid_tokens = [client.get(TOKEN_API, headers={"x-api-token": uuid.uuid4().hex}).status_code for _ in range(3)]
+    valid_tokens = [client.get(TOKEN_API, headers={"x-api-token": VALID_TOKEN}).status_code for _ in range(3)]
+    print(f"未启用验证的API，每次换随机token: {random_tokens}")
+    print(f"启用验证的API，无效token: {invalid_tokens}")
+    print(f"启用验证的API，有效token: {valid_tokens}")
+    assert random_tokens == [200, 429, 429], random_tokens
+    assert invalid_tokens == [401, 401, 401], invalid_tokens
+    assert valid_tokens == [200, 429, 429], valid_tokens
+
+
+def bench_acquire(callers: int, checks: int) -> None:
+    limiter = RequestLimiter(max_callers=callers)
+    limit = {"rate": 5.0, "burst": 10, "max_concurrent": 2, "path_max_concurrent": 0}
+    keys = [f"ip:10.0.{i // 256}.{i % 256}" for i in range(callers)]
+    begin = time.perf_counter()
+    for i in range(checks):
+        caller = keys[i % callers]
+        allowed, _, _ = limiter.acquire("/maimai/b50", caller, limit)
+        if allowed:
+            limiter.release("/maimai/b50", caller, limit)
+    rate = checks / (time.perf_counter() - begin)
+    stats = limiter.get_stats()
+    print(f"调用方: {callers}, 检查次数: {checks}, 每秒检查: {rate:.0f}, "
+          f"超出速率被拒绝: {stats['rate_rejected']}, 令牌桶数: {stats['tracked_callers']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="请求限流检查与基准测试")
+    parser.add_argument("--callers", type=int, default=10000)
+    parser.add_argument("--checks", type=int, default=200000)
+    args = parser.parse_args()
+
+    log.remove()
+    check_bypass()
+    bench_acquire(args.callers, args.checks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+路由保护路径匹配基准测试
+
+注册 N 个参数化路由，对比两种匹配方式每秒能判断的路径数：
+- linear: 旧方式，依次尝试每个参数化路由的正则
+- trie: RouteTrie，按路径段逐级查找，耗时与路由数量无关
+
+测试路径包括命中靠前的路由、命中靠后的路由和未注册的路径（最坏情况，需要尝试全部正则）。
+
+用法（在项目根目录执行，数据库写入临时目录，不影响 data/global_vars.db）：
+    python benchmarks/bench_route_match.py --routes 1000 5000 --lookups 20000
+"""
+import argparse, os, random, re, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+TMP_DIR = tempfile.mkdtemp(prefix="yuanshen_bench_")
+os.chdir(TMP_DIR)
+sys.path.insert(0, str(ROOT))
+
+from loguru import logger as log  # noqa: E402
+from methods.routes_manner import RouteTrie  # noqa: E402
+
+ROUTE_TEMPLATES = (
+    "/svc{i}/items/{{item_id}}",
+    "/svc{i}/users/{{user_id}}/orders/{{order_id}}",
+    "/svc{i}/files/{{name}}.json",
+    "/api/v{i}/devices/{{device_id}}/status",
+)
+
+
+def build_routes(count: int):
+    return [ROUTE_TEMPLATES[i % len(ROUTE_TEMPLATES)].format(i=i) for i in range(count)]
+
+
+def concrete_path(route_path: str) -> str:
+    return re.sub(r"\{[^}]*\}", lambda _: f"x{random.randint(0, 9999)}", route_path)
+
+
+def build_linear(routes):
+    patterns = []
+    for route_path in routes:
+        pattern = re.escape(route_path)
+        pattern = re.sub(r'\\\{[^}]*\\\}', r'([^/]+)', pattern)
+        patterns.append((re.compile(f"^{pattern}$"), route_path))
+
+    def match(path: str):
+        for pattern, original_path in patterns:
+            if pattern.match(path):
+                return original_path
+        return None
+    return match
+
+
+def build_trie(routes):
+    trie = RouteTrie()
+    for route_path in routes:
+        trie.add(route_path)
+    return trie.match
+
+
+def measure(match, paths, lookups: int) -> float:
+    begin = time.perf_counter()
+    for i in range(lookups):
+        match(paths[i % len(paths)])
+    return lookups / (time.perf_counter() - begin)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="路由保护路径匹配基准测试")
+    parser.add_argument("--routes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--lookups", type=int, default=20000)
+    args = parser.parse_args()
+
+    log.remove()
+    random.seed(0)
+    print(f"每组查找次数: {args.lookups}")
+    print(f"{'路由数':>8} {'路径类型':>10} {'linear 次/秒':>14} {'trie 次/秒':>14} {'加速比':>8}")
+    for count in args.routes:
+        routes = build_routes(count)
+        linear, trie = build_linear(routes), build_trie(routes)
+        cases = {
+            "命中靠前": [concrete_path(route) for route in routes[:10]],
+            "命中靠后": [concrete_path(route) for route in routes[-10:]],
+            "未注册": [f"/unknown/path/{i}" for i in range(10)],
+        }
+        for name, paths in cases.items():
+            assert [linear(path) for path in paths] == [trie(path) for path in paths]
+            linear_rate = measure(linear, paths, args.lookups)
+            trie_rate = measure(trie, paths, args.lookups)
+            print(f"{count:>8} {name:>10} {linear_rate:>14.0f} {trie_rate:>14.0f} {trie_rate / linear_rate:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+路由保护中间件基准测试
+
+在进程内直接调用 ASGI 应用（不经过网络和 HTTP 客户端），对比两种中间件实现每秒能完成的请求数：
+- base_http: 旧方式，继承 BaseHTTPMiddleware，每个请求额外创建任务和内存流并重新包装响应体
+- asgi: 纯ASGI的 RouteProtectionMiddleware，判断完成后直接透传 receive/send
+
+两种实现使用相同的路径和 token 检查逻辑。测试接口：
+- /maimai/b50: 返回与 B50 图片相同结构的大体积 base64 JSON 响应
+- /bench/stream: 分块输出的流式响应
+
+用法（在项目根目录执行，数据库写入临时目录，不影响 data/global_vars.db）：
+    python benchmarks/bench_route_middleware.py --requests 500 --concurrency 16 --image-kb 2048
+"""
+import argparse, asyncio, base64, json, os, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+TMP_DIR = tempfile.mkdtemp(prefix="yuanshen_bench_")
+os.chdir(TMP_DIR)
+sys.path.insert(0, str(ROOT))
+
+from loguru import logger as log  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse, StreamingResponse  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from methods.routes_manner import RouteProtectionMiddleware  # noqa: E402
+from methods.stats_manner import api_stats_manager  # noqa: E402
+
+
+class BaseHTTPRouteProtection(BaseHTTPMiddleware):
+    """旧的 BaseHTTPMiddleware 实现，检查逻辑与 RouteProtectionMiddleware 相同"""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.checker = RouteProtectionMiddleware(None)
+
+    async def dispatch(self, request: Request, call_next):
+        response, original_path = self.checker.check_request(request.scope)
+        if response is not None:
+            return response
+        response = await call_next(request)
+        api_stats_manager.record(original_path)
+        return response
+
+
+def build_app(middleware_cls, image_kb: int, chunks: int) -> FastAPI:
+    app = FastAPI()
+    image = base64.b64encode(os.urandom(image_kb * 1024 * 3 // 4)).decode()
+    chunk = b"x" * 4096
+
+    @app.post("/maimai/b50")
+    async def create_b50(item: dict):
+        return JSONResponse(status_code=200, content={"returnCode": 1, "base64": image})
+
+    @app.get("/bench/stream")
+    async def stream():
+        async def body():
+            for _ in range(chunks):
+                yield chunk
+        return StreamingResponse(body(), media_type="application/octet-stream")
+
+    app.add_middleware(middleware_cls)
+    return app
+
+
+async def call(app, method: str, path: str, body: bytes = b"") -> int:
+    """直接调用 ASGI 应用，返回响应体字节数"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "server": ("bench", 80), "client": ("127.0.0.1", 1),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    }
+    sent = False
+    received = 0
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal received
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200, message["status"]
+        elif message["type"] == "http.response.body":
+            received += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return received
+
+
+async def measure(app, method: str, path: str, body: bytes, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return await call(app, method, path, body)
+
+    await call(app, method, path, body)
+    begin = time.perf_counter()
+    sizes = await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - begin
+    return requests / elapsed, sum(sizes) / elapsed / 1024 / 1024
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="路由保护中间件基准测试")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--image-kb", type=int, default=2048, help="B50 响应中 base64 图片的大小")
+    parser.add_argument("--chunks", type=int, default=256, help="流式响应的分块数，每块 4KB")
+    args = parser.parse_args()
+
+    log.remove()
+    body = json.dumps({"qq": "10001"}).encode()
+    cases = (("B50 大响应", "POST", "/maimai/b50", body), ("流式响应", "GET", "/bench/stream", b""))
+    print(f"请求数: {args.requests}, 并发: {args.concurrency}, B50 图片: {args.image_kb}KB, 流式: {args.chunks}x4KB")
+    print(f"{'接口':>10} {'中间件':>10} {'请求/秒':>10} {'MB/秒':>10}")
+    for name, method, path, payload in cases:
+        for label, middleware_cls in (("base_http", BaseHTTPRouteProtection), ("asgi", RouteProtectionMiddleware)):
+            app = build_app(middleware_cls, args.image_kb, args.chunks)
+            rate, throughput = await measure(app, method, path, payload, args.requests, args.concurrency)
+            print(f"{name:>10} {label:>10} {rate:>10.0f} {throughput:>10.1f}")
+    api_stats_manager.flush()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""
+Token使用统计写入基准测试
+
+模拟大量携带无效token的请求，对比两种记录方式每秒能完成的验证次数和数据库写事务数：
+- direct: 旧方式，每次验证都读取当天的 token_usage 记录、修改计数后写回并提交
+- buffered: 计数只在内存中累加，最后由 flush_usage 在一个事务中写回
+
+用法（在项目根目录执行，数据库写入临时目录，不影响 data/global_vars.db）：
+    python benchmarks/bench_token_usage.py --requests 20000 --apis 4
+"""
+import argparse, os, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+TMP_DIR = tempfile.mkdtemp(prefix="yuanshen_bench_")
+os.chdir(TMP_DIR)
+sys.path.insert(0, str(ROOT))
+
+from loguru import logger as log  # noqa: E402
+from methods.globalvar import GlobalVars  # noqa: E402
+from methods.token_manner import TokenManager, _new_usage  # noqa: E402
+
+
+class DirectTokenManager(TokenManager):
+    """每次验证都同步读改写 token_usage 记录的旧实现"""
+
+    def __init__(self):
+        super().__init__()
+        self.transactions = 0
+
+    def _record_token_usage(self, api_path: str, token: str, success: bool, message: str) -> None:
+        current_time = time.time()
+        usage_key = f"token_usage:{api_path}:{time.strftime('%Y-%m-%d', time.localtime(current_time))}"
+        usage_data = GlobalVars.get_from_table("token_usage", usage_key, _new_usage())
+        if success:
+            usage_data["success_count"] += 1
+            usage_data["last_success"] = current_time
+        else:
+            usage_data["failure_count"] += 1
+            usage_data["last_failure"] = current_time
+        GlobalVars.set_to_table("token_usage", usage_key, usage_data)
+        self.transactions += 1
+
+
+def run(manager: TokenManager, apis, requests: int) -> float:
+    begin = time.perf_counter()
+    for i in range(requests):
+        manager.verify_token(apis[i % len(apis)], f"bad-token-{i}")
+    manager.flush_usage()
+    return requests / (time.perf_counter() - begin)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Token使用统计写入基准测试")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--apis", type=int, default=4)
+    args = parser.parse_args()
+
+    log.remove()
+    apis = [f"/bench/api{i}" for i in range(args.apis)]
+
+    direct = DirectTokenManager()
+    direct.usage_flusher.stop(flush=False)
+    for api in apis:
+        direct.enable_token_for_api(api)
+    direct_rate = run(direct, apis, args.requests)
+
+    GlobalVars.delete_many_from_table("token_usage", GlobalVars.get_all_keys_from_table("token_usage"))
+    buffered = TokenManager()
+    buffered.usage_flusher.stop(flush=False)
+    for api in apis:
+        buffered.enable_token_for_api(api)
+    buffered_rate = run(buffered, apis, args.requests)
+
+    failures = sum(buffered.get_token_usage_stats(api, 1)["stats"][api]["total_failure"] for api in apis)
+    print(f"无效token请求: {args.requests}, API数: {args.apis}, 写回后失败计数: {failures}")
+    print(f"{'方式':>10} {'验证/秒':>12} {'写事务数':>10}")
+    print(f"{'direct':>10} {direct_rate:>12.0f} {direct.transactions:>10}")
+    print(f"{'buffered':>10} {buffered_rate:>12.0f} {1:>10}")
+
+
+if __name__ == "__main__":
+    main()
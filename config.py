@@ -9,3 +9,40 @@ favicon_path = None # "static/favicon.ico"路由图片
 log_level = "info"
 project_root: Path = Path(os.getcwd())
 
+api_stats_flush_interval = 5  # API访问统计写回数据库的间隔，单位为秒
+db_journal_mode = "WAL"  # 数据库日志模式，WAL模式下读写互不阻塞
+db_synchronous = "NORMAL"  # 数据库同步级别，WAL模式下NORMAL即可保证数据库不损坏
+db_cache_size = -16000  # 每个连接的页缓存大小，负数表示KB，正数表示页数
+db_mmap_size = 268435456  # 内存映射读取的最大字节数，0表示禁用
+db_reader_pool = True  # 是否为每个线程创建独立的只读连接，查询不再等待写锁
+db_async_read_workers = 4  # AsyncGlobalVars 读线程池大小
+db_value_cache = True  # 是否在内存中缓存常用键值（LRU），减少重复查询和JSON解析
+db_value_cache_entries = 4096  # 值缓存最多保存的条目数
+db_value_cache_bytes = 16 * 1024 * 1024  # 值缓存占用的近似字节数上限（按序列化后的长度估算）
+db_expire_sweep_interval = 60  # 后台清理过期键值的间隔，单位为秒，0表示禁用
+db_expire_sweep_batch = 500  # 每批删除的过期行数，每批单独提交，避免长时间占用写锁
+db_value_codec = "json"  # 值编码格式: json（默认，兼容旧数据）、orjson、msgpack，后两者需要安装对应的库
+db_value_compression = None  # 大值压缩方式: None、"zlib"、"zstd"（需要安装 zstandard）
+db_value_compress_threshold = 4096  # 编码后超过该字节数的值才压缩
+looking_keep_alive_flush_interval = 5  # 设备保活时间写回数据库的间隔，单位为秒，期间的多次保活只写一次
+looking_signature_cache_devices = 4096  # 保活签名验证缓存最多保存的设备数，超过后淘汰最久未使用的设备
+looking_status_raw_hours = 24  # 设备状态快照保留原始精度的小时数，更早的快照降采样为小时聚合后删除
+looking_status_hourly_days = 30  # 小时聚合保留的天数，更早的合并为天聚合
+looking_status_daily_days = 365  # 天聚合保留的天数，0表示永久保留
+looking_status_retention_interval = 300  # 设备状态历史保留策略的执行间隔，单位为秒，0表示禁用
+looking_status_retention_batch = 500  # 保留策略每批处理的行数，每批单独提交
+looking_report_max_days = 366  # 设备使用报告单次查询的最大天数
+looking_stream_queue_size = 64  # 每个SSE订阅者的消息队列长度，满时丢弃最旧的消息
+looking_stream_max_subscribers = 1000  # 同时存在的SSE订阅数上限
+looking_stream_heartbeat = 15  # SSE连接空闲时发送心跳的间隔，单位为秒
+looking_event_batch_max = 500  # 批量上报设备事件时单次最多的事件数
+looking_session_max_hours = 24  # 单个使用会话的最长时长，单位为小时，更长的会话通常是丢失了锁屏事件，不计入统计
+looking_alive_check_workers = 4  # 保活检查同时处理的分片数
+looking_alive_check_shard_size = 200  # 保活检查每个分片的设备数
+looking_alive_check_max_coalesce = 1.0  # 保活检查合并同时到期设备的最长等待时间，单位为秒
+route_static_cache_entries = 8192  # 路由保护缓存的静态文件检查结果条数上限，超过后淘汰最久未使用的路径
+route_static_cache_bytes = 1024 * 1024  # 静态文件检查结果缓存占用的近似字节数上限（按路径长度估算）
+route_static_hit_ttl = 300  # 静态文件存在的检查结果缓存时间，单位为秒
+route_static_miss_ttl = 5  # 静态文件不存在的检查结果缓存时间，单位为秒，运行期间新增的文件最迟在此时间后可访问
+api_limit_max_callers = 10000  # 限流器在内存中保存的令牌桶数量上限（按API路径和调用方），超过后淘汰最久未使用的
+token_usage_flush_interval = 5  # token使用统计写回数据库的间隔，单位为秒，期间的计数只在内存中累加
@@ -4,6 +4,8 @@ from fastapi import FastAPI
 from config import project_root
 from methods.routes_manner import route_manager
 from methods.loggers import get_log_config
+from methods.flush_manner import PeriodicFlusher
+from methods.globalvar import AsyncGlobalVars
 
 app = FastAPI()
 server = None
@@ -40,6 +42,9 @@ async def shutdown(signal_type=None):
         log.info("正在关闭服务器...")
         server.should_exit = True
         await server.shutdown()
+    # os._exit 不会触发 atexit，需要在此写回内存中的统计数据并等待写队列清空
+    PeriodicFlusher.stop_all()
+    AsyncGlobalVars.shutdown()
     log.info("服务器已完全关闭")
     os._exit(0)
 
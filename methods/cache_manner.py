@@ -0,0 +1,114 @@
+import pickle, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+# 不可变的标量直接缓存对象本身，容器类型缓存 pickle 数据，每次命中返回独立的副本
+_IMMUTABLE_TYPES = (str, int, float, bool, type(None))
+
+
+class LRUCache:
+    """按条目数和近似字节数限制容量的LRU缓存，支持过期时间
+
+    缓存值在命中时返回副本，调用方修改返回的字典或列表不会影响缓存内容。
+    读取数据库与写入数据库可能并发发生，填充缓存前需要通过 generation 确认
+    期间没有发生过失效操作，避免把旧值写回缓存。
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[bool, Any, Optional[float], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        """当前失效代数，读数据库前记录，填充缓存时传回"""
+        return self._generation
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """获取缓存值，不存在或已过期时返回 default"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            is_copy, payload, expire_time, size = entry
+            if expire_time and time.time() > expire_time:
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return pickle.loads(payload) if is_copy else payload
+
+    def put(self, key: Hashable, value: Any, expire_time: Optional[float], size: int, generation: int) -> bool:
+        """写入缓存，generation 与当前代数不一致（期间有失效操作）时放弃写入"""
+        if size > self.max_bytes:
+            return False
+        if isinstance(value, _IMMUTABLE_TYPES):
+            is_copy, payload = False, value
+        else:
+            is_copy, payload = True, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+        with self._lock:
+            if generation != self._generation:
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (is_copy, payload, expire_time, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def invalidate(self, keys: Iterable[Hashable]) -> None:
+        """使指定的缓存键失效"""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def invalidate_where(self, predicate) -> None:
+        """使满足条件的所有缓存键失效，用于删除整张表"""
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._entries if predicate(key)]:
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry[3]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中、淘汰等统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,65 @@
+import atexit, threading
+from typing import Callable, List, Optional
+from loguru import logger as log
+
+
+class PeriodicFlusher:
+    """周期性写回器，在后台线程中按固定间隔执行写回任务，停止时执行最后一次写回"""
+
+    _instances: List["PeriodicFlusher"] = []
+    _instances_lock = threading.Lock()
+
+    def __init__(self, name: str, flush_func: Callable[[], int], interval: float, flush_on_stop: bool = True):
+        self.name = name
+        self.flush_func = flush_func
+        self.interval = interval
+        self.flush_on_stop = flush_on_stop  # 服务关闭时是否执行最后一次写回，周期性清理任务不需要
+        self.worker_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        with PeriodicFlusher._instances_lock:
+            PeriodicFlusher._instances.append(self)
+
+    @property
+    def is_running(self) -> bool:
+        return self.worker_thread is not None and self.worker_thread.is_alive()
+
+    def start(self) -> None:
+        """启动后台写回线程"""
+        if self.is_running:
+            return
+        self._stop_event.clear()
+        self.worker_thread = threading.Thread(target=self._run_loop, name=f"flusher-{self.name}", daemon=True)
+        self.worker_thread.start()
+        log.info(f"{self.name}写回线程已启动，间隔: {self.interval}秒")
+
+    def stop(self, flush: bool = True) -> None:
+        """停止后台写回线程，默认在停止前执行最后一次写回"""
+        self._stop_event.set()
+        if self.worker_thread and self.worker_thread.is_alive():
+            self.worker_thread.join(timeout=5)
+        self.worker_thread = None
+        if flush:
+            self.flush()
+
+    def flush(self) -> int:
+        """立即执行一次写回，返回写回的条目数"""
+        try:
+            return self.flush_func() or 0
+        except Exception as e:
+            log.exception(f"{self.name}写回失败: {e}")
+            return 0
+
+    def _run_loop(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.flush()
+
+    @classmethod
+    def stop_all(cls) -> None:
+        """停止所有写回器并按需执行最后一次写回，用于服务关闭"""
+        with cls._instances_lock:
+            instances = list(cls._instances)
+        for flusher in instances:
+            flusher.stop(flush=flusher.flush_on_stop)
+
+
+atexit.register(PeriodicFlusher.stop_all)
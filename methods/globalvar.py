@@ -1,18 +1,32 @@
-import json, os, time, sqlite3
+import os, time, sqlite3, asyncio, queue
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Union
 from dataclasses import dataclass, field
-from config import project_root
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from loguru import logger as log
+from config import (
+    project_root, db_journal_mode, db_synchronous,
+    db_cache_size, db_mmap_size, db_reader_pool, db_async_read_workers,
+    db_value_cache, db_value_cache_entries, db_value_cache_bytes,
+    db_expire_sweep_interval, db_expire_sweep_batch,
+    db_value_codec, db_value_compression, db_value_compress_threshold
+)
+from methods.cache_manner import LRUCache
+from methods.serializer import ValueCodec
+from methods.flush_manner import PeriodicFlusher
 import threading
 import atexit
 
 
 cache_config_dir = project_root / "data"
+_MISSING = object()  # 缓存未命中标记，区分缓存中的 None
 if not os.path.exists(cache_config_dir):
     os.makedirs(cache_config_dir)
 
 
-@dataclass
+@dataclass(init=False)  # 单例，避免每次 GlobalVars() 都重置实例状态
 class GlobalVars:
     _instance = None
     _is_loaded: bool = False
@@ -20,6 +34,25 @@ class GlobalVars:
     _lock = threading.RLock()  # 使用可重入锁确保线程安全
     _storage_path: Path = cache_config_dir / "global_vars.db"
     _default_table: str = "global_vars"
+    _journal_mode: str = db_journal_mode
+    _synchronous: str = db_synchronous
+    _cache_size: int = db_cache_size
+    _mmap_size: int = db_mmap_size
+    _reader_pool_enabled: bool = db_reader_pool
+    _readers = threading.local()  # 每个线程独立的只读连接
+    _reader_conns = {}  # 线程 -> 该线程的只读连接，线程结束后移除并关闭
+    _reader_generation: int = 0  # 关闭数据库时递增，使旧的只读连接失效
+    _known_tables = set()  # 已存在的表名缓存，初始化时从sqlite_master加载
+    _kv_tables = set()  # 其中由GlobalVars管理的键值表
+    _schema_lookups_avoided: int = 0  # 通过表缓存省去的结构查询次数
+    _schema_queries: int = 0  # 实际执行的结构查询次数
+    _batch_size: int = 500  # 批量查询时每条语句的最大参数个数，低于SQLite的变量上限
+    _sweep_interval: float = db_expire_sweep_interval
+    _sweep_batch: int = db_expire_sweep_batch
+    _sweeper = None  # 后台过期数据清理任务，initialize 时启动
+    _sweep_stats = {"sweeps": 0, "last_reclaimed": 0, "total_reclaimed": 0, "last_duration_ms": 0.0, "last_sweep": None}
+    _codec = ValueCodec(db_value_codec, db_value_compression, db_value_compress_threshold)
+    _cache = LRUCache(db_value_cache_entries, db_value_cache_bytes) if db_value_cache else None  # (表名, 键) -> 值
     
     def __new__(cls):
         if cls._instance is None:
@@ -35,10 +68,14 @@ class GlobalVars:
                 self._is_loaded = True
     
     def _get_connection(self):
-        """获取数据库连接（如果未打开则创建）"""
+        """获取写连接（如果未打开则创建），所有写操作共用该连接并由锁串行化"""
         with self._lock:
             if self._conn is None:
                 self._conn = sqlite3.connect(str(self._storage_path), check_same_thread=False)
+                # WAL模式下读写互不阻塞，synchronous=NORMAL 只在检查点时同步磁盘
+                self._conn.execute(f"PRAGMA journal_mode = {self._journal_mode}")
+                self._conn.execute(f"PRAGMA synchronous = {self._synchronous}")
+                self._apply_cache_pragmas(self._conn)
                 # 启用外键约束
                 self._conn.execute("PRAGMA foreign_keys = ON")
                 # 启用递归触发器
@@ -47,41 +84,168 @@ class GlobalVars:
                 self._conn.row_factory = sqlite3.Row
             return self._conn
     
+    def _apply_cache_pragmas(self, conn: sqlite3.Connection) -> None:
+        """设置页缓存和内存映射大小"""
+        conn.execute(f"PRAGMA cache_size = {int(self._cache_size)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self._mmap_size)}")
+    
+    def _get_read_connection(self) -> sqlite3.Connection:
+        """获取当前线程的只读连接（如果未打开则创建）"""
+        readers = self._readers
+        conn = getattr(readers, "conn", None)
+        if conn is not None:
+            if getattr(readers, "generation", -1) == self._reader_generation:
+                return conn
+            # 数据库关闭过，旧连接由所属线程自己关闭
+            self._close_reader(conn)
+            readers.conn = None
+        
+        # 确保写连接已创建数据库文件并切换到WAL模式
+        self._get_connection()
+        conn = sqlite3.connect(
+            f"file:{self._storage_path.as_posix()}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._apply_cache_pragmas(conn)
+        conn.execute("PRAGMA query_only = ON")
+        conn.row_factory = sqlite3.Row
+        
+        with self._lock:
+            self._evict_dead_readers()
+            self._reader_conns[threading.current_thread()] = conn
+            readers.conn = conn
+            readers.generation = self._reader_generation
+        return conn
+    
+    @staticmethod
+    def _close_reader(conn: sqlite3.Connection) -> None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    
+    def _evict_dead_readers(self) -> None:
+        """关闭已结束线程的只读连接，这些连接不会再被使用（需持有锁）"""
+        for thread in [thread for thread in self._reader_conns if not thread.is_alive()]:
+            self._close_reader(self._reader_conns.pop(thread))
+    
+    @contextmanager
+    def _read_cursor(self):
+        """获取用于查询的游标，启用读连接池时不需要等待写锁
+
+        只读连接与写连接相互独立，在 transaction() 内调用的读取方法看不到该事务尚未提交的写入，
+        事务内需要读取自己的写入时应直接使用事务游标查询。
+        """
+        if self._reader_pool_enabled:
+            yield self._get_read_connection().cursor()
+        else:
+            with self._lock:
+                yield self._get_connection().cursor()
+    
     def _init_db(self) -> None:
-        """初始化数据库，创建必要的表"""
+        """初始化数据库，加载表缓存并创建必要的表"""
         conn = self._get_connection()
+        self._load_table_registry()
         # 创建默认键值表
         self._ensure_table_exists(self._default_table)
+        # 为已有的键值表补建过期时间索引
+        self._ensure_expire_indexes()
+    
+    def _load_table_registry(self) -> None:
+        """从sqlite_master加载所有表名，并识别其中的键值表"""
+        with self._lock:
+            cursor = self._get_connection().cursor()
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+            tables = {row[0] for row in cursor.fetchall()}
+            kv_tables = set()
+            for table in tables:
+                cursor.execute(f"PRAGMA table_info({table})")
+                columns = {row[1] for row in cursor.fetchall()}
+                if {"key", "value", "expire_time"} <= columns:
+                    kv_tables.add(table)
+            self._known_tables.clear()
+            self._known_tables.update(tables)
+            self._kv_tables.clear()
+            self._kv_tables.update(kv_tables)
+            self._schema_queries += 1 + len(tables)
         
     def _ensure_table_exists(self, table_name: str) -> None:
         """确保指定的表存在，如不存在则创建"""
+        if table_name in self._kv_tables:
+            self._schema_lookups_avoided += 1
+            return
             
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(f'''
-        CREATE TABLE IF NOT EXISTS {table_name} (
-            key TEXT PRIMARY KEY,
-            value TEXT NOT NULL,
-            expire_time REAL DEFAULT NULL,
-            last_update REAL NOT NULL
+        with self._lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table_name} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expire_time REAL DEFAULT NULL,
+                last_update REAL NOT NULL
+            )
+            ''')
+            cursor.execute(self._expire_index_sql(table_name))
+            
+            conn.commit()
+            self._known_tables.add(table_name)
+            self._kv_tables.add(table_name)
+    
+    def _expire_index_sql(self, table_name: str) -> str:
+        """过期时间上的部分索引，只包含设置了过期时间的行"""
+        return (
+            f"CREATE INDEX IF NOT EXISTS idx_{table_name}_expire_time "
+            f"ON {table_name} (expire_time) WHERE expire_time IS NOT NULL"
         )
-        ''')
-        
-        conn.commit()
     
-    def _serialize_value(self, value: Any) -> str:
-        """将Python对象序列化为JSON存储"""
-        return json.dumps(value, ensure_ascii=False)
+    def _ensure_expire_indexes(self) -> None:
+        """确保所有键值表都有过期时间索引"""
+        with self._lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            for table_name in sorted(self._kv_tables):
+                cursor.execute(self._expire_index_sql(table_name))
+            conn.commit()
     
-    def _deserialize_value(self, value_json: str) -> Any:
-        """将JSON序列化的值还原为Python对象"""
-        if value_json is None:
-            return None
-        try:
-            return json.loads(value_json)
-        except json.JSONDecodeError:
-            return value_json
+    def _serialize_value(self, value: Any) -> Union[str, bytes]:
+        """按配置的编码格式序列化值，默认为JSON文本"""
+        return self._codec.encode(value)
+    
+    def _deserialize_value(self, value_json: Union[str, bytes, None]) -> Any:
+        """还原序列化的值，自动识别JSON文本和带格式标记的二进制数据"""
+        return self._codec.decode(value_json)
+    
+    @classmethod
+    def encode_value(cls, value: Any) -> Union[str, bytes]:
+        """按当前编码格式序列化值，供自定义结构的表存储JSON类字段"""
+        return cls()._serialize_value(value)
+    
+    @classmethod
+    def decode_value(cls, stored: Union[str, bytes, None]) -> Any:
+        """还原 encode_value 序列化的值"""
+        return cls()._deserialize_value(stored)
+    
+    def _invalidate_cached(self, table_name: str, keys) -> None:
+        """写入或删除后使对应的缓存失效"""
+        if self._cache is not None:
+            self._cache.invalidate([(table_name, key) for key in keys])
+    
+    @classmethod
+    def invalidate_cache(cls, table_name: Optional[str] = None, keys: Optional[List[str]] = None) -> None:
+        """使缓存失效，通过 transaction() 直接修改键值表后需要调用
+
+        不指定表时清空全部缓存，只指定表时清空该表的缓存。
+        """
+        instance = cls()
+        if instance._cache is None:
+            return
+        if table_name is None:
+            instance._cache.clear()
+        elif keys is None:
+            instance._cache.invalidate_where(lambda cache_key: cache_key[0] == table_name)
+        else:
+            instance._invalidate_cached(table_name, keys)
     
     @classmethod
     def set(cls, key: str, value: Any, expire: Optional[int] = None) -> None:
@@ -97,21 +261,23 @@ class GlobalVars:
         instance.ensure_loaded()
         instance._ensure_table_exists(table_name)
         
-        conn = instance._get_connection()
-        cursor = conn.cursor()
-        
         # 序列化值
         value_json = instance._serialize_value(value)
         current_time = time.time()
         expire_time = current_time + expire if expire else None
         
-        # 使用参数化查询防止SQL注入
-        cursor.execute(
-            f"REPLACE INTO {table_name} (key, value, expire_time, last_update) VALUES (?, ?, ?, ?)",
-            (key, value_json, expire_time, current_time)
-        )
-        
-        conn.commit()
+        with instance._lock:
+            conn = instance._get_connection()
+            cursor = conn.cursor()
+            
+            # 使用参数化查询防止SQL注入
+            cursor.execute(
+                f"REPLACE INTO {table_name} (key, value, expire_time, last_update) VALUES (?, ?, ?, ?)",
+                (key, value_json, expire_time, current_time)
+            )
+            
+            conn.commit()
+            instance._invalidate_cached(table_name, [key])
     
     @classmethod
     def get(cls, key: str, default: Any = None) -> Any:
@@ -128,16 +294,21 @@ class GlobalVars:
         if not cls.table_exists(table_name):
             return default
         
-        conn = instance._get_connection()
-        cursor = conn.cursor()
-        
-        # 查询数据
-        cursor.execute(
-            f"SELECT value, expire_time FROM {table_name} WHERE key = ?",
-            (key,)
-        )
-        
-        row = cursor.fetchone()
+        cache = instance._cache
+        if cache is not None:
+            value = cache.get((table_name, key), _MISSING)
+            if value is not _MISSING:
+                return value
+            generation = cache.generation
+        
+        with instance._read_cursor() as cursor:
+            # 查询数据
+            cursor.execute(
+                f"SELECT value, expire_time FROM {table_name} WHERE key = ?",
+                (key,)
+            )
+            
+            row = cursor.fetchone()
         if not row:
             return default
         
@@ -148,7 +319,10 @@ class GlobalVars:
             cls.delete_from_table(table_name, key)  # 删除过期数据
             return default
         
-        return instance._deserialize_value(value_json)
+        value = instance._deserialize_value(value_json)
+        if cache is not None:
+            cache.put((table_name, key), value, expire_time, len(value_json), generation)
+        return value
 
     @classmethod
     def delete(cls, key: str) -> None:
@@ -164,42 +338,264 @@ class GlobalVars:
         if not cls.table_exists(table_name):
             return
         
-        conn = instance._get_connection()
-        cursor = conn.cursor()
+        with instance._lock:
+            conn = instance._get_connection()
+            cursor = conn.cursor()
+            
+            # 删除数据
+            cursor.execute(f"DELETE FROM {table_name} WHERE key = ?", (key,))
+            conn.commit()
+            instance._invalidate_cached(table_name, [key])
+
+    @classmethod
+    def get_many(cls, keys: List[str]) -> Dict[str, Any]:
+        """从默认表批量获取值"""
+        return cls.get_many_from_table(cls()._default_table, keys)
+
+    @classmethod
+    def get_many_from_table(cls, table_name: str, keys: List[str]) -> Dict[str, Any]:
+        """从指定表批量获取值，只返回存在且未过期的键，每批键只执行一次查询"""
+        instance = cls()
+        instance.ensure_loaded()
+
+        keys = list(dict.fromkeys(keys))
+        if not keys or not cls.table_exists(table_name):
+            return {}
+
+        result = {}
+        cache = instance._cache
+        if cache is not None:
+            generation = cache.generation
+            for key in keys:
+                value = cache.get((table_name, key), _MISSING)
+                if value is not _MISSING:
+                    result[key] = value
+            keys = [key for key in keys if key not in result]
+            if not keys:
+                return result
+
+        rows = []
+        with instance._read_cursor() as cursor:
+            for start in range(0, len(keys), cls._batch_size):
+                chunk = keys[start:start + cls._batch_size]
+                placeholders = ",".join("?" * len(chunk))
+                cursor.execute(
+                    f"SELECT key, value, expire_time FROM {table_name} WHERE key IN ({placeholders})",
+                    chunk
+                )
+                rows.extend(cursor.fetchall())
+
+        expired_keys = []
+        now = time.time()
+        for key, value_json, expire_time in rows:
+            if expire_time and now > expire_time:
+                expired_keys.append(key)
+                continue
+            result[key] = instance._deserialize_value(value_json)
+            if cache is not None:
+                cache.put((table_name, key), result[key], expire_time, len(value_json), generation)
+
+        if expired_keys:
+            cls.delete_many_from_table(table_name, expired_keys)  # 删除过期数据
+        return result
+
+    @classmethod
+    def set_many(cls, mapping: Dict[str, Any], expire: Optional[int] = None) -> None:
+        """批量设置默认表中的值"""
+        cls.set_many_to_table(cls()._default_table, mapping, expire)
+
+    @classmethod
+    def set_many_to_table(cls, table_name: str, mapping: Dict[str, Any], expire: Optional[int] = None) -> None:
+        """在一个事务中批量设置指定表中的值，可选过期时间(秒)"""
+        instance = cls()
+        instance.ensure_loaded()
+        instance._ensure_table_exists(table_name)
+
+        if not mapping:
+            return
+
+        current_time = time.time()
+        expire_time = current_time + expire if expire else None
+        rows = [
+            (key, instance._serialize_value(value), expire_time, current_time)
+            for key, value in mapping.items()
+        ]
+
+        with cls.transaction() as cursor:
+            cursor.executemany(
+                f"REPLACE INTO {table_name} (key, value, expire_time, last_update) VALUES (?, ?, ?, ?)",
+                rows
+            )
+        instance._invalidate_cached(table_name, mapping.keys())
+
+    @classmethod
+    def delete_many(cls, keys: List[str]) -> None:
+        """从默认表批量删除键值对"""
+        cls.delete_many_from_table(cls()._default_table, keys)
+
+    @classmethod
+    def delete_many_from_table(cls, table_name: str, keys: List[str]) -> None:
+        """在一个事务中从指定表批量删除键值对"""
+        instance = cls()
+        instance.ensure_loaded()
+
+        if not keys or not cls.table_exists(table_name):
+            return
+
+        with cls.transaction() as cursor:
+            cursor.executemany(f"DELETE FROM {table_name} WHERE key = ?", [(key,) for key in keys])
+        instance._invalidate_cached(table_name, keys)
+
+    @classmethod
+    def incr(cls, key: str, delta: int = 1, expire: Optional[int] = None) -> Any:
+        """原子增加默认表中的数值"""
+        return cls.incr_in_table(cls()._default_table, key, delta, expire)
+
+    @classmethod
+    def incr_in_table(cls, table_name: str, key: str, delta: int = 1, expire: Optional[int] = None) -> Any:
+        """用一条UPSERT语句原子增加指定表中的数值并返回新值
+
+        键不存在或已过期时以 delta 作为初始值，过期时间(秒)只在新建时设置。
+        """
+        instance = cls()
+        instance.ensure_loaded()
+        instance._ensure_table_exists(table_name)
+
+        current_time = time.time()
+        expire_time = current_time + expire if expire else None
+
+        with cls.transaction() as cursor:
+            cursor.execute(
+                f'''
+                INSERT INTO {table_name} (key, value, expire_time, last_update) VALUES (?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    value = CASE WHEN expire_time IS NOT NULL AND expire_time < excluded.last_update
+                                 THEN excluded.value ELSE value + excluded.value END,
+                    expire_time = CASE WHEN expire_time IS NOT NULL AND expire_time < excluded.last_update
+                                       THEN excluded.expire_time ELSE expire_time END,
+                    last_update = excluded.last_update
+                RETURNING value
+                ''',
+                (key, instance._serialize_value(delta), expire_time, current_time)
+            )
+            value_json = cursor.fetchone()[0]
+        instance._invalidate_cached(table_name, [key])
+
+        return instance._deserialize_value(value_json)
+
+    @classmethod
+    @contextmanager
+    def transaction(cls):
+        """在单个事务中执行多条写操作，退出时统一提交，发生异常时回滚
+
+        get/query 等读取方法使用各线程独立的只读连接，看不到本事务尚未提交的写入；
+        事务内的读改写需要通过 yield 出的游标查询。
+        """
+        instance = cls()
+        instance.ensure_loaded()
         
-        # 删除数据
-        cursor.execute(f"DELETE FROM {table_name} WHERE key = ?", (key,))
-        conn.commit()
+        with instance._lock:
+            conn = instance._get_connection()
+            cursor = conn.cursor()
+            try:
+                yield cursor
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    @classmethod
+    def query(cls, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        """执行只读SQL查询并返回所有结果行，用于自定义结构的表"""
+        instance = cls()
+        instance.ensure_loaded()
+        
+        with instance._read_cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
     
     @classmethod
-    def clear_expired(cls, table_name: Optional[str] = None) -> None:
-        """清理指定表或所有表中的过期数据"""
+    def clear_expired(cls, table_name: Optional[str] = None) -> int:
+        """清理指定表或所有表中的过期数据，返回删除的行数"""
         instance = cls()
         instance.ensure_loaded()
         
         if table_name:
             # 清理指定表
             if cls.table_exists(table_name):
-                cls._clear_expired_in_table(table_name)
-        else:
-            # 清理所有表
-            tables = cls.get_all_tables()
-            for table in tables:
-                cls._clear_expired_in_table(table)
+                return cls._clear_expired_in_table(table_name)
+            return 0
+        
+        # 清理所有键值表，跳过自定义结构的表
+        reclaimed = 0
+        tables = cls.get_all_tables()
+        for table in tables:
+            if cls._is_kv_table(table):
+                reclaimed += cls._clear_expired_in_table(table)
+        return reclaimed
     
     @classmethod
-    def _clear_expired_in_table(cls, table_name: str) -> None:
-        """清理指定表中的过期数据（内部方法）"""
+    def sweep_expired(cls) -> int:
+        """清理所有键值表中的过期数据并记录本次清理统计，由后台清理任务定期调用"""
+        start = time.perf_counter()
+        reclaimed = cls.clear_expired()
+        duration_ms = (time.perf_counter() - start) * 1000
+        
+        stats = cls._sweep_stats
+        stats["sweeps"] += 1
+        stats["last_reclaimed"] = reclaimed
+        stats["total_reclaimed"] += reclaimed
+        stats["last_duration_ms"] = round(duration_ms, 2)
+        stats["last_sweep"] = time.time()
+        if reclaimed:
+            log.info(f"过期数据清理完成: 删除 {reclaimed} 行，耗时 {duration_ms:.1f}ms")
+        return reclaimed
+    
+    @classmethod
+    def is_kv_table(cls, table_name: str) -> bool:
+        """判断指定表是否为GlobalVars管理的键值表"""
         instance = cls()
-        conn = instance._get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            f"DELETE FROM {table_name} WHERE expire_time IS NOT NULL AND expire_time < ?",
-            (time.time(),)
-        )
+        instance.ensure_loaded()
+        return table_name in instance._kv_tables
+    
+    @classmethod
+    def _is_kv_table(cls, table_name: str) -> bool:
+        """判断指定表是否为GlobalVars管理的键值表（内部方法）"""
+        return table_name in cls()._kv_tables
+    
+    @classmethod
+    def _clear_expired_in_table(cls, table_name: str) -> int:
+        """分批清理指定表中的过期数据，每批单独提交以缩短持有写锁的时间（内部方法）"""
+        instance = cls()
+        batch_size = max(1, int(instance._sweep_batch))
+        now = time.time()
+        reclaimed = 0
+        
+        while True:
+            with instance._lock:
+                if table_name not in instance._known_tables:
+                    break
+                conn = instance._get_connection()
+                cursor = conn.cursor()
+                
+                cursor.execute(
+                    f"""
+                    DELETE FROM {table_name} WHERE rowid IN (
+                        SELECT rowid FROM {table_name}
+                        WHERE expire_time IS NOT NULL AND expire_time < ?
+                        LIMIT ?
+                    )
+                    """,
+                    (now, batch_size)
+                )
+                deleted = cursor.rowcount
+                conn.commit()
+            
+            reclaimed += deleted
+            if deleted < batch_size:
+                break
         
-        conn.commit()
+        return reclaimed
 
     @classmethod
     def get_all_keys(cls) -> List[str]:
@@ -215,11 +611,9 @@ class GlobalVars:
         if not cls.table_exists(table_name):
             return []
         
-        conn = instance._get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(f"SELECT key FROM {table_name}")
-        return [row[0] for row in cursor.fetchall()]
+        with instance._read_cursor() as cursor:
+            cursor.execute(f"SELECT key FROM {table_name}")
+            return [row[0] for row in cursor.fetchall()]
     
     @classmethod
     def get_all(cls) -> Dict[str, Any]:
@@ -235,50 +629,79 @@ class GlobalVars:
         if not cls.table_exists(table_name):
             return {}
         
-        conn = instance._get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(f"SELECT key, value FROM {table_name}")
+        with instance._read_cursor() as cursor:
+            cursor.execute(f"SELECT key, value FROM {table_name}")
+            rows = cursor.fetchall()
         
         result = {}
-        for key, value_json in cursor.fetchall():
+        for key, value_json in rows:
             result[key] = instance._deserialize_value(value_json)
         
         return result
     
     @classmethod
     def table_exists(cls, table_name: str) -> bool:
-        """检查指定的表是否存在"""
+        """检查指定的表是否存在，直接查询内存中的表缓存"""
         instance = cls()
         instance.ensure_loaded()
-        
-        conn = instance._get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
-            (table_name,)
-        )
-        
-        return cursor.fetchone() is not None
+        instance._schema_lookups_avoided += 1
+        return table_name in instance._known_tables
     
     @classmethod
     def get_all_tables(cls) -> List[str]:
         """获取数据库中的所有表名"""
         instance = cls()
         instance.ensure_loaded()
-        
-        conn = instance._get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        return [row[0] for row in cursor.fetchall()]
+        instance._schema_lookups_avoided += 1
+        return sorted(instance._known_tables)
+    
+    @classmethod
+    def ensure_schema(cls, statements: List[str]) -> None:
+        """在一个事务中执行自定义表的建表/建索引语句，并刷新表缓存"""
+        instance = cls()
+        with cls.transaction() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+        instance._load_table_registry()
+    
+    @classmethod
+    def refresh_tables(cls) -> None:
+        """重新从数据库加载表缓存，用于表被外部修改后的同步"""
+        instance = cls()
+        instance.ensure_loaded()
+        instance._load_table_registry()
+    
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """获取存储层运行统计"""
+        instance = cls()
+        return {
+            "known_tables": len(instance._known_tables),
+            "kv_tables": len(instance._kv_tables),
+            "schema_lookups_avoided": instance._schema_lookups_avoided,
+            "schema_queries": instance._schema_queries,
+            "reader_connections": len(instance._reader_conns),
+            "value_cache": instance._cache.get_stats() if instance._cache is not None else None,
+            "expire_sweep": dict(instance._sweep_stats),
+        }
     
     @classmethod
     def close(cls) -> None:
-        """关闭数据库连接"""
+        """关闭数据库连接
+
+        只读连接只在所属线程中关闭：当前线程和已结束线程的连接立即关闭，
+        其他仍在运行的线程在下次读取时发现连接已失效，自行关闭后重新打开。
+        """
         instance = cls()
         with instance._lock:
+            current = threading.current_thread()
+            for thread, reader_conn in instance._reader_conns.items():
+                if thread is current or not thread.is_alive():
+                    instance._close_reader(reader_conn)
+            instance._reader_conns.clear()
+            instance._reader_generation += 1
+            if instance._cache is not None:
+                instance._cache.clear()
             if instance._conn:
                 instance._conn.close()
                 instance._conn = None
@@ -325,6 +748,11 @@ class GlobalVars:
         cls.set("server_start_time", time.time())
         # 清理可能存在的过期数据
         cls.clear_expired()
+        # 启动后台过期数据清理
+        if cls._sweeper is None and cls._sweep_interval > 0:
+            cls._sweeper = PeriodicFlusher("过期数据清理", cls.sweep_expired, cls._sweep_interval, flush_on_stop=False)
+        if cls._sweeper is not None:
+            cls._sweeper.start()
         
     @classmethod
     def create_table(cls, table_name: str) -> bool:
@@ -350,17 +778,24 @@ class GlobalVars:
         if not cls.table_exists(table_name):
             return False
             
-        conn = instance._get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(f"DROP TABLE {table_name}")
-        conn.commit()
+        with instance._lock:
+            conn = instance._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(f"DROP TABLE {table_name}")
+            conn.commit()
+            instance._known_tables.discard(table_name)
+            instance._kv_tables.discard(table_name)
+            if instance._cache is not None:
+                instance._cache.invalidate_where(lambda cache_key: cache_key[0] == table_name)
         
         return True
         
     @classmethod
     def shutdown(cls) -> None:
         """安全关闭全局变量管理器，确保数据刷新到磁盘"""
+        if cls._sweeper is not None:
+            cls._sweeper.stop(flush=False)
         cls.close()
         
     class Context:
@@ -371,8 +806,104 @@ class GlobalVars:
             
         def __exit__(self, exc_type, exc_val, exc_tb):
             GlobalVars.shutdown()
-            
+
+
+class AsyncGlobalVars:
+    """GlobalVars 的异步接口，避免SQLite操作阻塞事件循环
+
+    写操作进入请求队列，由专用的单一写线程按提交顺序执行；
+    读操作在线程池中执行，每个线程使用独立的只读连接。
+    """
+    _queue: "queue.Queue" = queue.Queue()
+    _writer_thread: Optional[threading.Thread] = None
+    _start_lock = threading.Lock()
+    _read_executor = ThreadPoolExecutor(max_workers=db_async_read_workers, thread_name_prefix="globalvar-read")
+
+    @classmethod
+    def _ensure_writer(cls) -> None:
+        """确保写线程已启动"""
+        if cls._writer_thread is not None and cls._writer_thread.is_alive():
+            return
+        with cls._start_lock:
+            if cls._writer_thread is None or not cls._writer_thread.is_alive():
+                cls._writer_thread = threading.Thread(target=cls._writer_loop, name="globalvar-writer", daemon=True)
+                cls._writer_thread.start()
+
+    @classmethod
+    def _writer_loop(cls) -> None:
+        """写线程主循环，逐个执行队列中的写请求"""
+        while True:
+            item = cls._queue.get()
+            if item is None:
+                cls._queue.task_done()
+                break
+            func, args, kwargs, future = item
+            try:
+                if future.set_running_or_notify_cancel():
+                    future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                log.exception(f"异步写操作执行失败: {getattr(func, '__name__', func)} - {e}")
+                future.set_exception(e)
+            finally:
+                cls._queue.task_done()
+
+    @classmethod
+    def submit(cls, func, *args, **kwargs) -> Future:
+        """提交写操作到写线程，立即返回Future，同步代码中可用于不等待结果的写入"""
+        cls._ensure_writer()
+        future = Future()
+        cls._queue.put((func, args, kwargs, future))
+        return future
+
+    @classmethod
+    async def arun(cls, func, *args, **kwargs) -> Any:
+        """在写线程中执行包含写操作的函数并等待结果"""
+        return await asyncio.wrap_future(cls.submit(func, *args, **kwargs))
+
+    @classmethod
+    async def aread(cls, func, *args, **kwargs) -> Any:
+        """在读线程池中执行只读函数并等待结果"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls._read_executor, partial(func, *args, **kwargs))
+
+    @classmethod
+    async def aget(cls, key: str, default: Any = None, table_name: Optional[str] = None) -> Any:
+        """异步获取值，未指定表时使用默认表"""
+        return await cls.aread(GlobalVars.get_from_table, table_name or GlobalVars._default_table, key, default)
+
+    @classmethod
+    async def aset(cls, key: str, value: Any, expire: Optional[int] = None, table_name: Optional[str] = None) -> None:
+        """异步设置值，未指定表时使用默认表"""
+        await cls.arun(GlobalVars.set_to_table, table_name or GlobalVars._default_table, key, value, expire)
+
+    @classmethod
+    async def aincr(cls, key: str, delta: int = 1, table_name: Optional[str] = None) -> Any:
+        """异步原子增加数值，返回增加后的值"""
+        return await cls.arun(GlobalVars.incr_in_table, table_name or GlobalVars._default_table, key, delta)
+
+    @classmethod
+    async def aget_many(cls, keys: List[str], table_name: Optional[str] = None) -> Dict[str, Any]:
+        """异步批量获取值，返回存在的键值对"""
+        return await cls.aread(GlobalVars.get_many_from_table, table_name or GlobalVars._default_table, keys)
+
+    @classmethod
+    async def aset_many(cls, mapping: Dict[str, Any], expire: Optional[int] = None, table_name: Optional[str] = None) -> None:
+        """异步批量设置值"""
+        await cls.arun(GlobalVars.set_many_to_table, table_name or GlobalVars._default_table, mapping, expire)
+
+    @classmethod
+    def shutdown(cls, timeout: float = 5) -> None:
+        """等待队列中的写操作全部完成后停止写线程"""
+        worker = cls._writer_thread
+        if worker is None or not worker.is_alive():
+            return
+        cls._queue.put(None)
+        worker.join(timeout=timeout)
+        cls._writer_thread = None
+
 
 atexit.register(GlobalVars.shutdown)
+# atexit 按注册的逆序执行，先写完队列中的数据再关闭数据库
+atexit.register(AsyncGlobalVars.shutdown)
 
 GlobalVars.initialize()
\ No newline at end of file
@@ -0,0 +1,134 @@
+import math, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from config import api_limit_max_callers
+
+# 限流配置项，0 表示不限制
+LIMIT_FIELDS = ("rate", "burst", "max_concurrent", "path_max_concurrent")
+
+
+def normalize_limit(rate: float = 0, burst: int = 0, max_concurrent: int = 0,
+                    path_max_concurrent: int = 0) -> Optional[Dict[str, Any]]:
+    """整理限流配置，全部为0时返回None；设置了速率但没有设置突发容量时按每秒速率取整"""
+    rate = max(0.0, float(rate or 0))
+    burst = max(0, int(burst or 0))
+    if rate and not burst:
+        burst = max(1, math.ceil(rate))
+    limit = {
+        "rate": rate,
+        "burst": burst if rate else 0,
+        "max_concurrent": max(0, int(max_concurrent or 0)),
+        "path_max_concurrent": max(0, int(path_max_concurrent or 0)),
+    }
+    if not any(limit.values()):
+        return None
+    return limit
+
+
+class RequestLimiter:
+    """按API路径和调用方限制请求速率与并发数
+
+    每个 (API路径, 调用方) 一个令牌桶，按 rate 每秒补充、最多 burst 个令牌，每个请求消耗一个；
+    max_concurrent 限制同一调用方在该API上同时处理的请求数，path_max_concurrent 限制该API的总并发。
+    所有状态都在内存中，每次检查只做常数次字典操作；令牌桶按最久未使用淘汰，最多保存 max_callers 个。
+
+    调用方由中间件决定：启用token验证的API按“已验证的token + 客户端地址”，其余按客户端地址。
+    TokenManager 每个API只有一个token，所有客户端共用，因此这里的限流是按客户端地址（及API）的限流，
+    不是按用户的限流；同一出口地址后的多个用户共用一个令牌桶。
+    """
+
+    def __init__(self, max_callers: int = api_limit_max_callers):
+        self.max_callers = max_callers
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict()  # -> [令牌数, 上次补充时间]
+        self._active: Dict[Tuple[str, str], int] = {}
+        self._path_active: Dict[str, int] = {}
+        self._rejected: Dict[str, Dict[str, int]] = {}
+        self.evictions = 0
+
+    def acquire(self, api_path: str, caller: str, limit: Dict[str, Any]) -> Tuple[bool, str, float]:
+        """检查并占用一次请求配额，返回 (是否允许, 拒绝原因, 建议重试的秒数)
+
+        caller 必须是客户端无法随意更换的标识（见类说明），否则每次换一个标识就能绕过限流。
+        允许时若配置了并发限制，请求结束后必须调用 release。
+        """
+        key = (api_path, caller)
+        now = time.monotonic()
+        with self._lock:
+            max_concurrent = limit.get("max_concurrent", 0)
+            path_max_concurrent = limit.get("path_max_concurrent", 0)
+            if path_max_concurrent and self._path_active.get(api_path, 0) >= path_max_concurrent:
+                return self._reject(api_path, "concurrency", f"该API同时处理的请求已达上限 {path_max_concurrent}", 1.0)
+            if max_concurrent and self._active.get(key, 0) >= max_concurrent:
+                return self._reject(api_path, "concurrency", f"同时进行的请求已达上限 {max_concurrent}", 1.0)
+
+            rate = limit.get("rate", 0)
+            if rate:
+                burst = limit.get("burst") or 1
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = [float(burst), now]
+                    self._buckets[key] = bucket
+                    if len(self._buckets) > self.max_callers:
+                        self._buckets.popitem(last=False)
+                        self.evictions += 1
+                else:
+                    self._buckets.move_to_end(key)
+                    bucket[0] = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+                    bucket[1] = now
+                if bucket[0] < 1:
+                    return self._reject(api_path, "rate", f"请求过于频繁，每秒最多 {rate:g} 次",
+                                        (1 - bucket[0]) / rate)
+                bucket[0] -= 1
+
+            if max_concurrent:
+                self._active[key] = self._active.get(key, 0) + 1
+            if path_max_concurrent:
+                self._path_active[api_path] = self._path_active.get(api_path, 0) + 1
+        return True, "", 0.0
+
+    def release(self, api_path: str, caller: str, limit: Dict[str, Any]) -> None:
+        """释放 acquire 占用的并发配额"""
+        key = (api_path, caller)
+        with self._lock:
+            if limit.get("max_concurrent") and key in self._active:
+                self._active[key] -= 1
+                if self._active[key] <= 0:
+                    del self._active[key]
+            if limit.get("path_max_concurrent") and api_path in self._path_active:
+                self._path_active[api_path] -= 1
+                if self._path_active[api_path] <= 0:
+                    del self._path_active[api_path]
+
+    def _reject(self, api_path: str, kind: str, message: str, retry_after: float) -> Tuple[bool, str, float]:
+        counters = self._rejected.setdefault(api_path, {"rate": 0, "concurrency": 0})
+        counters[kind] += 1
+        return False, message, retry_after
+
+    def reset(self, api_path: str) -> None:
+        """限流配置变更后清空该API的令牌桶，进行中的请求的并发计数保留"""
+        with self._lock:
+            for key in [key for key in self._buckets if key[0] == api_path]:
+                del self._buckets[key]
+
+    def get_stats(self, api_path: Optional[str] = None) -> Dict[str, Any]:
+        """获取拒绝次数和当前并发，指定 api_path 时只返回该API"""
+        with self._lock:
+            if api_path is not None:
+                rejected = self._rejected.get(api_path, {"rate": 0, "concurrency": 0})
+                return {
+                    "rate_rejected": rejected["rate"],
+                    "concurrency_rejected": rejected["concurrency"],
+                    "active": self._path_active.get(api_path, 0),
+                }
+            return {
+                "tracked_callers": len(self._buckets),
+                "max_callers": self.max_callers,
+                "evictions": self.evictions,
+                "rate_rejected": sum(counters["rate"] for counters in self._rejected.values()),
+                "concurrency_rejected": sum(counters["concurrency"] for counters in self._rejected.values()),
+                "rejected_by_api": {path: dict(counters) for path, counters in self._rejected.items()},
+            }
+
+
+request_limiter = RequestLimiter()
@@ -1,38 +1,137 @@
-import os, importlib, re,time
+import os, importlib, math, re,time
 from pathlib import Path
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, APIRouter, Request
-from fastapi.responses import FileResponse, PlainTextResponse, JSONResponse
+from fastapi.responses import FileResponse, PlainTextResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
-from starlette.middleware.base import BaseHTTPMiddleware
-from methods.globalvar import GlobalVars
+from starlette.types import ASGIApp, Receive, Scope, Send
+from methods.globalvar import GlobalVars, AsyncGlobalVars
+from methods.cache_manner import LRUCache
 from typing import Dict, Set, List, Tuple, Pattern, Optional, Any
-from methods.token_manner import verify_api_token, token_manager
+from methods.token_manner import verify_api_token, extract_token_from_request, token_manager
+from methods.limit_manner import request_limiter
+from methods.stats_manner import api_stats_manager
 from loguru import logger as log
-from config import project_root,favicon_path,log_level
+from config import project_root,favicon_path,log_level,route_static_cache_entries,route_static_cache_bytes,route_static_hit_ttl,route_static_miss_ttl
 
 route_protection_middleware_instance = None
 
-class RouteProtectionMiddleware(BaseHTTPMiddleware):
-    """只允许访问已注册的路由，拒绝访问未注册的路径"""
-    def __init__(self, app: FastAPI = None):
-        super().__init__(app)
+_PARAM_SEGMENT = re.compile(r"^\{(\w+)(?::(\w+))?\}$")
+
+
+class _RouteNode:
+    __slots__ = ("static", "param", "patterns", "catch_all", "route")
+
+    def __init__(self):
+        self.static: Dict[str, "_RouteNode"] = {}  # 固定段 -> 子节点
+        self.param: Optional["_RouteNode"] = None  # 整段为 {name} 的参数
+        self.patterns: List[Tuple[Pattern, "_RouteNode"]] = []  # 参数与固定文本混合的段，如 {name}.json
+        self.catch_all: Optional[str] = None  # {name:path}，匹配剩余的所有段
+        self.route: Optional[str] = None  # 在此结束的参数化路由
+
+
+class RouteTrie:
+    """按路径段组织的参数化路由前缀树
+
+    匹配耗时与路径深度有关，与注册的路由数量无关。每一段依次尝试固定段、整段参数、
+    混合参数段，失败时回溯；{name:path} 匹配剩余的全部路径，剩余路径为空时不匹配。
+    """
+
+    def __init__(self):
+        self._root = _RouteNode()
+        self.size = 0
+
+    def add(self, route_path: str) -> None:
+        node = self._root
+        segments = route_path[1:].split("/") if route_path.startswith("/") else route_path.split("/")
+        for index, segment in enumerate(segments):
+            param = _PARAM_SEGMENT.match(segment)
+            if param and param.group(2) == "path" and index == len(segments) - 1:
+                if node.catch_all is None:
+                    node.catch_all = route_path
+                    self.size += 1
+                return
+            if param:
+                if node.param is None:
+                    node.param = _RouteNode()
+                node = node.param
+            elif "{" in segment:
+                pattern = re.escape(segment)
+                pattern = re.sub(r'\\\{[^}]*\\\}', r'[^/]+', pattern)
+                for compiled, child in node.patterns:
+                    if compiled.pattern == f"^{pattern}$":
+                        node = child
+                        break
+                else:
+                    child = _RouteNode()
+                    node.patterns.append((re.compile(f"^{pattern}$"), child))
+                    node = child
+            else:
+                node = node.static.setdefault(segment, _RouteNode())
+        if node.route is None:
+            node.route = route_path
+            self.size += 1
+
+    def match(self, path: str) -> Optional[str]:
+        """返回匹配的路由路径（注册时的原始写法），没有匹配时返回None"""
+        segments = path[1:].split("/") if path.startswith("/") else path.split("/")
+        return self._match(self._root, segments, 0)
+
+    def _match(self, node: _RouteNode, segments: List[str], index: int) -> Optional[str]:
+        if index == len(segments):
+            return node.route
+        segment = segments[index]
+        child = node.static.get(segment)
+        if child is not None:
+            found = self._match(child, segments, index + 1)
+            if found:
+                return found
+        if segment:
+            if node.param is not None:
+                found = self._match(node.param, segments, index + 1)
+                if found:
+                    return found
+            for compiled, child in node.patterns:
+                if compiled.match(segment):
+                    found = self._match(child, segments, index + 1)
+                    if found:
+                        return found
+        # 与旧的正则匹配一致，路径参数至少要有一个非空的段
+        return node.catch_all if any(segments[index:]) else None
+
+
+def _static_file_exists(directory: str, relative_path: str) -> bool:
+    """relative_path 是否为 directory 中的文件，解析符号链接和 .. 后不能位于目录之外"""
+    if not relative_path:
+        return False
+    full_path = os.path.realpath(os.path.join(directory, relative_path))
+    if os.path.commonpath([full_path, directory]) != directory:
+        return False
+    return os.path.isfile(full_path)
+
+
+class RouteProtectionMiddleware:
+    """只允许访问已注册的路由，拒绝访问未注册的路径
+
+    纯ASGI中间件，只根据路径和请求头做判断，不包装 receive/send，
+    响应体直接透传给服务器，流式响应和大体积响应没有额外的任务和内存流开销。
+    """
+    def __init__(self, app: ASGIApp = None):
+        self.app = app
         self.allowed_paths: Set[str] = set()
         self.disabled_routes: Set[str] = set(GlobalVars.get("disabled_routes", []))
-        self.pattern_paths: List[Tuple[Pattern, str]] = []
+        self.route_trie = RouteTrie()
+        self.static_mounts: List[Tuple[str, str]] = []  # (挂载路径, 本地目录的真实路径)
+        self.static_cache = LRUCache(route_static_cache_entries, route_static_cache_bytes)
         self.default_paths: List[str] = ["/favicon.ico"]
         
-        # 初始化时检查api_stats表是否存在
-        self._api_stats_table_checked = GlobalVars.table_exists("api_stats")
-        if not self._api_stats_table_checked:
-            log.info("创建API统计表")
-            GlobalVars.create_table("api_stats")
-            self._api_stats_table_checked = True
+        # API访问统计在内存中累加，由后台线程定期写回api_stats表
+        api_stats_manager.start()
             
         log.info(f"路由保护中间件已创建，默认允许 {len(self.default_paths)} 个系统路径")
 
     def _save_disabled_routes(self):
-        GlobalVars.set("disabled_routes", list(self.disabled_routes))
+        AsyncGlobalVars.submit(GlobalVars.set, "disabled_routes", list(self.disabled_routes))
 
     def disable_route(self, path: str):
         self.disabled_routes.add(path)
@@ -49,94 +148,146 @@ class RouteProtectionMiddleware(BaseHTTPMiddleware):
         return path in self.disabled_routes
 
     def update_allowed_paths(self, app: FastAPI):
-        """更新允许访问的路径列表，只保留实际存在的静态资源文件路径"""
+        """更新允许访问的路径列表，静态资源目录只记录挂载路径，文件在访问时检查"""
         self.allowed_paths = set()
-        self.pattern_paths = []
+        route_trie = RouteTrie()
+        static_mounts = []
         self.default_paths = ["/favicon.ico"]
         self.allowed_paths.update(self.default_paths)
-        
-        static_dirs = {}
-        base_static_paths = set()
 
         for route in app.routes:
             if getattr(route, "app", None).__class__.__name__ == "StaticFiles":
-                path = route.path
                 directory = getattr(route.app, "directory", None)
-                if directory:
-                    static_dirs[path] = directory
-                    base_static_paths.add(path)
-                self.allowed_paths.add(path)
-                
+                if directory and os.path.isdir(directory):
+                    static_mounts.append((route.path.rstrip("/"), os.path.realpath(directory)))
+                    log.debug(f"已添加静态目录 {directory} 到允许列表，挂载路径: {route.path}")
+                continue
+
             if hasattr(route, "path"):
                 if "{" in route.path:
-                    pattern = re.escape(route.path)
-                    pattern = re.sub(r'\\\{[^}]*\\\}', r'([^/]+)', pattern)
-                    self.pattern_paths.append((re.compile(f"^{pattern}$"), route.path))
-                elif not getattr(route, "app", None).__class__.__name__ == "StaticFiles":
+                    route_trie.add(route.path)
+                else:
                     self.allowed_paths.add(route.path)
-        
-        for web_path, directory in static_dirs.items():
-            if os.path.exists(directory):
-                base_path = Path(directory)
-                for root, dirs, files in os.walk(base_path):
-                    rel_path = os.path.relpath(root, base_path)
-                    for file in files:
-                        if rel_path == ".":
-                            file_web_path = f"{web_path}/{file}"
-                        else:
-                            file_web_path = f"{web_path}/{rel_path.replace(os.sep, '/')}/{file}"
-                        
-                        file_web_path = file_web_path.replace("//", "/")
-                        self.allowed_paths.add(file_web_path)
-                
-                log.debug(f"已添加静态目录 {directory} 下的所有文件路径到允许列表")
-        
-        for path in base_static_paths:
-            if path in self.allowed_paths:
-                self.allowed_paths.remove(path)
-                log.debug(f"从允许列表移除静态资源基础路径: {path}")
-        
-        log.info(f"路由保护已更新: 允许访问 {len(self.allowed_paths)} 个固定路径和 {len(self.pattern_paths)} 个参数路径")
+
+        # 整棵树构建完成后再替换，处理中的请求不会看到构建到一半的树
+        self.route_trie = route_trie
+        self.static_mounts = static_mounts
+        self.static_cache.clear()
+        log.info(f"路由保护已更新: 允许访问 {len(self.allowed_paths)} 个固定路径、{route_trie.size} 个参数路径"
+                 f"和 {len(static_mounts)} 个静态目录")
         log.debug(f"允许访问的路径: {self.allowed_paths}")
-        log.debug(f"参数化路径: {self.pattern_paths}")
 
-    async def dispatch(self, request: Request, call_next):
-        """处理请求，验证路径是否允许访问，并记录API访问次数"""
+    def is_static_file_allowed(self, path: str) -> bool:
+        """路径是否指向某个静态目录中实际存在的文件，检查结果按路径缓存"""
+        mounts = [(prefix, directory) for prefix, directory in self.static_mounts
+                  if path.startswith(prefix + "/")]
+        if not mounts:
+            return False
+        cached = self.static_cache.get(path)
+        if cached is not None:
+            return cached
+
+        generation = self.static_cache.generation
+        exists = any(_static_file_exists(directory, path[len(prefix) + 1:]) for prefix, directory in mounts)
+        # 不存在的结果只短暂缓存，运行期间下载的新文件很快就能访问
+        ttl = route_static_hit_ttl if exists else route_static_miss_ttl
+        self.static_cache.put(path, exists, time.time() + ttl, len(path), generation)
+        return exists
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        response, original_path = self.check_request(scope)
+        if response is not None:
+            await response(scope, receive, send)
+            return
+
+        limit = token_manager.get_api_limit(original_path)
+        if limit:
+            caller = self.get_limit_caller(scope, original_path)
+            allowed, message, retry_after = request_limiter.acquire(original_path, caller, limit)
+            if not allowed:
+                log.debug(f"请求被限流: {path} - {message}")
+                response = JSONResponse(
+                    status_code=429,
+                    content={
+                        "returnCode": 429,
+                        "msg": f"请求被限流: {message}",
+                        "data": {"api_path": original_path, "retry_after": round(retry_after, 3)}
+                    },
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+                )
+                await response(scope, receive, send)
+                return
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                request_limiter.release(original_path, caller, limit)
+        else:
+            # 处理请求
+            await self.app(scope, receive, send)
+        if (not path.startswith("/admin") and 
+            not path.startswith("/static") and 
+            not path.endswith((".css", ".js", ".ico", ".png", ".jpg", ".jpeg", ".gif"))):
+
+            api_stats_manager.record(original_path)
+            log.debug(f"API访问计数: {path}")
+
+    @staticmethod
+    def get_limit_caller(scope: Scope, api_path: str) -> str:
+        """限流使用的调用方标识，在 check_request 通过后调用
+
+        只有API启用了token验证时请求中的token才经过校验，此时按 token + 客户端地址区分调用方；
+        未启用验证时token可以随意填写，不能用来区分调用方，只按客户端地址区分。
+        """
+        client = scope.get("client")
+        address = client[0] if client else ""
+        if token_manager.is_token_enabled(api_path):
+            token, _, _ = extract_token_from_request(Request(scope))
+            if token:
+                return f"token:{token}|ip:{address}"
+        return f"ip:{address}"
+
+    def check_request(self, scope: Scope) -> Tuple[Optional[Response], str]:
+        """验证路径是否允许访问以及API token，返回 (拒绝时的响应, 统计和验证使用的路由路径)"""
         if not self.allowed_paths:
-            self.update_allowed_paths(request.app)
-        path = request.url.path
+            self.update_allowed_paths(scope["app"])
+        path = scope["path"]
+        method = scope["method"]
         
         if self.is_route_disabled(path):
             log.warning(f"访问被禁用的路由: {path}")
-            return PlainTextResponse("该API已被禁用，请使用其他API", status_code=403)
+            return PlainTextResponse("该API已被禁用，请使用其他API", status_code=403), path
         
         path_allowed = False
         original_path = path
 
-        if path in self.allowed_paths:
+        if path in self.allowed_paths or self.is_static_file_allowed(path):
             path_allowed = True
         else:
             # 检查参数化路径
-            for pattern, pattern_original_path in self.pattern_paths:
-                if pattern.match(path):
-                    path_allowed = True
-                    original_path = pattern_original_path
-                    break
+            pattern_original_path = self.route_trie.match(path)
+            if pattern_original_path:
+                path_allowed = True
+                original_path = pattern_original_path
         if not path_allowed:
-            log.warning(f"拒绝访问未注册路径: {path} (方法: {request.method})")
-            return PlainTextResponse("你瞅啥，不要乱访问好不好？", status_code=403)
+            log.warning(f"拒绝访问未注册路径: {path} (方法: {method})")
+            return PlainTextResponse("你瞅啥，不要乱访问好不好？", status_code=403), original_path
 
         should_verify_token = (
             not path.startswith("/admin") and 
             not path.startswith("/static") and 
             not path.endswith((".css", ".js", ".ico", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".woff", ".woff2", ".ttf")) and
             path != "/favicon.ico" and
-            request.method in ["GET", "POST", "PUT", "DELETE", "PATCH"]
+            method in ["GET", "POST", "PUT", "DELETE", "PATCH"]
         )
 
         if should_verify_token:
-            # 进行token验证
-            is_valid, message, debug_info = verify_api_token(original_path, request, use_signature=False)
+            # 进行token验证，只读取请求头和查询参数，不读取请求体
+            is_valid, message, debug_info = verify_api_token(original_path, Request(scope), use_signature=False)
             
             if not is_valid:
                 log.warning(f"Token验证失败: {path} - {message}")
@@ -153,44 +304,12 @@ class RouteProtectionMiddleware(BaseHTTPMiddleware):
                         "msg": f"Token验证失败: {message}",
                         "data": datas
                     }
-                )
+                ), original_path
             else:
                 # Token验证成功，记录日志
                 if debug_info.get("token_enabled"):
                     log.info(f"Token验证成功: {path}")
-        
-        # 处理请求
-        response = await call_next(request)
-        if (not path.startswith("/admin") and 
-            not path.startswith("/static") and 
-            not path.endswith((".css", ".js", ".ico", ".png", ".jpg", ".jpeg", ".gif"))):
-
-            today_str = time.strftime("%Y-%m-%d")
-            
-            api_count_key = f"api_count:{original_path}"
-            current_count = GlobalVars.get_from_table("api_stats", api_count_key, 0)
-            GlobalVars.set_to_table("api_stats", api_count_key, current_count + 1)
-            
-            api_daily_key = f"api_daily_stats:{original_path}"
-            daily_stats = GlobalVars.get_from_table("api_stats", api_daily_key, {})
-            if today_str in daily_stats:
-                daily_stats[today_str] += 1
-            else:
-                daily_stats[today_str] = 1
-            GlobalVars.set_to_table("api_stats", api_daily_key, daily_stats)
-            
-            total_daily_key = "api_total_daily_stats"
-            total_daily_stats = GlobalVars.get_from_table("api_stats", total_daily_key, {})
-            if today_str in total_daily_stats:
-                total_daily_stats[today_str] += 1
-            else:
-                total_daily_stats[today_str] = 1
-            GlobalVars.set_to_table("api_stats", total_daily_key, total_daily_stats)
-            
-            log.debug(f"API访问计数: {path} -> {current_count + 1}, 今日: {daily_stats.get(today_str, 0)}")
-        
-        return response
-
+        return None, original_path
 
 
 class RouteManager:
@@ -494,6 +613,7 @@ class RouteManager:
                 log.warning("应用启动时未找到路由保护中间件实例，保护配置可能不会生效")
             yield
             log.info("应用关闭时的路由保护清理...")
+            api_stats_manager.flush()
 
         original_lifespan = getattr(app.router, "lifespan_context", None)
         if original_lifespan:
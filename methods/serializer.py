@@ -0,0 +1,147 @@
+import json, zlib
+from typing import Any, Optional, Union
+from loguru import logger as log
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# 带标记的二进制值格式: MAGIC + 编码格式(1字节) + 压缩方式(1字节) + 数据
+# 未压缩的JSON仍以TEXT存储且不带标记，与旧数据及旧版本代码完全兼容
+MAGIC = b"\x00GV"
+HEADER_SIZE = len(MAGIC) + 2
+
+FORMAT_JSON = b"j"  # UTF-8 JSON，由 json 或 orjson 生成，两者可互相读取
+FORMAT_MSGPACK = b"m"
+COMPRESS_NONE = b"n"
+COMPRESS_ZLIB = b"z"
+COMPRESS_ZSTD = b"s"
+
+CODECS = ("json", "orjson", "msgpack")
+COMPRESSIONS = (None, "zlib", "zstd")
+
+
+class ValueCodec:
+    """GlobalVars 值的编解码器，支持 json / orjson / msgpack 编码及超过阈值时的 zlib / zstd 压缩
+
+    数值始终以JSON文本存储，保证 incr_in_table 可以在SQL中直接做加法。
+    读取时根据值的类型和标记自动识别格式，不同格式写入的行可以混合存在。
+    """
+
+    def __init__(self, codec: str = "json", compression: Optional[str] = None,
+                 compress_threshold: int = 4096, compress_level: Optional[int] = None):
+        if codec not in CODECS:
+            raise ValueError(f"不支持的编码格式: {codec}，可选: {', '.join(CODECS)}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"不支持的压缩方式: {compression}，可选: zlib, zstd")
+
+        if codec == "orjson" and orjson is None:
+            log.warning("未安装 orjson，值编码回退为 json")
+            codec = "json"
+        if codec == "msgpack" and msgpack is None:
+            log.warning("未安装 msgpack，值编码回退为 json")
+            codec = "json"
+        if compression == "zstd" and zstandard is None:
+            log.warning("未安装 zstandard，值压缩回退为 zlib")
+            compression = "zlib"
+
+        self.codec = codec
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+        self._zstd_compressor = None
+        if compression == "zstd":
+            self._zstd_compressor = zstandard.ZstdCompressor(level=compress_level or 3)
+
+    def encode(self, value: Any) -> Union[str, bytes]:
+        """编码值，返回TEXT（JSON）或带标记的BLOB"""
+        if self.codec == "msgpack" and not isinstance(value, (int, float)):
+            return self._pack(FORMAT_MSGPACK, msgpack.packb(value, use_bin_type=True))
+
+        data = self._dump_json(value)
+        if self.compression and len(data) >= self.compress_threshold and not isinstance(value, (int, float)):
+            packed = self._pack(FORMAT_JSON, data)
+            if packed[len(MAGIC) + 1:HEADER_SIZE] != COMPRESS_NONE:
+                return packed
+        return data.decode("utf-8")
+
+    def decode(self, stored: Union[str, bytes, None]) -> Any:
+        """解码从数据库读出的值，自动识别JSON文本和带标记的BLOB"""
+        if stored is None:
+            return None
+        if isinstance(stored, str):
+            try:
+                return self._load_json(stored)
+            except ValueError:
+                return stored
+        if not stored.startswith(MAGIC) or len(stored) < HEADER_SIZE:
+            return stored
+
+        fmt = stored[len(MAGIC):len(MAGIC) + 1]
+        compression = stored[len(MAGIC) + 1:HEADER_SIZE]
+        data = self._decompress(compression, stored[HEADER_SIZE:])
+        if fmt == FORMAT_JSON:
+            return self._load_json(data)
+        if fmt == FORMAT_MSGPACK:
+            if msgpack is None:
+                raise RuntimeError("读取 msgpack 格式的值需要安装 msgpack")
+            return msgpack.unpackb(data, raw=False, strict_map_key=False)
+        raise ValueError(f"未知的值编码格式标记: {fmt!r}")
+
+    def _dump_json(self, value: Any) -> bytes:
+        if self.codec == "orjson":
+            try:
+                return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                # orjson 不支持超过64位的整数等少数类型，交给标准库处理
+                # 注意 orjson 会把 NaN/Infinity 写成 null，需要保留这类浮点数时请使用 json 编码
+                pass
+        return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+    def _load_json(self, data: Union[str, bytes]) -> Any:
+        if self.codec == "orjson":
+            try:
+                return orjson.loads(data)
+            except orjson.JSONDecodeError:
+                # 标准库写入的 NaN/Infinity 等 orjson 不接受的内容交给标准库处理
+                pass
+        return json.loads(data)
+
+    def _pack(self, fmt: bytes, data: bytes) -> bytes:
+        compression = COMPRESS_NONE
+        if self.compression and len(data) >= self.compress_threshold:
+            compressed = self._compress(data)
+            # 压缩后没有变小则保留原始数据
+            if len(compressed) < len(data):
+                compression = COMPRESS_ZSTD if self.compression == "zstd" else COMPRESS_ZLIB
+                data = compressed
+        return MAGIC + fmt + compression + data
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.compression == "zstd":
+            return self._zstd_compressor.compress(data)
+        level = self.compress_level if self.compress_level is not None else 6
+        return zlib.compress(data, level)
+
+    def _decompress(self, compression: bytes, data: bytes) -> bytes:
+        if compression == COMPRESS_NONE:
+            return data
+        if compression == COMPRESS_ZLIB:
+            return zlib.decompress(data)
+        if compression == COMPRESS_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("读取 zstd 压缩的值需要安装 zstandard")
+            return zstandard.ZstdDecompressor().decompress(data)
+        raise ValueError(f"未知的值压缩方式标记: {compression!r}")
@@ -0,0 +1,159 @@
+import time, threading
+from typing import Dict, Optional, Tuple
+from loguru import logger as log
+from methods.globalvar import GlobalVars
+from methods.flush_manner import PeriodicFlusher
+from config import api_stats_flush_interval
+
+API_CALLS_TABLE = "api_call_stats"
+LEGACY_STATS_TABLE = "api_stats"
+LEGACY_COUNT_PREFIX = "api_count:"
+LEGACY_DAILY_PREFIX = "api_daily_stats:"
+LEGACY_TOTAL_DAILY_KEY = "api_total_daily_stats"
+# 旧数据中总次数多于每日明细之和的部分，归入该日期以保持总数准确
+LEGACY_UNDATED_DAY = "0000-00-00"
+
+
+class ApiStatsManager:
+    """API访问统计管理器，在内存中累加访问计数并定期在单个事务中写回数据库
+
+    统计数据按 (path, day, count) 存储在 api_call_stats 表中，
+    每次写回只对发生变化的行执行 UPSERT，排行和趋势均由索引上的 GROUP BY 查询得到。
+    """
+
+    def __init__(self, table_name: str = API_CALLS_TABLE, flush_interval: float = api_stats_flush_interval):
+        self.table_name = table_name
+        self._lock = threading.Lock()  # 保护内存中的待写回计数
+        self._flush_lock = threading.Lock()  # 保证写回与合并读取互斥，读取结果精确
+        self._pending: Dict[Tuple[str, str], int] = {}
+        self.flusher = PeriodicFlusher("API统计", self.flush, flush_interval)
+
+        self._ensure_schema()
+        self._migrate_legacy_stats()
+
+    def _ensure_schema(self) -> None:
+        """创建统计表及按日期查询的索引"""
+        GlobalVars.ensure_schema([
+            f'''
+            CREATE TABLE IF NOT EXISTS {self.table_name} (
+                path TEXT NOT NULL,
+                day TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (path, day)
+            )
+            ''',
+            f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_day ON {self.table_name} (day, count)",
+        ])
+
+    def _migrate_legacy_stats(self) -> None:
+        """将 api_stats 表中旧的JSON统计数据导入统计表，导入后删除旧键"""
+        if not GlobalVars.table_exists(LEGACY_STATS_TABLE):
+            return
+
+        legacy = GlobalVars.get_all_from_table(LEGACY_STATS_TABLE)
+        legacy_keys = [
+            key for key in legacy
+            if key.startswith((LEGACY_COUNT_PREFIX, LEGACY_DAILY_PREFIX)) or key == LEGACY_TOTAL_DAILY_KEY
+        ]
+        if not legacy_keys:
+            return
+
+        rows: Dict[Tuple[str, str], int] = {}
+        daily_totals: Dict[str, int] = {}
+        for key, value in legacy.items():
+            if key.startswith(LEGACY_DAILY_PREFIX) and isinstance(value, dict):
+                path = key[len(LEGACY_DAILY_PREFIX):]
+                for day, count in value.items():
+                    rows[(path, day)] = rows.get((path, day), 0) + int(count)
+                    daily_totals[path] = daily_totals.get(path, 0) + int(count)
+
+        for key, value in legacy.items():
+            if key.startswith(LEGACY_COUNT_PREFIX):
+                path = key[len(LEGACY_COUNT_PREFIX):]
+                undated = int(value) - daily_totals.get(path, 0)
+                if undated > 0:
+                    rows[(path, LEGACY_UNDATED_DAY)] = undated
+
+        with GlobalVars.transaction() as cursor:
+            self._upsert_rows(cursor, rows)
+            cursor.executemany(
+                f"DELETE FROM {LEGACY_STATS_TABLE} WHERE key = ?",
+                [(key,) for key in legacy_keys]
+            )
+        GlobalVars.invalidate_cache(LEGACY_STATS_TABLE, legacy_keys)
+
+        log.info(f"已迁移旧的API统计数据: {len(legacy_keys)} 个键 -> {len(rows)} 行")
+
+    def _upsert_rows(self, cursor, rows: Dict[Tuple[str, str], int]) -> None:
+        cursor.executemany(
+            f'''
+            INSERT INTO {self.table_name} (path, day, count) VALUES (?, ?, ?)
+            ON CONFLICT (path, day) DO UPDATE SET count = count + excluded.count
+            ''',
+            [(path, day, count) for (path, day), count in rows.items()]
+        )
+
+    def start(self) -> None:
+        """启动定期写回"""
+        self.flusher.start()
+
+    def stop(self) -> None:
+        """停止定期写回并写回剩余计数"""
+        self.flusher.stop(flush=True)
+
+    def record(self, api_path: str) -> None:
+        """记录一次API访问，只修改内存计数"""
+        row_key = (api_path, time.strftime("%Y-%m-%d"))
+        with self._lock:
+            self._pending[row_key] = self._pending.get(row_key, 0) + 1
+
+    def flush(self) -> int:
+        """将内存中的计数在一个事务内写入数据库，返回写入的行数"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            try:
+                with GlobalVars.transaction() as cursor:
+                    self._upsert_rows(cursor, pending)
+            except Exception:
+                with self._lock:
+                    for row_key, count in pending.items():
+                        self._pending[row_key] = self._pending.get(row_key, 0) + count
+                raise
+
+            log.debug(f"API统计写回完成: {len(pending)} 行，共 {sum(pending.values())} 次访问")
+            return len(pending)
+
+    def get_api_counts(self) -> Dict[str, int]:
+        """获取每个API的累计访问次数（已持久化 + 未写回），按次数降序排列"""
+        with self._flush_lock:
+            rows = GlobalVars.query(
+                f"SELECT path, SUM(count) AS total FROM {self.table_name} GROUP BY path"
+            )
+            counts = {row["path"]: row["total"] for row in rows}
+            with self._lock:
+                for (path, _), count in self._pending.items():
+                    counts[path] = counts.get(path, 0) + count
+        return dict(sorted(counts.items(), key=lambda x: x[1], reverse=True))
+
+    def get_daily_totals(self, start_day: str, end_day: Optional[str] = None) -> Dict[str, int]:
+        """获取日期范围内（含两端）所有API按日汇总的访问次数（已持久化 + 未写回）"""
+        end_day = end_day or time.strftime("%Y-%m-%d")
+        with self._flush_lock:
+            rows = GlobalVars.query(
+                f"SELECT day, SUM(count) AS total FROM {self.table_name} "
+                f"WHERE day BETWEEN ? AND ? GROUP BY day",
+                (start_day, end_day)
+            )
+            totals = {row["day"]: row["total"] for row in rows}
+            with self._lock:
+                for (_, day), count in self._pending.items():
+                    if start_day <= day <= end_day:
+                        totals[day] = totals.get(day, 0) + count
+        return totals
+
+
+api_stats_manager = ApiStatsManager()
@@ -1,10 +1,34 @@
 import time
 import hashlib
 import secrets
+import threading
 from typing import Dict, Optional, Set, Tuple, Any
 from loguru import logger as log
-from methods.globalvar import GlobalVars
-from config import api_default_token, api_default_token_expire,log_level
+from methods.globalvar import GlobalVars, AsyncGlobalVars
+from methods.flush_manner import PeriodicFlusher
+from methods.limit_manner import normalize_limit, request_limiter
+from config import api_default_token, api_default_token_expire,log_level,token_usage_flush_interval
+
+
+def _new_usage() -> Dict[str, Any]:
+    return {
+        "success_count": 0,
+        "failure_count": 0,
+        "last_success": None,
+        "last_failure": None
+    }
+
+
+def _merge_usage(base: Optional[Dict[str, Any]], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """将一段时间内的使用计数合并到已有记录，最后使用时间取较晚的一个"""
+    merged = {**_new_usage(), **base} if base else _new_usage()
+    merged["success_count"] += delta["success_count"]
+    merged["failure_count"] += delta["failure_count"]
+    for field in ("last_success", "last_failure"):
+        if delta[field] is not None and (merged[field] is None or delta[field] > merged[field]):
+            merged[field] = delta[field]
+    return merged
+
 
 class TokenManager:
     """API Token 管理器"""
@@ -13,14 +37,22 @@ class TokenManager:
         self.enabled_apis: Set[str] = set()
         self.api_tokens: Dict[str, str] = {}
         self.api_token_expires: Dict[str, int] = {}
+        self.api_limits: Dict[str, Dict[str, Any]] = {}
         self.default_token = api_default_token
         self.default_expire = api_default_token_expire
         
+        # token使用计数在内存中累加，由后台线程定期在一个事务中写回token_usage表
+        self._usage_lock = threading.Lock()  # 保护内存中的待写回计数
+        self._usage_flush_lock = threading.Lock()  # 保证写回与合并读取互斥，读取结果精确
+        self._pending_usage: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.usage_flusher = PeriodicFlusher("Token使用统计", self.flush_usage, token_usage_flush_interval)
+        
         # 初始化数据表
         self._init_token_tables()
         
         # 加载已保存的配置
         self._load_token_config()
+        self.usage_flusher.start()
         
         log.info(f"Token管理器初始化完成，默认过期时间: {self.default_expire}毫秒")
     
@@ -49,22 +81,38 @@ class TokenManager:
             api_expires = GlobalVars.get_from_table("api_tokens", "api_token_expires", {})
             self.api_token_expires = api_expires
             
+            # 加载API限流配置
+            api_limits = GlobalVars.get_from_table("api_tokens", "api_limits", {})
+            self.api_limits = api_limits
+            
             log.info(f"加载token配置: 启用验证的API {len(self.enabled_apis)} 个，"
-                    f"自定义token {len(self.api_tokens)} 个")
+                    f"自定义token {len(self.api_tokens)} 个，限流API {len(self.api_limits)} 个")
             
         except Exception as e:
             log.error(f"加载token配置失败: {e}")
     
     def _save_token_config(self) -> None:
-        """保存token配置到数据库"""
+        """保存token配置到数据库，写操作交给写线程执行，不阻塞事件循环"""
         try:
-            GlobalVars.set_to_table("api_tokens", "enabled_apis", list(self.enabled_apis))
-            GlobalVars.set_to_table("api_tokens", "api_tokens", self.api_tokens)
-            GlobalVars.set_to_table("api_tokens", "api_token_expires", self.api_token_expires)
-            log.debug("token配置已保存")
+            AsyncGlobalVars.submit(
+                self._write_token_config,
+                list(self.enabled_apis), dict(self.api_tokens), dict(self.api_token_expires),
+                dict(self.api_limits)
+            )
+            log.debug("token配置已提交保存")
         except Exception as e:
             log.error(f"保存token配置失败: {e}")
     
+    def _write_token_config(self, enabled_apis: list, api_tokens: Dict[str, str], api_token_expires: Dict[str, int],
+                            api_limits: Dict[str, Dict[str, Any]]) -> None:
+        """将token配置快照写入数据库（在写线程中执行）"""
+        GlobalVars.set_many_to_table("api_tokens", {
+            "enabled_apis": enabled_apis,
+            "api_tokens": api_tokens,
+            "api_token_expires": api_token_expires,
+            "api_limits": api_limits,
+        })
+    
     def enable_token_for_api(self, api_path: str) -> None:
         """为指定API启用token验证"""
         self.enabled_apis.add(api_path)
@@ -113,6 +161,30 @@ class TokenManager:
         """获取指定API的token过期时间（毫秒）"""
         return self.api_token_expires.get(api_path, self.default_expire)
     
+    def set_api_limit(self, api_path: str, rate: float = 0, burst: int = 0,
+                      max_concurrent: int = 0, path_max_concurrent: int = 0) -> None:
+        """为指定API设置限流配置，全部为0时移除限流"""
+        limit = normalize_limit(rate, burst, max_concurrent, path_max_concurrent)
+        if limit is None:
+            self.remove_api_limit(api_path)
+            return
+        self.api_limits[api_path] = limit
+        request_limiter.reset(api_path)
+        self._save_token_config()
+        log.info(f"已为API设置限流: {api_path} {limit}")
+    
+    def remove_api_limit(self, api_path: str) -> None:
+        """移除指定API的限流配置"""
+        if api_path in self.api_limits:
+            del self.api_limits[api_path]
+            request_limiter.reset(api_path)
+            self._save_token_config()
+            log.info(f"已移除API的限流: {api_path}")
+    
+    def get_api_limit(self, api_path: str) -> Optional[Dict[str, Any]]:
+        """获取指定API的限流配置，未设置时返回None"""
+        return self.api_limits.get(api_path)
+    
     def verify_token(self, api_path: str, provided_token: str, timestamp_ms: Optional[int] = None) -> Tuple[bool, str]:
         """
         验证API token
@@ -195,34 +267,62 @@ class TokenManager:
         return hashlib.md5(combined_string.encode()).hexdigest()
     
     def _record_token_usage(self, api_path: str, token: str, success: bool, message: str) -> None:
-        """记录token使用情况"""
-        try:
-            current_time = time.time()
-            today_str = time.strftime("%Y-%m-%d")
-            
-            usage_key = f"token_usage:{api_path}:{today_str}"
-            usage_data = GlobalVars.get_from_table("token_usage", usage_key, {
-                "success_count": 0,
-                "failure_count": 0,
-                "last_success": None,
-                "last_failure": None
-            })
-            
+        """记录token使用情况，只修改内存计数，由后台线程定期写回"""
+        current_time = time.time()
+        row_key = (api_path, time.strftime("%Y-%m-%d", time.localtime(current_time)))
+        with self._usage_lock:
+            usage = self._pending_usage.get(row_key)
+            if usage is None:
+                usage = self._pending_usage[row_key] = _new_usage()
             if success:
-                usage_data["success_count"] += 1
-                usage_data["last_success"] = current_time
+                usage["success_count"] += 1
+                usage["last_success"] = current_time
             else:
-                usage_data["failure_count"] += 1
-                usage_data["last_failure"] = current_time
+                usage["failure_count"] += 1
+                usage["last_failure"] = current_time
+        
+        if not success or log_level == "debug":
+            log.debug(f"Token使用记录: API={api_path}, 成功={success}, 消息={message}, "
+                     f"Token前缀={token[:8] if token else 'None'}...")
+    
+    def flush_usage(self) -> int:
+        """将内存中的使用计数与已有记录合并，在一个事务内写入数据库，返回写入的行数"""
+        with self._usage_flush_lock:
+            with self._usage_lock:
+                pending, self._pending_usage = self._pending_usage, {}
+            if not pending:
+                return 0
             
-            GlobalVars.set_to_table("token_usage", usage_key, usage_data)
+            deltas = {
+                f"token_usage:{api_path}:{date_str}": usage
+                for (api_path, date_str), usage in pending.items()
+            }
+            try:
+                with GlobalVars.transaction() as cursor:
+                    cursor.execute(
+                        f"SELECT key, value FROM token_usage WHERE key IN ({','.join('?' * len(deltas))})",
+                        list(deltas)
+                    )
+                    stored = {key: GlobalVars.decode_value(value) for key, value in cursor.fetchall()}
+                    current_time = time.time()
+                    cursor.executemany(
+                        "REPLACE INTO token_usage (key, value, expire_time, last_update) VALUES (?, ?, NULL, ?)",
+                        [
+                            (key, GlobalVars.encode_value(_merge_usage(stored.get(key), delta)), current_time)
+                            for key, delta in deltas.items()
+                        ]
+                    )
+            except Exception:
+                with self._usage_lock:
+                    for row_key, usage in pending.items():
+                        self._pending_usage[row_key] = _merge_usage(self._pending_usage.get(row_key), usage)
+                raise
+            GlobalVars.invalidate_cache("token_usage", list(deltas))
             
-            if not success or log_level == "debug":
-                log.debug(f"Token使用记录: API={api_path}, 成功={success}, 消息={message}, "
-                         f"Token前缀={token[:8] if token else 'None'}...")
-                
-        except Exception as e:
-            log.error(f"记录token使用情况失败: {e}")
+            log.debug(f"Token使用统计写回完成: {len(deltas)} 行，"
+                      f"成功 {sum(usage['success_count'] for usage in pending.values())} 次，"
+                      f"失败 {sum(usage['failure_count'] for usage in pending.values())} 次")
+            return len(deltas)
     
     def get_token_usage_stats(self, api_path: Optional[str] = None, days: int = 7) -> Dict[str, Any]:
         """获取token使用统计"""
@@ -234,12 +334,24 @@ class TokenManager:
                 date_str = time.strftime("%Y-%m-%d", time.localtime(time.time() - i * 86400))
                 date_range.append(date_str)
             
-            if api_path:
+            api_paths = [api_path] if api_path else list(self.enabled_apis)
+            usage_keys = [
+                f"token_usage:{path}:{date_str}" for path in api_paths for date_str in date_range
+            ]
+            with self._usage_flush_lock:
+                usage_rows = GlobalVars.get_many_from_table("token_usage", usage_keys)
+                # 合并尚未写回的计数
+                with self._usage_lock:
+                    for (path, date_str), usage in self._pending_usage.items():
+                        usage_key = f"token_usage:{path}:{date_str}"
+                        if path in api_paths and date_str in date_range:
+                            usage_rows[usage_key] = _merge_usage(usage_rows.get(usage_key), usage)
+            
+            for path in api_paths:
                 api_stats = {"dates": {}, "total_success": 0, "total_failure": 0}
                 
                 for date_str in date_range:
-                    usage_key = f"token_usage:{api_path}:{date_str}"
-                    usage_data = GlobalVars.get_from_table("token_usage", usage_key, {})
+                    usage_data = usage_rows.get(f"token_usage:{path}:{date_str}", {})
                     
                     success_count = usage_data.get("success_count", 0)
                     failure_count = usage_data.get("failure_count", 0)
@@ -253,28 +365,7 @@ class TokenManager:
                     api_stats["total_success"] += success_count
                     api_stats["total_failure"] += failure_count
                 
-                stats[api_path] = api_stats
-            else:
-                for enabled_api in self.enabled_apis:
-                    api_stats = {"dates": {}, "total_success": 0, "total_failure": 0}
-                    
-                    for date_str in date_range:
-                        usage_key = f"token_usage:{enabled_api}:{date_str}"
-                        usage_data = GlobalVars.get_from_table("token_usage", usage_key, {})
-                        
-                        success_count = usage_data.get("success_count", 0)
-                        failure_count = usage_data.get("failure_count", 0)
-                        
-                        api_stats["dates"][date_str] = {
-                            "success": success_count,
-                            "failure": failure_count,
-                            "total": success_count + failure_count
-                        }
-                        
-                        api_stats["total_success"] += success_count
-                        api_stats["total_failure"] += failure_count
-                    
-                    stats[enabled_api] = api_stats
+                stats[path] = api_stats
             
             return {
                 "stats": stats,
@@ -298,7 +389,9 @@ class TokenManager:
             "has_custom_token": api_path in self.api_tokens,
             "custom_token": self.api_tokens.get(api_path, ""),
             "expire_time_ms": self.get_api_expire_time(api_path),
-            "is_using_default": api_path not in self.api_token_expires
+            "is_using_default": api_path not in self.api_token_expires,
+            "limit": self.get_api_limit(api_path),
+            "limit_stats": request_limiter.get_stats(api_path)
         }
     
     def get_all_configs(self) -> Dict[str, Any]:
@@ -312,7 +405,9 @@ class TokenManager:
                 for api_path in self.enabled_apis
             },
             "custom_tokens": dict(self.api_tokens),
-            "custom_expires": dict(self.api_token_expires)
+            "custom_expires": dict(self.api_token_expires),
+            "api_limits": dict(self.api_limits),
+            "limit_stats": request_limiter.get_stats()
         }
 
 token_manager = TokenManager()
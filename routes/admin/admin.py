@@ -4,6 +4,7 @@ from fastapi.templating import Jinja2Templates
 from methods.routes_manner import route_manager
 from methods.token_manner import token_manager
 from methods.globalvar import GlobalVars
+from methods.stats_manner import api_stats_manager
 from loguru import logger as log
 import time, datetime, platform, os, psutil
 import importlib.metadata
@@ -134,16 +135,7 @@ async def admin_manage(request: Request):
     disabled = mw.disabled_routes
     route_list = []
     
-    api_stats = {}
-    
-    if GlobalVars.table_exists("api_stats"):
-        all_vars = GlobalVars.get_all_from_table("api_stats")
-        for key, value in all_vars.items():
-            if key.startswith("api_count:"):
-                api_path = key.replace("api_count:", "")
-                api_stats[api_path] = value
-    else:
-        log.warning("api_stats表不存在，无法加载API统计数据")
+    api_stats = api_stats_manager.get_api_counts()
     
     # 获取token配置信息
     token_configs = token_manager.get_all_configs()
@@ -223,23 +215,20 @@ async def admin_stats(request: Request):
     api_stats = {}
     total_calls = 0
     
-    if GlobalVars.table_exists("api_stats"):
-        all_vars = GlobalVars.get_all_from_table("api_stats")
-        for key, value in all_vars.items():
-            if key.startswith("api_count:"):
-                api_path = key.replace("api_count:", "")
-                if not api_path.startswith("/admin") and not api_path.startswith("/static") and not api_path.startswith("/favicon.ico"):
-                    api_stats[api_path] = value
-                    total_calls += value
-    else:
-        log.warning("api_stats表不存在，无法加载API统计数据")
+    for api_path, value in api_stats_manager.get_api_counts().items():
+        if not api_path.startswith("/admin") and not api_path.startswith("/static") and not api_path.startswith("/favicon.ico"):
+            api_stats[api_path] = value
+            total_calls += value
+    
+    # 统计数据已按访问次数降序排列
+    raw_sorted = list(api_stats.items())
     
     # 为热门API排行准备数据
-    top_apis = sorted(api_stats.items(), key=lambda x: x[1], reverse=True)[:3]
+    top_apis = raw_sorted[:3]
     
     # 为完整API统计表格准备数据
     sorted_api_stats = []
-    for rank, (path, count) in enumerate(sorted(api_stats.items(), key=lambda x: x[1], reverse=True)):
+    for rank, (path, count) in enumerate(raw_sorted):
         sorted_api_stats.append({
             "rank": rank + 1,
             "path": path,
@@ -254,8 +243,6 @@ async def admin_stats(request: Request):
     pie_data = []
     other_count = 0
     
-    raw_sorted = sorted(api_stats.items(), key=lambda x: x[1], reverse=True)
-    
     for i, (path, count) in enumerate(raw_sorted):
         if i < 7:
             api_names.append(path)
@@ -272,9 +259,8 @@ async def admin_stats(request: Request):
     trend_data = []
     today = datetime.datetime.now()
     
-    total_daily_stats = {}
-    if GlobalVars.table_exists("api_stats"):
-        total_daily_stats = GlobalVars.get_from_table("api_stats", "api_total_daily_stats", {})
+    trend_start = (today - datetime.timedelta(days=6)).strftime("%Y-%m-%d")
+    total_daily_stats = api_stats_manager.get_daily_totals(trend_start, today.strftime("%Y-%m-%d"))
     
     for i in range(7, 0, -1):
         day = today - datetime.timedelta(days=i-1)
@@ -317,7 +303,11 @@ async def token_action(
     api_path: str = Form(...),
     token_action: str = Form(...),
     custom_token: str = Form(default=""),
-    expire_time: int = Form(default=3600000)
+    expire_time: int = Form(default=3600000),
+    rate_limit: float = Form(default=0),
+    burst: int = Form(default=0),
+    max_concurrent: int = Form(default=0),
+    path_max_concurrent: int = Form(default=0)
 ):
     """处理Token相关操作"""
     try:
@@ -358,6 +348,16 @@ async def token_action(
             # 保持token验证启用状态
             log.info(f"移除API自定义token: {api_path}")
         
+        elif token_action == "set_limit":
+            # 设置限流，全部为0时等同于移除
+            token_manager.set_api_limit(api_path, rate_limit, burst, max_concurrent, path_max_concurrent)
+            log.info(f"为API设置限流: {api_path}")
+        
+        elif token_action == "remove_limit":
+            # 移除限流
+            token_manager.remove_api_limit(api_path)
+            log.info(f"移除API限流: {api_path}")
+        
         return RedirectResponse(url="/admin/manage", status_code=303)
         
     except Exception as e:
@@ -393,7 +393,9 @@ async def token_query(
                 "custom_token": config['custom_token'] if config['has_custom_token'] else "",
                 "expire_time_ms": config['expire_time_ms'],
                 "default_token": all_configs['default_token'],
-                "default_expire_ms": all_configs['default_expire_ms']
+                "default_expire_ms": all_configs['default_expire_ms'],
+                "limit": config['limit'],
+                "limit_stats": config['limit_stats']
             })
             
         elif query_type == "usage":
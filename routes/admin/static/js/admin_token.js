@@ -171,6 +171,7 @@ function showLoadingInModal() {
     
     if (customTokenInput) customTokenInput.value = '';
     if (expireTimeInput) expireTimeInput.value = '3600000';
+    fillLimitInputs(null);
 }
 
 function showErrorInModal(errorMessage) {
@@ -206,6 +207,7 @@ function clearModalContent() {
     if (infoElement) infoElement.innerHTML = '';
     if (customTokenInput) customTokenInput.value = '';
     if (expireTimeInput) expireTimeInput.value = '3600000';
+    fillLimitInputs(null);
 }
 
 async function retryGetTokenInfo() {
@@ -257,6 +259,43 @@ function updateModalStatus(data) {
     if (expireTimeInput) {
         expireTimeInput.value = data.expire_time_ms || 3600000;
     }
+    
+    fillLimitInputs(data.limit);
+}
+
+/**
+ * 填充限流设置输入框
+ * @param {Object|null} limit - 限流配置，为空时全部置0
+ */
+function fillLimitInputs(limit) {
+    const fields = {
+        rateLimit: 'rate',
+        burstLimit: 'burst',
+        maxConcurrent: 'max_concurrent',
+        pathMaxConcurrent: 'path_max_concurrent'
+    };
+    for (const [id, key] of Object.entries(fields)) {
+        const input = document.getElementById(id);
+        if (input) {
+            input.value = limit ? (limit[key] || 0) : 0;
+        }
+    }
+}
+
+function buildLimitInfoHtml(data) {
+    const stats = data.limit_stats || {};
+    if (!data.limit) {
+        return `<p><strong>限流:</strong> <span style="color: #6c757d;"><i class="fas fa-infinity"></i> 未设置</span></p>`;
+    }
+    const limit = data.limit;
+    const parts = [];
+    if (limit.rate) parts.push(`每秒 ${limit.rate} 次 (突发 ${limit.burst})`);
+    if (limit.max_concurrent) parts.push(`单个调用方并发 ${limit.max_concurrent}`);
+    if (limit.path_max_concurrent) parts.push(`API总并发 ${limit.path_max_concurrent}`);
+    return `
+        <p><strong>限流:</strong> <span style="font-weight: 500;"><i class="fas fa-tachometer-alt"></i> ${parts.join('，')}</span></p>
+        <p><strong>已拒绝:</strong> 超出速率 ${stats.rate_rejected || 0} 次，超出并发 ${stats.concurrency_rejected || 0} 次</p>
+    `;
 }
 
 function updateCurrentTokenInfo(data) {
@@ -280,6 +319,7 @@ function updateCurrentTokenInfo(data) {
                 <i class="fas fa-${data.has_custom_token ? 'cog' : 'shield-alt'}"></i> ${data.has_custom_token ? '自定义' : '默认'}
             </span></p>
             <p><strong>过期时间:</strong> <span style="font-weight: 500;"><i class="fas fa-clock"></i> ${Math.round(data.expire_time_ms / 1000)} 秒</span></p>
+            ${buildLimitInfoHtml(data)}
         `;
         
         if (data.has_custom_token && currentToken) {
@@ -308,6 +348,7 @@ function updateCurrentTokenInfo(data) {
                     <strong>安全提醒：</strong>该API当前未启用Token验证，任何人都可以访问。建议启用Token验证以提高安全性。
                 </p>
             </div>
+            ${buildLimitInfoHtml(data)}
         `;
     }
     
@@ -512,6 +553,12 @@ function setTokenAction(action) {
         case 'remove_custom':
             confirmMessage = '🔄 确定要移除自定义Token并使用默认Token吗？\n\n将恢复使用系统默认Token配置。';
             break;
+        case 'set_limit':
+            confirmMessage = '🚦 确定要保存限流设置吗？\n\n全部为0时将移除限流，保存后该API的令牌桶会重新计算。';
+            break;
+        case 'remove_limit':
+            confirmMessage = '🚦 确定要移除该API的限流吗？';
+            break;
         default:
             confirmMessage = '确定要执行此操作吗？';
     }
@@ -1,3 +1,7 @@
 from api.looking.alivemag import init_alive_manager
+from api.looking.keep_alive import keep_alive_buffer
+from api.looking.retention import status_retention
 
+keep_alive_buffer.start()
+status_retention.start()
 init_alive_manager()
\ No newline at end of file
@@ -1,25 +1,35 @@
 from typing import Optional, Dict, Any
 from datetime import datetime
 from loguru import logger as log
-from fastapi import APIRouter, Request, Header, HTTPException
+from fastapi import APIRouter, Request, Header, HTTPException, Query
 try:
     from zoneinfo import ZoneInfo
     BEIJING_TZ = ZoneInfo("Asia/Shanghai")
 except ImportError:
     import pytz
     BEIJING_TZ = pytz.timezone("Asia/Shanghai")
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import time
+from config import looking_event_batch_max
 
-from methods.globalvar import GlobalVars
-from api.looking.alivemag import register_device_alive, get_alive_manager_status, force_check_device_alive, get_device_alive_info
+from methods.globalvar import AsyncGlobalVars
+from api.looking.alivemag import (
+    register_device_alive, watch_device_alive, get_alive_manager_status,
+    force_check_device_alive, get_device_alive_info
+)
 
-from api.looking.Bases import DeviceEventBase, KeepAliveData, ApiResponse
+from api.looking.keep_alive import keep_alive_buffer
+from api.looking.signature import SignatureWindowCache
+from api.looking.retention import status_retention
+from api.looking.telemetry import query_series
+from api.looking.stream import device_stream_hub, format_sse, StreamLimitError
+from api.looking.Bases import DeviceEventBase, DeviceEventBatch, KeepAliveData, ApiResponse
+from api.looking import utils as looking_utils
 from api.looking.utils import (
     get_beijing_now, verify_signature, init_device_table,
-    update_device_status_and_record, get_device_summary,
+    update_device_status_and_record, apply_device_events, get_device_summary, get_device_report,
     update_keep_alive_status, get_all_device_ids,
-    get_device_table_name, store_device_status,
+    device_exists, store_device_status, get_all_device_statuses,
     get_latest_device_status, validate_device_status_data,
     format_device_status_summary
 )
@@ -39,6 +49,11 @@ REQUIRED_STATUS_HEADERS = [
     "x-android-version", "x-sdk-int", "x-event-type"
 ]
 
+REQUIRED_BATCH_HEADERS = [
+    "x-device-id", "x-device-model", "x-device-brand", 
+    "x-android-version", "x-sdk-int", "x-app-version"
+]
+
 REQUIRED_KEEPALIVE_HEADERS = [
     "x-device-id", "x-device-model", "x-device-brand", 
     "x-android-version", "x-sdk-int", "x-event-type"
@@ -46,6 +61,7 @@ REQUIRED_KEEPALIVE_HEADERS = [
 
 # 保活签名验证的时间容差（秒）
 KEEP_ALIVE_TIME_TOLERANCE = 3
+keep_alive_signature_cache = SignatureWindowCache(KEEP_ALIVE_TIME_TOLERANCE)
 
 # 统一的header验证逻辑
 def _extract_headers(request: Request, required_headers: list) -> Dict[str, str]:
@@ -98,7 +114,10 @@ def _validate_signature(request: Request, headers: Dict[str, str], use_current_t
     return headers
 
 def _validate_keep_alive_signature(request: Request, headers: Dict[str, str]) -> Dict[str, str]:
-    """验证保活请求签名 - 支持3秒时间容差"""
+    """验证保活请求签名 - 支持3秒时间容差
+
+    请求带有 X-Timestamp 时直接按该时间戳验证，否则在缓存的整秒候选签名窗口中查找。
+    """
     signature = request.headers.get("x-signature")
     headers["x-signature"] = signature or ""
     
@@ -115,20 +134,17 @@ def _validate_keep_alive_signature(request: Request, headers: Dict[str, str]) ->
         headers["signature_verified"] = "false"
         return headers
     
-    # 获取当前时间戳（毫秒）
-    current_timestamp_ms = int(time.time() * 1000)
-    
-    # 尝试验证前后3秒范围内的时间戳
-    for time_offset in range(-KEEP_ALIVE_TIME_TOLERANCE, KEEP_ALIVE_TIME_TOLERANCE + 1):
-        test_timestamp = str(current_timestamp_ms + time_offset * 1000)
-        if verify_signature(device_id, event_type, test_timestamp, signature):
-            headers["signature_verified"] = "true"
-            headers["verified_timestamp"] = test_timestamp
-            headers["time_offset_seconds"] = str(time_offset)
-            log.debug(f"保活请求签名验证成功: {signature}, 时间偏移: {time_offset}秒")
-            return headers
+    verified, verified_timestamp, time_offset = keep_alive_signature_cache.verify(
+        device_id, event_type, signature, request.headers.get("x-timestamp")
+    )
+    if verified:
+        headers["signature_verified"] = "true"
+        headers["verified_timestamp"] = str(verified_timestamp)
+        headers["time_offset_seconds"] = str(time_offset)
+        log.debug(f"保活请求签名验证成功: {signature}, 时间偏移: {time_offset}秒")
+        return headers
     
-    # 如果所有时间戳都验证失败
+    # 时间窗口内的签名都不匹配
     headers["signature_verified"] = "false"
     #log.warning(f"保活请求签名验证失败: {signature}, 已尝试±{KEEP_ALIVE_TIME_TOLERANCE}秒范围")
     return headers
@@ -157,6 +173,24 @@ def log_device_info(headers: Dict[str, str]) -> None:
             f"Android版本: {headers.get('x-android-version', 'Unknown')}, "
             f"SDK版本: {headers.get('x-sdk-int', 'Unknown')}")
 
+# 数据库操作（在AsyncGlobalVars的写线程中执行，不阻塞事件循环）
+def _apply_device_event(device_id: str, action: str, timestamp: int) -> Dict[str, Any]:
+    """初始化设备表、更新设备状态并返回设备摘要"""
+    init_device_table(device_id)
+    update_device_status_and_record(device_id, action, timestamp)
+    return get_device_summary(device_id)
+
+def _apply_device_events(device_id: str, events: list) -> Dict[str, Any]:
+    """初始化设备表、在一个事务中应用一批事件并返回处理结果和设备摘要"""
+    init_device_table(device_id)
+    results = apply_device_events(device_id, events)
+    return {"results": results, "summary": get_device_summary(device_id)}
+
+def _apply_device_status(device_id: str, status_data: Dict[str, Any]) -> None:
+    """初始化设备表并存储设备状态"""
+    init_device_table(device_id)
+    store_device_status(device_id, status_data)
+
 # 业务处理函数
 async def process_device_event(event_data: DeviceEventBase, headers: Dict[str, str]) -> JSONResponse:
     """处理设备事件数据"""
@@ -173,10 +207,14 @@ async def process_device_event(event_data: DeviceEventBase, headers: Dict[str, s
         
         # 初始化设备表并更新状态
         if device_id != 'Unknown':
-            init_device_table(device_id)
-            update_device_status_and_record(device_id, event_data.action, event_data.timestamp)
-            summary = get_device_summary(device_id)
+            summary = await AsyncGlobalVars.arun(
+                _apply_device_event, device_id, event_data.action, event_data.timestamp
+            )
             log.info(f"设备摘要: {summary['today_summary']}")
+            # 解锁后重新跟踪保活截止时间，超时未保活时自动锁定
+            current_status = summary["current_status"]
+            if not current_status.get("is_locked", True):
+                watch_device_alive(device_id, current_status.get("last_keep_alive"))
         else:
             summary = None
         
@@ -198,6 +236,64 @@ async def process_device_event(event_data: DeviceEventBase, headers: Dict[str, s
         log.exception(f"处理设备事件失败: {e}")
         return _create_error_response(500, 101, f"处理设备事件失败: {str(e)}")
 
+async def process_device_events_batch(batch: DeviceEventBatch, headers: Dict[str, str]) -> JSONResponse:
+    """处理批量设备事件：先逐个验证签名和事件类型，再在写线程中按时间顺序一次性应用通过验证的事件"""
+    try:
+        device_id = headers.get('x-device-id')
+        beijing_now = get_beijing_now()
+        
+        log.info(f"收到批量设备事件: {len(batch.events)} 个, 设备ID: {device_id}, "
+                f"时间: {beijing_now.strftime('%Y-%m-%d %H:%M:%S')}")
+        
+        # 签名无效或事件类型未知的事件直接拒绝，不会被应用
+        rejected = {}
+        for index, event in enumerate(batch.events):
+            if event.event_type != "lock_event":
+                rejected[index] = f"未知事件类型: {event.event_type}"
+            elif not event.signature:
+                rejected[index] = "未提供签名"
+            elif not verify_signature(device_id, event.event_type, str(event.timestamp), event.signature):
+                rejected[index] = "签名验证失败"
+        valid_indexes = [index for index in range(len(batch.events)) if index not in rejected]
+        if rejected:
+            log.warning(f"批量设备事件中有 {len(rejected)} 个事件被拒绝, 设备ID: {device_id}")
+        
+        outcome = await AsyncGlobalVars.arun(
+            _apply_device_events, device_id,
+            [(batch.events[index].timestamp, batch.events[index].action) for index in valid_indexes]
+        )
+        
+        results = []
+        applied_results = iter(outcome["results"])
+        for index, event in enumerate(batch.events):
+            if index in rejected:
+                result = {"index": index, "timestamp": event.timestamp, "action": event.action,
+                          "result": "rejected", "reason": rejected[index], "signature_verified": False}
+            else:
+                result = {**next(applied_results), "index": index, "signature_verified": True}
+            results.append(result)
+        
+        # 批量应用后设备仍处于解锁状态时重新跟踪保活截止时间
+        current_status = outcome["summary"]["current_status"]
+        if not current_status.get("is_locked", True):
+            watch_device_alive(device_id, current_status.get("last_keep_alive"))
+        
+        log_device_info(headers)
+        
+        return _create_success_response("批量设备事件处理成功", {
+            "device_id": device_id,
+            "processed_at": beijing_now.strftime("%Y-%m-%d %H:%M:%S"),
+            "processed_at_timezone": "Asia/Shanghai",
+            "received": len(results),
+            "applied": sum(1 for result in results if result["result"] == "applied"),
+            "results": results,
+            "summary": outcome["summary"]
+        })
+        
+    except Exception as e:
+        log.exception(f"处理批量设备事件失败: {e}")
+        return _create_error_response(500, 101, f"处理批量设备事件失败: {str(e)}")
+
 async def process_device_status(status_data: Dict[str, Any], headers: Dict[str, str]) -> JSONResponse:
     """处理设备状态数据"""
     try:
@@ -212,8 +308,7 @@ async def process_device_status(status_data: Dict[str, Any], headers: Dict[str,
         
         summary = None
         if device_id != 'Unknown':
-            init_device_table(device_id)
-            store_device_status(device_id, status_data)
+            await AsyncGlobalVars.arun(_apply_device_status, device_id, status_data)
             summary = format_device_status_summary(status_data)
             log.info(f"设备状态摘要: {summary}")
         
@@ -251,12 +346,15 @@ async def process_keep_alive(headers: Dict[str, str]) -> JSONResponse:
         
         log.info(log_message)
         
-        # 更新保活状态
-        update_keep_alive_status(device_id)
+        # 更新保活状态，已知设备只修改内存，首次保活的设备需要查询数据库确认设备存在
+        if keep_alive_buffer.is_known(device_id):
+            last_keep_alive = update_keep_alive_status(device_id)
+        else:
+            last_keep_alive = await AsyncGlobalVars.aread(update_keep_alive_status, device_id)
         
         # 注册到保活管理器
         if device_id != 'Unknown':
-            register_device_alive(device_id)
+            register_device_alive(device_id, last_keep_alive)
         
         response_data = {
             "device_id": device_id,
@@ -373,6 +471,34 @@ async def receive_device_event(
     
     return await process_device_event(event, headers)
 
+@router.post("/device-events/batch")
+async def receive_device_events_batch(
+    request: Request,
+    batch: DeviceEventBatch,
+    content_type: Optional[str] = Header(None),
+    x_device_id: Optional[str] = Header(None)
+):
+    """
+    批量接收设备离线期间缓存的锁屏事件
+    
+    - 每个事件单独携带签名，验证结果在返回的逐条结果中给出
+    - 事件按时间戳排序后依次拼接使用会话，在一个事务中保存
+    - 重复和早于已记录状态的事件不会被应用
+    """
+    error_response = _validate_content_type(content_type)
+    if error_response:
+        return error_response
+    
+    if not x_device_id or x_device_id == 'Unknown':
+        return _create_error_response(400, 100, "缺少设备ID")
+    if not batch.events:
+        return _create_error_response(400, 100, "事件列表不能为空")
+    if len(batch.events) > looking_event_batch_max:
+        return _create_error_response(400, 100, f"单次最多上报 {looking_event_batch_max} 个事件")
+    
+    headers = _extract_headers(request, REQUIRED_BATCH_HEADERS)
+    return await process_device_events_batch(batch, headers)
+
 @router.post("/keep-alive")
 async def receive_keep_alive(
     request: Request,
@@ -452,10 +578,10 @@ async def receive_device_status(
 async def get_device_usage_summary(device_id: str):
     """获取指定设备的使用摘要（基于北京时间）"""
     try:
-        if not GlobalVars.table_exists(get_device_table_name(device_id)):
+        if not await AsyncGlobalVars.aread(device_exists, device_id):
             return _create_error_response(404, 100, f"设备 {device_id} 未找到记录")
         
-        summary = get_device_summary(device_id)
+        summary = await AsyncGlobalVars.arun(get_device_summary, device_id)
         
         return _create_success_response("获取设备摘要成功", {
             **summary,
@@ -471,7 +597,7 @@ async def get_device_usage_summary(device_id: str):
 async def get_device_list():
     """获取所有设备列表"""
     try:
-        device_ids = get_all_device_ids()
+        device_ids = await AsyncGlobalVars.aread(get_all_device_ids)
         if not device_ids:
             return _create_error_response(404, 100, "没有找到任何设备记录")
         
@@ -493,10 +619,10 @@ async def get_device_list():
 async def get_device_status(device_id: str):
     """获取指定设备的最新状态信息"""
     try:
-        if not GlobalVars.table_exists(get_device_table_name(device_id)):
+        if not await AsyncGlobalVars.aread(device_exists, device_id):
             return _create_error_response(404, 100, f"设备 {device_id} 未找到记录")
         
-        latest_status = get_latest_device_status(device_id)
+        latest_status = await AsyncGlobalVars.aread(get_latest_device_status, device_id)
         if not latest_status:
             return _create_error_response(404, 100, f"设备 {device_id} 未找到状态记录")
         
@@ -514,6 +640,135 @@ async def get_device_status(device_id: str):
         log.exception(f"获取设备状态失败: {e}")
         return _create_error_response(500, 101, f"获取设备状态失败: {str(e)}")
 
+@router.get("/device-status-rollups/{device_id}")
+async def get_device_status_rollups(device_id: str, granularity: str = "hour", days: int = 7):
+    """获取设备状态快照降采样后的小时或天聚合"""
+    try:
+        if granularity not in ("hour", "day"):
+            return _create_error_response(400, 100, f"不支持的聚合粒度: {granularity}，可选: hour, day")
+        if not await AsyncGlobalVars.aread(device_exists, device_id):
+            return _create_error_response(404, 100, f"设备 {device_id} 未找到记录")
+        
+        start_ts = get_beijing_now().timestamp() - max(1, days) * 86400
+        rollups = await AsyncGlobalVars.aread(status_retention.get_rollups, device_id, granularity, start_ts)
+        return _create_success_response("获取设备状态聚合成功", {
+            "device_id": device_id,
+            "granularity": granularity,
+            "days": days,
+            "rollups": rollups,
+            "timezone": "Asia/Shanghai"
+        })
+    except Exception as e:
+        log.exception(f"获取设备状态聚合失败: {e}")
+        return _create_error_response(500, 101, f"获取设备状态聚合失败: {str(e)}")
+
+@router.get("/device-report/{device_id}")
+async def get_device_report_api(device_id: str, from_: Optional[str] = Query(None, alias="from"),
+                                to: Optional[str] = None):
+    """获取设备在日期范围内的使用报告，from/to 为北京时间 YYYY-MM-DD，默认最近7天"""
+    try:
+        if not await AsyncGlobalVars.aread(device_exists, device_id):
+            return _create_error_response(404, 100, f"设备 {device_id} 未找到记录")
+        
+        try:
+            report = await AsyncGlobalVars.aread(get_device_report, device_id, from_, to)
+        except ValueError as e:
+            return _create_error_response(400, 100, str(e))
+        return _create_success_response("获取设备使用报告成功", report)
+    except Exception as e:
+        log.exception(f"获取设备使用报告失败: {e}")
+        return _create_error_response(500, 101, f"获取设备使用报告失败: {str(e)}")
+
+@router.get("/device-metrics/{device_id}")
+async def get_device_metrics(device_id: str, fields: str = "battery_level,thermal_max",
+                             start: Optional[float] = None, end: Optional[float] = None, points: int = 120):
+    """获取设备遥测指标在时间范围内降采样后的序列，start/end 为秒级时间戳，默认最近24小时"""
+    try:
+        field_list = [field.strip() for field in fields.split(",") if field.strip()]
+        if not field_list:
+            return _create_error_response(400, 100, "至少需要指定一个指标")
+        end_ts = end if end is not None else time.time()
+        start_ts = start if start is not None else end_ts - 86400
+        if start_ts >= end_ts:
+            return _create_error_response(400, 100, "开始时间必须早于结束时间")
+        if not await AsyncGlobalVars.aread(device_exists, device_id):
+            return _create_error_response(404, 100, f"设备 {device_id} 未找到记录")
+        
+        try:
+            metrics = await AsyncGlobalVars.aread(
+                query_series, device_id, field_list, start_ts, end_ts, min(max(1, points), 2000)
+            )
+        except ValueError as e:
+            return _create_error_response(400, 100, str(e))
+        return _create_success_response("获取设备遥测指标成功", {"device_id": device_id, **metrics})
+    except Exception as e:
+        log.exception(f"获取设备遥测指标失败: {e}")
+        return _create_error_response(500, 101, f"获取设备遥测指标失败: {str(e)}")
+
+@router.get("/status-retention")
+async def get_status_retention_api():
+    """获取设备状态历史保留策略的执行统计"""
+    try:
+        stats = await AsyncGlobalVars.aread(status_retention.get_stats)
+        return _create_success_response("获取状态保留策略统计成功", stats)
+    except Exception as e:
+        log.exception(f"获取状态保留策略统计失败: {e}")
+        return _create_error_response(500, 101, f"获取状态保留策略统计失败: {str(e)}")
+
+# 设备状态推送（SSE）
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def _all_devices_snapshot() -> Dict[str, Any]:
+    """所有设备锁定状态的快照，作为全部设备订阅的第一条消息"""
+    return {
+        device_id: {"is_locked": status.get("is_locked"), "last_update_str": status.get("last_update_str")}
+        for device_id, status in get_all_device_statuses().items()
+    }
+
+async def _open_stream(device_id: Optional[str], snapshot_func, *args) -> StreamingResponse:
+    """先订阅再读取快照，快照之后发生的变化不会丢失"""
+    try:
+        subscriber = device_stream_hub.subscribe(device_id)
+    except StreamLimitError as e:
+        return _create_error_response(503, 101, str(e))
+    try:
+        snapshot = await AsyncGlobalVars.aread(snapshot_func, *args)
+        initial = format_sse("snapshot", {"device_id": device_id, "data": snapshot})
+    except Exception:
+        device_stream_hub.unsubscribe(subscriber)
+        raise
+    return StreamingResponse(device_stream_hub.stream(subscriber, initial),
+                             media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.get("/stream")
+async def stream_all_devices():
+    """订阅所有设备的状态变化（SSE）"""
+    try:
+        return await _open_stream(None, _all_devices_snapshot)
+    except Exception as e:
+        log.exception(f"订阅设备状态失败: {e}")
+        return _create_error_response(500, 101, f"订阅设备状态失败: {str(e)}")
+
+@router.get("/stream/{device_id}")
+async def stream_device(device_id: str):
+    """订阅指定设备的锁定状态、状态上报和保活超时（SSE）"""
+    try:
+        if not await AsyncGlobalVars.aread(device_exists, device_id):
+            return _create_error_response(404, 100, f"设备 {device_id} 未找到记录")
+        return await _open_stream(device_id, looking_utils.get_device_status, device_id)
+    except Exception as e:
+        log.exception(f"订阅设备状态失败: {e}")
+        return _create_error_response(500, 101, f"订阅设备状态失败: {str(e)}")
+
+@router.get("/stream-stats")
+async def get_stream_stats_api():
+    """获取设备状态推送的订阅和丢弃统计"""
+    try:
+        return _create_success_response("获取推送统计成功", device_stream_hub.get_stats())
+    except Exception as e:
+        log.exception(f"获取推送统计失败: {e}")
+        return _create_error_response(500, 101, f"获取推送统计失败: {str(e)}")
+
 @router.get("/alive-manager/status")
 async def get_alive_manager_status_api():
     """获取保活管理器状态"""
@@ -524,11 +779,20 @@ async def get_alive_manager_status_api():
         log.exception(f"获取保活管理器状态失败: {e}")
         return _create_error_response(500, 101, f"获取保活管理器状态失败: {str(e)}")
 
+@router.get("/signature-stats")
+async def get_signature_stats_api():
+    """获取保活签名验证缓存的命中率和耗时统计"""
+    try:
+        return _create_success_response("获取签名验证统计成功", keep_alive_signature_cache.get_stats())
+    except Exception as e:
+        log.exception(f"获取签名验证统计失败: {e}")
+        return _create_error_response(500, 101, f"获取签名验证统计失败: {str(e)}")
+
 @router.post("/alive-manager/check/{device_id}")
 async def force_check_device_alive_api(device_id: str):
     """强制检查设备保活状态"""
     try:
-        result = force_check_device_alive(device_id)
+        result = await AsyncGlobalVars.arun(force_check_device_alive, device_id)
         if "error" in result:
             return _create_error_response(400, 100, result["error"])
         return _create_success_response("强制检查设备保活状态成功", result)
@@ -540,7 +804,7 @@ async def force_check_device_alive_api(device_id: str):
 async def get_device_alive_info_api(device_id: str):
     """获取设备保活详细信息"""
     try:
-        info = get_device_alive_info(device_id)
+        info = await AsyncGlobalVars.aread(get_device_alive_info, device_id)
         if "error" in info:
             return _create_error_response(404, 100, info["error"])
         return _create_success_response("获取设备保活信息成功", info)